@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from cli import KEY_ENV, CliError, Session, findAccount
+from paths import getPath
+
+# 本地解锁代理：解锁一次后把索引留在内存中，通过仅本用户可访问的 Unix 套接字提供查询
+# 协议为每行一个 JSON：请求 {"op": ..., 参数...}，响应 {"result": ...} 或 {"error": ...}
+#   python agent.py start [--timeout 秒]    在前台运行，密钥的读取方式与 cli.py 相同
+#   python agent.py status | stop
+SOCKET_NAME = "agent.sock"
+IDLE_TIMEOUT = 900  # 空闲多少秒后自动退出
+MAX_REQUEST = 64 * 1024  # 单个请求的最大长度
+
+
+class AgentError(Exception):
+    pass
+
+
+def socketPath():
+    return getPath(SOCKET_NAME)
+
+
+def peerAllowed(sock):
+    # 套接字文件的权限已限制为本用户，Linux 上再核对一次对方进程的 uid
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1] == os.getuid()
+
+
+class Agent:
+    def __init__(self, data, key, timeout=IDLE_TIMEOUT):
+        self.data = data
+        self.key = key
+        self.timeout = timeout
+        # 会话缓存自带的超时会清除派生的密钥，代理由自己的空闲超时负责退出
+        self.data.disableCache()
+        self.lastUsed = time.monotonic()
+        self.requests = 0
+        self.writers = set()
+        self.tasks = set()  # 各连接的处理协程，停止时等待它们退出
+        self.server = None
+        self.stopped = None
+
+    def handle(self, request):
+        op = request.get("op")
+        try:
+            if op == "ping":
+                return {"pid": os.getpid(), "requests": self.requests, "clients": len(self.writers),
+                        "idle": round(time.monotonic() - self.lastUsed, 3), "timeout": self.timeout}
+            if op == "stop":
+                asyncio.get_running_loop().call_soon(self.stop)
+                return True
+            # 图形界面、命令行做了修改时重新加载
+            self.data.refresh(self.key)
+            platform = request.get("platform")
+            if op == "get":
+                account = findAccount(self.data, platform, request.get("account"))
+                return {"platform": platform, "account": account,
+                        "password": self.data.getPassword(platform, account, self.key)}
+            if op == "list":
+                if platform is None:
+                    return self.data.getPlatforms()
+                if not self.data.hasPlatform(platform):
+                    raise CliError(f"平台不存在:{platform}")
+                return list(self.data.getAccount(platform))
+            if op == "search":
+                return [list(entry) for entry in self.data.search(str(request.get("query", "")),
+                                                                  int(request.get("limit", 50)))]
+        except CliError as e:
+            raise AgentError(str(e))
+        raise AgentError(f"未知请求:{op}")
+
+    async def serve(self, reader, writer):
+        if not peerAllowed(writer.get_extra_info("socket")):
+            writer.close()
+            return
+        self.writers.add(writer)
+        self.tasks.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.lastUsed = time.monotonic()
+                self.requests += 1
+                try:
+                    response = {"result": self.handle(json.loads(line))}
+                except AgentError as e:
+                    response = {"error": str(e)}
+                except (ValueError, TypeError, AttributeError) as e:
+                    response = {"error": f"请求无效:{e}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            # 断开或请求过长，直接关闭该连接
+            pass
+        except asyncio.CancelledError:
+            # 代理停止时仍在等待请求的连接
+            pass
+        finally:
+            self.writers.discard(writer)
+            self.tasks.discard(asyncio.current_task())
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    async def watchIdle(self):
+        while True:
+            remaining = self.lastUsed + self.timeout - time.monotonic()
+            if remaining <= 0:
+                self.stop()
+                return
+            await asyncio.sleep(remaining)
+
+    def stop(self):
+        if self.stopped is not None:
+            self.stopped.set()
+
+    async def run(self, onReady=None):
+        path = socketPath()
+        removeStale(path)
+        self.stopped = asyncio.Event()
+        # 创建时就只有本用户可读写，避免 chmod 之前的窗口期
+        umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.serve, path, limit=MAX_REQUEST)
+        finally:
+            os.umask(umask)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        watcher = asyncio.create_task(self.watchIdle())
+        if onReady is not None:
+            onReady()
+        try:
+            await self.stopped.wait()
+        finally:
+            watcher.cancel()
+            self.server.close()
+            # 停止时断开仍连着的客户端，等各连接读到断开、关闭完成后再退出
+            writers = list(self.writers)
+            for writer in writers:
+                writer.close()
+            await asyncio.gather(*[writer.wait_closed() for writer in writers], return_exceptions=True)
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            await self.server.wait_closed()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.data.close()
+
+
+def removeStale(path):
+    # 上次异常退出留下的套接字文件直接删除；已有代理在运行时报错
+    if not os.path.exists(path):
+        return
+    client = AgentClient(path, timeout=1.0)
+    try:
+        client.request("ping")
+    except (OSError, AgentError):
+        os.remove(path)
+        return
+    finally:
+        client.close()
+    raise AgentError("代理已在运行")
+
+
+class AgentClient:
+    # 同一个连接可以连续发送多个请求
+    def __init__(self, path=None, timeout=5.0):
+        self.path = path or socketPath()
+        self.timeout = timeout
+        self.sock = None
+        self.file = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.file = sock.makefile('rb')
+
+    def request(self, op, **args):
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(json.dumps(dict(args, op=op), ensure_ascii=False).encode() + b"\n")
+        line = self.file.readline()
+        if not line:
+            self.close()
+            raise AgentError("代理已断开连接")
+        response = json.loads(line)
+        if "error" in response:
+            raise AgentError(response["error"])
+        return response["result"]
+
+    def close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+            self.sock = None
+            self.file = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="agent.py", description="密码管理器本地解锁代理")
+    commands = parser.add_subparsers(dest="command", required=True)
+    start = commands.add_parser("start", help="解锁并在前台运行代理")
+    start.add_argument("--timeout", type=float, default=IDLE_TIMEOUT, help=f"空闲多少秒后退出，默认 {IDLE_TIMEOUT}")
+    start.add_argument("--key-stdin", action="store_true", dest="keyStdin")
+    start.add_argument("--key-env", default=KEY_ENV, dest="keyEnv")
+    commands.add_parser("status", help="查看代理状态")
+    commands.add_parser("stop", help="停止代理")
+    options = parser.parse_args(argv)
+    try:
+        if options.command == "start":
+            session = Session(options)
+            agent = Agent(session.open(), session.key, options.timeout)
+            asyncio.run(agent.run(lambda: print(f"代理已启动:{socketPath()}", file=sys.stderr, flush=True)))
+            return 0
+        client = AgentClient()
+        if options.command == "status":
+            print(json.dumps(client.request("ping"), ensure_ascii=False))
+        else:
+            client.request("stop")
+        client.close()
+    except FileNotFoundError:
+        print("错误: 代理没有运行", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
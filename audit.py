@@ -0,0 +1,202 @@
+import hashlib
+import hmac
+import math
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+import breach
+import container
+from paths import getPath
+
+# 密码体检：找出重复使用、强度不足和长期未更换的密码
+# 解密、哈希与评分在同一步完成，结果只含带密钥的哈希与评分，明文不离开解密它的进程
+POOL_THRESHOLD = 5000  # 条目数达到这么多时用进程池
+CHUNK = 500  # 每个任务处理的条目数
+STALE_DAYS = 365
+LEVELS = ["很弱", "弱", "一般", "强", "很强"]
+LEVEL_BITS = [28, 36, 60, 80]  # 各级别的熵下限(位)
+
+COMMON = {
+    "password", "passw0rd", "123456", "12345678", "123456789", "1234567890", "qwerty", "abc123", "111111",
+    "123123", "admin", "letmein", "welcome", "monkey", "dragon", "iloveyou", "football", "baseball", "master",
+    "sunshine", "princess", "trustno1", "000000", "666666", "888888", "5201314", "woaini", "qwertyuiop",
+    "asdfghjkl", "zxcvbnm", "1q2w3e4r", "qazwsx", "superman", "michael", "shadow", "password1", "a123456",
+}
+# 字母数字顺序与键盘顺序中相邻的两个字符，正反都算
+SEQUENCES = ["abcdefghijklmnopqrstuvwxyz", "0123456789", "qwertyuiop", "asdfghjkl", "zxcvbnm"]
+PAIRS = frozenset(pair for row in SEQUENCES for i in range(len(row) - 1)
+                  for pair in (row[i:i + 2], row[i + 1] + row[i]))
+YEAR = re.compile(r"(19|20)\d\d")
+CLASS_SIZES = [(str.islower, 26), (str.isupper, 26), (str.isdigit, 10)]
+
+
+class AuditEntry:
+    def __init__(self, platform, account):
+        self.platform = platform
+        self.account = account
+        self.level = 0
+        self.entropy = 0.0
+        self.issues = []
+        self.group = 0  # 重复使用的密码编号，0 表示没有重复
+        self.shared = 1  # 使用同一个密码的账户数
+        self.ageDays = 0  # 距密码最后一次修改的天数
+
+    def __repr__(self):
+        return (f"AuditEntry({self.platform!r}, {self.account!r}, level={self.level}, "
+                f"entropy={self.entropy:.1f}, shared={self.shared}, ageDays={self.ageDays})")
+
+
+class AuditResult:
+    def __init__(self):
+        self.entries = []
+        self.groups = 0  # 被多个账户共用的密码数
+        self.weak = 0  # 强度为 弱 及以下
+        self.stale = 0
+        self.breached = None  # 出现在泄露库中的个数，没有泄露库时为 None
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return (f"AuditResult(entries={len(self.entries)}, groups={self.groups}, weak={self.weak}, "
+                f"stale={self.stale})")
+
+
+def charsetSize(password):
+    size = 0
+    for test, n in CLASS_SIZES:
+        if any(test(c) for c in password):
+            size += n
+    if any(c.isascii() and not c.isalnum() for c in password):
+        size += 33
+    if any(not c.isascii() for c in password):
+        size += 100
+    return size
+
+
+def scorePassword(password, names=()):
+    # 返回 (级别, 估计的熵, 问题列表)；names 为平台名与用户名，密码中包含时扣分
+    issues = []
+    lowered = password.lower()
+    bits = math.log2(max(charsetSize(password), 2))
+    # 重复或连续的字符只算 1 位
+    entropy = bits if password else 0.0
+    repeats = sequences = 0
+    for i in range(1, len(password)):
+        if password[i] == password[i - 1]:
+            repeats += 1
+            entropy += 1
+        elif password[i - 1:i + 1].lower() in PAIRS:
+            sequences += 1
+            entropy += 1
+        else:
+            entropy += bits
+    if len(password) < 8:
+        issues.append("过短")
+    if repeats >= 2 and repeats * 3 >= len(password):
+        issues.append("重复字符")
+    if sequences >= 2 and sequences * 3 >= len(password):
+        issues.append("连续字符")
+    if sum(1 for test, _ in CLASS_SIZES if any(test(c) for c in password)) + \
+            any(not c.isalnum() for c in password) <= 1:
+        issues.append("只有一类字符")
+    if YEAR.search(password):
+        issues.append("包含年份")
+        entropy -= max(0.0, 4 * bits - math.log2(200))
+    if lowered.rstrip("0123456789!@#.") in COMMON or lowered in COMMON:
+        issues.append("常见密码")
+        entropy = min(entropy, 10.0)
+    for name in names:
+        stem = name.lower().split("@")[0].split(".")[0]
+        if len(stem) >= 3 and stem in lowered:
+            issues.append("包含平台名或用户名")
+            entropy -= max(0.0, (len(stem) - 1) * bits)
+            break
+    entropy = max(entropy, 0.0)
+    level = sum(1 for limit in LEVEL_BITS if entropy >= limit)
+    return level, entropy, issues
+
+
+def auditChunk(recordDir, key, salt, items, now, corpusPath=None):
+    # items 为 [(记录编号, 修改时间, 平台, 用户名)]，返回 [(带密钥的哈希, 级别, 熵, 问题, 天数)]
+    corpus = breach.openCorpus(corpusPath) if corpusPath else None
+    results = []
+    for recordId, changed, platform, account in items:
+        recordPath = os.path.join(recordDir, recordId)
+        password = container.openBytes(container.readAddressed(recordPath, recordId), key)[1].decode()
+        digest = hmac.new(salt, password.encode("utf-8"), hashlib.sha256).digest()
+        level, entropy, issues = scorePassword(password, (platform, account))
+        if corpus is not None and corpus.contains(password):
+            issues.append("已泄露")
+            level = 0
+        # 按索引中记下的修改时间计算：更换密钥、升级时重写的记录文件不算修改
+        ageDays = int((now - changed) // 86400)
+        results.append((digest, level, entropy, issues, ageDays))
+    return results
+
+
+def auditVault(data, key, staleDays=STALE_DAYS, workers=None, progress=None):
+    # data 为已解锁的 UIData；progress(已完成, 总数)
+    from ui_data import getKey
+    started = time.perf_counter()
+    derived = getKey(key)
+    # 每次体检使用新的随机盐，哈希不能跨次比较，也无法离线猜测
+    salt = secrets.token_bytes(16)
+    now = time.time()
+    recordDir = getPath('records')
+    corpusPath = breach.corpusPath() if os.path.exists(breach.corpusPath()) else None
+    result = AuditResult()
+    items = []
+    for platform, accounts in data.records.items():
+        for account, (recordId, changed) in accounts.items():
+            items.append((recordId, changed, platform, account))
+            result.entries.append(AuditEntry(platform, account))
+    chunks = [items[i:i + CHUNK] for i in range(0, len(items), CHUNK)]
+    workers = workers or os.cpu_count() or 1
+    if len(items) >= POOL_THRESHOLD and workers > 1:
+        # 图形界面中不能 fork，子进程用 spawn 启动
+        executor = ProcessPoolExecutor(min(workers, len(chunks)), mp_context=multiprocessing.get_context("spawn"))
+        outputs = executor.map(auditChunk, [recordDir] * len(chunks), [derived] * len(chunks), [salt] * len(chunks),
+                               chunks, [now] * len(chunks), [corpusPath] * len(chunks))
+    else:
+        executor = None
+        outputs = (auditChunk(recordDir, derived, salt, chunk, now, corpusPath) for chunk in chunks)
+
+    digests = []
+    done = 0
+    try:
+        for output in outputs:
+            for digest, level, entropy, issues, ageDays in output:
+                entry = result.entries[done]
+                entry.level, entry.entropy, entry.issues, entry.ageDays = level, entropy, issues, ageDays
+                digests.append(digest)
+                done += 1
+            if progress is not None:
+                progress(done, len(items))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # 按哈希分组，一次遍历找出共用的密码
+    owners = dict()
+    for i, digest in enumerate(digests):
+        owners.setdefault(digest, []).append(i)
+    for indexes in owners.values():
+        if len(indexes) < 2:
+            continue
+        result.groups += 1
+        for i in indexes:
+            result.entries[i].group = result.groups
+            result.entries[i].shared = len(indexes)
+            result.entries[i].issues.append("重复使用")
+    if corpusPath is not None:
+        result.breached = sum(1 for entry in result.entries if "已泄露" in entry.issues)
+    for entry in result.entries:
+        if entry.level <= 1:
+            result.weak += 1
+        if entry.ageDays >= staleDays:
+            result.stale += 1
+            entry.issues.append("长期未更换")
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+import journal
+
+# 默认保留策略：最近若干份，加上每小时/每天/每周各保留一份
+defaultRetention = {
+    "last": 10,
+    "hourly": 24,
+    "daily": 7,
+    "weekly": 4,
+}
+
+
+def bucketKeys(timestamp):
+    t = datetime.fromtimestamp(timestamp)
+    return {
+        "hourly": t.strftime("%Y%m%d%H"),
+        "daily": t.strftime("%Y%m%d"),
+        "weekly": "%d-%02d" % t.isocalendar()[:2],
+    }
+
+
+def selectKept(entries, retention):
+    # 返回需要保留的备份编号，entries 按时间从旧到新排列
+    kept = set()
+    newest = list(reversed(entries))
+    for entry in newest[:retention.get("last", 0)]:
+        kept.add(entry["id"])
+    for bucket in ("hourly", "daily", "weekly"):
+        limit = retention.get(bucket, 0)
+        seen = set()
+        for entry in newest:
+            if len(seen) >= limit:
+                break
+            key = bucketKeys(entry["time"])[bucket]
+            if key not in seen:
+                seen.add(key)
+                kept.add(entry["id"])
+    return kept
+
+
+class BackupStore:
+    # 按内容寻址的备份库：objects/ 下按 sha256 存放快照，catalog.json 记录每次备份
+    # 快照引用的密码记录按分段存放在 segments/<分段编号> 下；分段不可变，相邻的备份只多出有变化的几段
+    def __init__(self, root):
+        self.root = root
+        self.catalogPath = os.path.join(root, "catalog.json")
+        self.catalog = None
+        self.stamp = None  # 读取或写入目录文件时它的状态，与文件不一致说明其他进程修改过
+        self.segmentRefs = dict()  # 分段编号 -> 记录编号集合，读过的不再读
+
+    def objectPath(self, digest):
+        return os.path.join(self.root, "objects", digest)
+
+    def segmentPath(self, segmentId):
+        return os.path.join(self.root, "segments", segmentId)
+
+    def catalogStamp(self):
+        try:
+            st = os.stat(self.catalogPath)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self):
+        # 命令行、代理等其他进程可能刚写过目录文件，文件变化时重新读取，修改时调用方持有保险库锁
+        stamp = self.catalogStamp()
+        if self.catalog is None or stamp != self.stamp:
+            self.catalog = {"nextId": 1, "entries": []}
+            if stamp is not None:
+                with open(self.catalogPath, 'r') as f:
+                    self.catalog = json.load(f)
+            self.stamp = stamp
+        return self.catalog
+
+    def flush(self):
+        os.makedirs(self.root, exist_ok=True)
+        journal.writeAtomic(self.catalogPath, json.dumps(self.catalog))
+        self.stamp = self.catalogStamp()
+
+    def putObject(self, data: bytes, sourcePath=None):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.objectPath(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if sourcePath is not None:
+            # 快照文件写入后不再修改，直接硬链接，不需要再写一遍
+            try:
+                os.link(sourcePath, path)
+                return digest
+            except OSError:
+                pass
+        with open(path + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return digest
+
+    def readObject(self, digest):
+        with open(self.objectPath(digest), 'rb') as f:
+            return f.read()
+
+    def putSegment(self, segmentId, recordIds):
+        # 其他进程可能已把它当作无用的分段删除，只看文件是否存在
+        path = self.segmentPath(segmentId)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        journal.writeAtomic(path, "\n".join(sorted(recordIds)))
+        self.segmentRefs[segmentId] = set(recordIds)
+
+    def readSegment(self, segmentId):
+        refs = self.segmentRefs.get(segmentId)
+        if refs is None:
+            with open(self.segmentPath(segmentId), 'r') as f:
+                refs = self.segmentRefs[segmentId] = {r for r in f.read().split("\n") if r}
+        return refs
+
+    def add(self, filePath, data: bytes, segments):
+        # data 为 filePath 当前的内容，segments 为 {分段编号: 该段引用的密码记录}，只写入之前没有的分段
+        catalog = self.load()
+        for segmentId, recordIds in segments.items():
+            self.putSegment(segmentId, recordIds)
+        entry = {
+            "id": catalog["nextId"],
+            "time": time.time(),
+            "object": self.putObject(data, filePath),
+            "size": len(data),
+            "refs": self.putObject("\n".join(sorted(segments)).encode()),
+        }
+        catalog["nextId"] += 1
+        catalog["entries"].append(entry)
+        self.flush()
+        return entry
+
+    def list(self):
+        return list(self.load()["entries"])
+
+    def due(self, interval):
+        # 距最近一次备份超过 interval 秒
+        entries = self.load()["entries"]
+        return not entries or time.time() - entries[-1]["time"] >= interval
+
+    def get(self, entryId):
+        for entry in self.load()["entries"]:
+            if entry["id"] == entryId:
+                return entry
+        raise KeyError(entryId)
+
+    def remove(self, entryIds):
+        catalog = self.load()
+        catalog["entries"] = [e for e in catalog["entries"] if e["id"] not in entryIds]
+        self.flush()
+        self.collect()
+
+    def prune(self, retention):
+        # 按保留策略删除多余的备份，返回删除的数量
+        catalog = self.load()
+        kept = selectKept(catalog["entries"], retention)
+        removed = len(catalog["entries"]) - len(kept)
+        if removed:
+            catalog["entries"] = [e for e in catalog["entries"] if e["id"] in kept]
+            self.flush()
+            self.collect()
+        return removed
+
+    def clear(self):
+        self.catalog = None
+        self.stamp = None
+        self.segmentRefs.clear()
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+
+    def collect(self):
+        # 删除不再被任何备份引用的对象与分段
+        used = set()
+        for entry in self.load()["entries"]:
+            used.add(entry["object"])
+            used.add(entry["refs"])
+        segments = self.referencedSegments()
+        for dirName, kept in (("objects", used), ("segments", segments)):
+            targetDir = os.path.join(self.root, dirName)
+            if not os.path.exists(targetDir):
+                continue
+            for item in os.listdir(targetDir):
+                if item not in kept:
+                    self.segmentRefs.pop(item, None)
+                    try:
+                        os.remove(os.path.join(targetDir, item))
+                    except OSError:
+                        pass
+
+    def referencedSegments(self):
+        segments = set()
+        for digest in {e["refs"] for e in self.load()["entries"]}:
+            segments.update(s for s in self.readObject(digest).decode().split("\n") if s)
+        return segments
+
+    def referencedRecords(self):
+        # 所有备份引用的分段与密码记录
+        segments = self.referencedSegments()
+        refs = set(segments)
+        for segmentId in segments:
+            refs.update(self.readSegment(segmentId))
+        return refs
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import random
+import secrets
+import shutil
+import statistics
+import string
+import sys
+import tempfile
+import time
+import encrypt
+import generate_password
+import ui_data
+
+# 存储与加密的基准测试：在临时目录中生成确定性的合成保险库，测量加解密吞吐、读写以及 UIData 各项修改的耗时
+#   python bench.py [--sizes 10,1000,10000] [--full] [--output bench_output.txt]
+#                   [--baseline bench_baseline.json] [--threshold 0.2] [--update-baseline]
+# 结果以 JSON 写入 output；与基线比较时按各项的最小耗时计算，慢于基线超过 threshold 时退出码为 1
+SIZES = [10, 1000, 10000]  # --full 时再加上 10 万个账户，会写入约 20 万个记录文件
+ACCOUNTS_PER_PLATFORM = 5
+KEY = "benchmark"
+NEW_KEY = "benchmark-changed"
+# 固定使用最低的 scrypt 代价，结果不受本机 KDF 校准的影响
+KDF_COST = {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N, "r": 8, "p": 1}
+THRESHOLD = 0.2
+MIN_DELTA = 0.001  # 比基线慢不到这么多秒时视为测量抖动，不算回归
+OUTPUT = "bench_output.txt"
+BASELINE = "bench_baseline.json"
+
+SITES = ["github", "google", "amazon", "weibo", "taobao", "bilibili", "zhihu", "steam", "netflix", "apple"]
+DOMAINS = ["com", "cn", "net", "org"]
+PASSWORD_CHARS = string.ascii_letters + string.digits + "!@#$%^&*()_+-="
+
+
+def generateVault(count, seed=0):
+    # 相同的 count 与 seed 总是得到相同的平台、用户名与密码，每个平台 ACCOUNTS_PER_PLATFORM 个账户
+    rng = random.Random(seed)
+    platforms = dict()
+    accounts = None
+    for i in range(count):
+        if i % ACCOUNTS_PER_PLATFORM == 0:
+            name = f"{rng.choice(SITES)}{i // ACCOUNTS_PER_PLATFORM}.{rng.choice(DOMAINS)}"
+            accounts = platforms.setdefault(name, {})
+        name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+        accounts[f"{name}{i}@mail.com"] = "".join(rng.choices(PASSWORD_CHARS, k=rng.randint(12, 24)))
+    return {"key": "", "platforms": platforms}
+
+
+def measure(fn, repeat, setup=None):
+    # 每次调用前执行 setup(不计时)，返回每次的耗时
+    times = []
+    for i in range(repeat):
+        args = setup(i) if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def record(results, name, times, count=1, nbytes=0):
+    # count 为每次调用包含的操作数，nbytes 为每个操作处理的字节数
+    best = min(times) / count
+    result = {"min": best, "median": statistics.median(times) / count, "repeat": len(times) * count}
+    if nbytes:
+        result["mbPerSecond"] = nbytes / best / 1e6
+    results[name] = result
+    print(f"  {name:<36}{best * 1000:10.3f} ms", flush=True)
+
+
+def benchCrypto(results, repeat):
+    print("加解密:", flush=True)
+    key = encrypt.deriveKey(KEY, encrypt.newKdfParams(KDF_COST))
+    for size, label in ((1 << 10, "1KiB"), (1 << 20, "1MiB")):
+        text = "".join(random.Random(size).choices(PASSWORD_CHARS, k=size))
+        data = text.encode()
+        encrypted = encrypt.aesEncrypt(text, key)
+        sealed = encrypt.gcmEncryptBytes(data, key)
+        n = (1 << 20) // size  # 每次测量约处理 1MiB
+        cases = [
+            ("aesEncrypt", lambda: encrypt.aesEncrypt(text, key)),
+            ("aesDecrypt", lambda: encrypt.aesDecrypt(encrypted, key)),
+            ("gcmEncryptBytes", lambda: encrypt.gcmEncryptBytes(data, key)),
+            ("gcmDecryptBytes", lambda: encrypt.gcmDecryptBytes(sealed, key)),
+        ]
+        for name, fn in cases:
+            record(results, f"{name} {label}", measure(lambda: [fn() for _ in range(n)], repeat), n, size)
+    params = encrypt.newKdfParams(KDF_COST)
+    record(results, "runKdf scrypt n=2^14", measure(lambda: encrypt.runKdf(KEY.encode(), params), repeat))
+
+
+def benchGenerate(results, repeat):
+    # 批量生成与原来逐字符调用 secrets.choice 的对比，每次生成 n 个 20 位密码
+    print("生成密码:", flush=True)
+    n = 1000
+    chars = string.ascii_letters + string.digits + generate_password.SPECIAL
+    policy = generate_password.PasswordPolicy(20)
+    record(results, "逐字符 secrets.choice",
+           measure(lambda: [''.join(secrets.choice(chars) for _ in range(20)) for _ in range(n)], repeat), n)
+    record(results, "generatePasswords", measure(lambda: generate_password.generatePasswords(n, policy), repeat), n)
+    record(results, "generatePassword", measure(lambda: [generate_password.generatePassword(20) for _ in range(n)],
+                                                repeat), n)
+
+
+def repeatFor(count, repeat):
+    # 大的保险库单次就要数秒，按规模减少重复次数
+    return max(1, repeat * 1000 // max(count, 1000))
+
+
+def benchVault(results, count, repeat, root):
+    # 每个规模使用独立的数据目录
+    home = os.path.join(root, f"vault{count}")
+    os.makedirs(home)
+    os.environ["HOME"] = home
+    encrypt.clearKeyCache()
+    print(f"{count} 个账户:", flush=True)
+    suffix = f" n={count}"
+    data, derived, params = makeVault(count)
+    # 单个修改只需几毫秒，受磁盘 fsync 抖动影响大，多测几次取最小值
+    mutationRepeat = max(3, repeatFor(count, repeat * 4))
+    repeat = repeatFor(count, repeat)
+    rng = random.Random(count)
+    entries = [(p, a) for p, accounts in data["platforms"].items() for a in accounts]
+
+    # 写入全部记录与索引；已有快照，每次都会把旧快照收入备份库
+    record(results, "save" + suffix, measure(lambda: ui_data.save(derived, data, params), repeat))
+    record(results, "load" + suffix, measure(lambda: ui_data.load(KEY), repeat))
+    record(results, "loadFile" + suffix, measure(lambda: ui_data.loadFile(KEY), repeat))
+    n = 100
+    samples = [rng.choice(entries) for _ in range(n)]
+    record(results, "ui_data.getPassword" + suffix,
+           measure(lambda: [ui_data.getPassword(p, a, KEY) for p, a in samples[:10]], repeat), 10)
+
+    vault = ui_data.loadFile(KEY)
+    record(results, "UIData.getPassword" + suffix,
+           measure(lambda: [vault.getPassword(p, a, KEY) for p, a in samples], repeat), n)
+    for journaled in (False, True):
+        vault.journaled = journaled
+        benchMutations(results, vault, suffix + (" journal" if journaled else ""), mutationRepeat, rng)
+        if vault.compactThread is not None:
+            vault.compactThread.join()
+    vault.journaled = False
+
+    def swapKey(i):
+        return (KEY, NEW_KEY) if i % 2 == 0 else (NEW_KEY, KEY)
+    changeRepeat = repeat + repeat % 2  # 偶数次，结束时换回原密钥
+    record(results, "UIData.changeKey" + suffix, measure(vault.changeKey, changeRepeat, swapKey))
+    vault.close()
+
+
+def benchMutations(results, vault, suffix, repeat, rng):
+    platforms = vault.getPlatforms()
+
+    def newPlatform(i):
+        return f"bench-platform-{suffix}-{i}", KEY
+
+    def existingAccount(i):
+        platform = rng.choice([p for p in platforms if vault.getAccount(p)])
+        return platform, rng.choice(vault.getAccount(platform))
+
+    def renameAccount(i):
+        platform, account = existingAccount(i)
+        return platform, account, f"renamed{i}-{account}", "", KEY
+
+    def addPlatform(i):
+        # 先建好平台再计时
+        name = newPlatform(i)[0]
+        vault.addPlatform(name, KEY)
+        return name, KEY
+
+    record(results, "UIData.addPlatform" + suffix, measure(vault.addPlatform, repeat, newPlatform))
+    record(results, "UIData.addAccount" + suffix,
+           measure(vault.addAccount, repeat, lambda i: (rng.choice(platforms), f"bench{i}@mail.com", "password", KEY)))
+    record(results, "UIData.changeAccount password" + suffix,
+           measure(vault.changeAccount, repeat, lambda i: existingAccount(i) + ("", f"changed{i}", KEY)))
+    record(results, "UIData.changeAccount rename" + suffix, measure(vault.changeAccount, repeat, renameAccount))
+    record(results, "UIData.deleteAccount" + suffix,
+           measure(vault.deleteAccount, repeat, lambda i: existingAccount(i) + (KEY,)))
+    record(results, "UIData.deletePlatform" + suffix, measure(vault.deletePlatform, repeat, addPlatform))
+
+
+def compare(results, baseline, threshold, minDelta=MIN_DELTA):
+    # 返回比基线慢超过 threshold(且绝对差值超过 minDelta)的项目
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None or old["min"] <= 0:
+            continue
+        result["baseline"] = old["min"]
+        result["ratio"] = result["min"] / old["min"]
+        if result["ratio"] > 1 + threshold and result["min"] - old["min"] > minDelta:
+            regressions.append(name)
+    return regressions
+
+
+def addOptions(parser, sizes, output, baseline):
+    # bench.py 与 gui_bench.py 共用的参数
+    parser.add_argument("--sizes", help="逗号分隔的账户数量，默认 " + ",".join(map(str, sizes)))
+    parser.add_argument("--full", action="store_true", help="再加上 10 万个账户的保险库")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=output)
+    parser.add_argument("--baseline", default=baseline)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="允许比基线慢的比例")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA, dest="minDelta", help="允许比基线慢的秒数")
+    parser.add_argument("--update-baseline", action="store_true", dest="updateBaseline", help="把本次结果保存为基线")
+
+
+def selectSizes(options, sizes):
+    if options.sizes:
+        return [int(s) for s in options.sizes.split(",")]
+    return sizes + [100000] if options.full else list(sizes)
+
+
+def makeVault(count):
+    # 在当前 HOME 下写入 count 个账户的合成保险库，KDF 代价固定为 KDF_COST
+    data = generateVault(count)
+    params = encrypt.newKdfParams(KDF_COST)
+    derived = encrypt.deriveKey(KEY, params)
+    data["key"] = ui_data.keyVerifier(derived)
+    ui_data.save(derived, data, params)
+    return data, derived, params
+
+
+def finish(options, results, meta):
+    # 写出结果并与基线比较，返回退出码
+    report = {
+        "meta": dict({"time": time.time(), "python": sys.version.split()[0], "platform": platform.platform(),
+                      "repeat": options.repeat}, **meta),
+        "results": results,
+    }
+    regressions = []
+    if os.path.exists(options.baseline) and not options.updateBaseline:
+        with open(options.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), options.threshold, options.minDelta)
+        for name in regressions:
+            result = results[name]
+            print(f"回归: {name} {result['min'] * 1000:.3f} ms，基线 {result['baseline'] * 1000:.3f} ms"
+                  f"(慢 {(result['ratio'] - 1) * 100:.0f}%)")
+        report["regressions"] = regressions
+        print(f"与基线 {options.baseline} 比较：{len(regressions)} 项变慢超过 {options.threshold * 100:.0f}%")
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    if options.updateBaseline:
+        with open(options.baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"已保存基线:{options.baseline}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.py", description="存储与加密基准测试")
+    addOptions(parser, SIZES, OUTPUT, BASELINE)
+    parser.add_argument("--no-crypto", action="store_true", dest="noCrypto", help="跳过加解密吞吐与生成密码测试")
+    options = parser.parse_args(argv)
+    sizes = selectSizes(options, SIZES)
+
+    results = dict()
+    home = os.environ.get("HOME")
+    root = tempfile.mkdtemp(prefix="password-manager-bench-")
+    try:
+        if not options.noCrypto:
+            benchCrypto(results, options.repeat)
+            benchGenerate(results, options.repeat)
+        for count in sizes:
+            benchVault(results, count, options.repeat, root)
+    finally:
+        if home is None:
+            os.environ.pop("HOME", None)
+        else:
+            os.environ["HOME"] = home
+        shutil.rmtree(root, ignore_errors=True)
+    return finish(options, results, {"sizes": sizes})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from paths import getPath
+
+# 离线泄露密码检查：把 SHA-1 泄露库(每行 "40位十六进制哈希[:次数]")转换为排序好的二进制文件后内存映射查询
+#   python breach.py convert pwned-passwords-sha1.txt [输出文件]    默认输出到 ~/password_manager/breach.bin
+#   python breach.py check                                         从标准输入逐行读取密码，输出是否泄露
+# 文件布局：头部 | 按哈希前两字节的累计条数(65536 个 u64) | 布隆过滤器 | 排序去重后的 20 字节哈希
+# 查询时先查布隆过滤器，绝大多数未泄露的密码到此为止；命中时在前两字节对应的区间内二分查找
+# 整个文件只做内存映射，常驻内存的只有实际访问到的页
+MAGIC = b"PMBH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQI4x")  # magic 版本 保留 条数 布隆位数 布隆哈希数
+FANOUT = 1 << 16
+FANOUT_SIZE = FANOUT * 8
+HASH_SIZE = 20
+BITS_PER_ENTRY = 10  # 约 1% 的误判率
+BLOOM_HASHES = 7
+RUN_SIZE = 1 << 22  # 转换时每批在内存中排序的条数(约 400 MB)
+FILE_NAME = "breach.bin"
+
+
+class BreachError(ValueError):
+    pass
+
+
+def corpusPath():
+    return getPath(FILE_NAME)
+
+
+def bloomIndexes(digest, bits, count=BLOOM_HASHES):
+    # SHA-1 本身分布均匀，直接取两段作双重哈希
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(count)]
+
+
+class BreachCorpus:
+    def __init__(self, filePath):
+        self.filePath = filePath
+        with open(filePath, 'rb') as f:
+            # 空文件不能内存映射
+            if os.fstat(f.fileno()).st_size < HEADER.size + FANOUT_SIZE:
+                raise BreachError("泄露库文件不完整")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.parse()
+        except BreachError:
+            self.mm.close()
+            raise
+        if hasattr(mmap, "MADV_RANDOM"):
+            self.mm.madvise(mmap.MADV_RANDOM)
+
+    def parse(self):
+        if len(self.mm) < HEADER.size + FANOUT_SIZE:
+            raise BreachError("泄露库文件不完整")
+        magic, version, _, self.count, self.bloomBits, self.bloomHashes = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise BreachError("不是泄露库文件，请先用 breach.py convert 转换")
+        self.bloomOffset = HEADER.size + FANOUT_SIZE
+        self.hashOffset = self.bloomOffset + self.bloomBits // 8
+        if len(self.mm) != self.hashOffset + self.count * HASH_SIZE:
+            raise BreachError("泄露库文件不完整")
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.count
+
+    def bucket(self, digest):
+        # 前两字节相同的哈希所在的条目区间
+        prefix = int.from_bytes(digest[:2], "big")
+        end = struct.unpack_from("<Q", self.mm, HEADER.size + prefix * 8)[0]
+        start = struct.unpack_from("<Q", self.mm, HEADER.size + (prefix - 1) * 8)[0] if prefix else 0
+        return start, end
+
+    def containsDigest(self, digest):
+        mm = self.mm
+        for i in bloomIndexes(digest, self.bloomBits, self.bloomHashes):
+            if not mm[self.bloomOffset + (i >> 3)] >> (i & 7) & 1:
+                return False
+        lo, hi = self.bucket(digest)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self.hashOffset + mid * HASH_SIZE
+            value = mm[offset:offset + HASH_SIZE]
+            if value < digest:
+                lo = mid + 1
+            elif value > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains(self, password):
+        return self.containsDigest(hashlib.sha1(password.encode("utf-8")).digest())
+
+
+corpora = dict()
+
+
+def openCorpus(filePath=None):
+    # 没有泄露库时返回 None；文件被替换后重新打开
+    filePath = filePath or corpusPath()
+    try:
+        st = os.stat(filePath)
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = corpora.get(filePath)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    corpus = BreachCorpus(filePath)
+    corpora[filePath] = (stamp, corpus)
+    if cached is not None:
+        cached[1].close()
+    return corpus
+
+
+def parseLine(line):
+    # "哈希:次数" 或只有哈希；空行返回 None
+    line = line.strip()
+    if not line:
+        return None
+    text = line.split(b":", 1)[0]
+    if len(text) != HASH_SIZE * 2:
+        raise BreachError(f"无法识别的行:{line[:60]!r}")
+    try:
+        return bytes.fromhex(text.decode("ascii"))
+    except ValueError:
+        raise BreachError(f"无法识别的行:{line[:60]!r}")
+
+
+def writeRun(hashes, directory):
+    hashes.sort()
+    f = tempfile.TemporaryFile(dir=directory)
+    f.write(b"".join(hashes))
+    f.seek(0)
+    return f
+
+
+def readRun(f, chunkSize=HASH_SIZE * 4096):
+    while True:
+        block = f.read(chunkSize)
+        if not block:
+            return
+        for i in range(0, len(block), HASH_SIZE):
+            yield block[i:i + HASH_SIZE]
+
+
+def readHashes(textPath):
+    with open(textPath, 'rb') as f:
+        for line in f:
+            digest = parseLine(line)
+            if digest is not None:
+                yield digest
+
+
+def scan(textPath, progress=None):
+    # 第一遍：统计条数并检查是否已按哈希排序
+    total = 0
+    ordered = True
+    last = b""
+    for digest in readHashes(textPath):
+        if digest < last:
+            ordered = False
+        last = digest
+        total += 1
+        if progress is not None and total % 1000000 == 0:
+            progress("读取", total)
+    return total, ordered
+
+
+def sortedHashes(textPath, directory, progress=None):
+    # 已按哈希排序的文件(如官方 ordered-by-hash 版本)直接流式读取；否则分批排序写入临时文件后归并
+    # 返回 (排序后的哈希迭代器, 总条数, 临时文件列表)
+    total, ordered = scan(textPath, progress)
+    if ordered:
+        return readHashes(textPath), total, []
+    runs = []
+    batch = []
+    for digest in readHashes(textPath):
+        batch.append(digest)
+        if len(batch) >= RUN_SIZE:
+            runs.append(writeRun(batch, directory))
+            batch = []
+    if batch:
+        runs.append(writeRun(batch, directory))
+    return heapq.merge(*[readRun(run) for run in runs]), total, runs
+
+
+def convert(textPath, outPath=None, bitsPerEntry=BITS_PER_ENTRY, progress=None):
+    # 返回写入的条数；先写到临时文件，完成后整体替换
+    outPath = outPath or corpusPath()
+    directory = os.path.dirname(os.path.abspath(outPath))
+    os.makedirs(directory, exist_ok=True)
+    hashes, total, runs = sortedHashes(textPath, directory, progress)
+    bloomBits = max(64, (total * bitsPerEntry + 63) // 64 * 64)
+    bloomOffset = HEADER.size + FANOUT_SIZE
+    hashOffset = bloomOffset + bloomBits // 8
+    tmpPath = outPath + ".tmp"
+    count = 0
+    try:
+        with open(tmpPath, 'w+b') as f:
+            # 按去重前的条数预留空间，写完后截断
+            f.truncate(hashOffset + total * HASH_SIZE)
+            with mmap.mmap(f.fileno(), 0) as mm:
+                fanout = [0] * FANOUT
+                last = None
+                for digest in hashes:
+                    if digest == last:
+                        continue
+                    last = digest
+                    offset = hashOffset + count * HASH_SIZE
+                    mm[offset:offset + HASH_SIZE] = digest
+                    for i in bloomIndexes(digest, bloomBits):
+                        mm[bloomOffset + (i >> 3)] |= 1 << (i & 7)
+                    fanout[int.from_bytes(digest[:2], "big")] += 1
+                    count += 1
+                    if progress is not None and count % 1000000 == 0:
+                        progress("写入", count)
+                cumulative = 0
+                for i in range(FANOUT):
+                    cumulative += fanout[i]
+                    fanout[i] = cumulative
+                mm[HEADER.size:bloomOffset] = struct.pack(f"<{FANOUT}Q", *fanout)
+                mm[:HEADER.size] = HEADER.pack(MAGIC, VERSION, 0, count, bloomBits, BLOOM_HASHES)
+                mm.flush()
+            f.truncate(hashOffset + count * HASH_SIZE)
+            os.fsync(f.fileno())
+        os.replace(tmpPath, outPath)
+    finally:
+        for run in runs:
+            run.close()
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="breach.py", description="离线泄露密码检查")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convertParser = commands.add_parser("convert", help="把 SHA-1 文本泄露库转换为二进制格式")
+    convertParser.add_argument("text")
+    convertParser.add_argument("output", nargs="?", help=f"默认 {corpusPath()}")
+    convertParser.add_argument("--bits", type=int, default=BITS_PER_ENTRY, help="布隆过滤器每条的位数")
+    checkParser = commands.add_parser("check", help="从标准输入逐行读取密码并检查")
+    checkParser.add_argument("--corpus", help=f"默认 {corpusPath()}")
+    options = parser.parse_args(argv)
+    try:
+        if options.command == "convert":
+            count = convert(options.text, options.output, options.bits,
+                            lambda stage, n: print(f"{stage} {n} 条", file=sys.stderr, flush=True))
+            print(f"已写入 {count} 条:{options.output or corpusPath()}", file=sys.stderr)
+            return 0
+        corpus = openCorpus(options.corpus)
+        if corpus is None:
+            raise BreachError("没有泄露库文件，请先用 breach.py convert 转换")
+        found = 0
+        for line in sys.stdin:
+            leaked = corpus.contains(line.rstrip("\r\n"))
+            found += leaked
+            print("已泄露" if leaked else "未发现")
+        return 1 if found else 0
+    except (OSError, BreachError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import argparse
+import getpass
+import json
+import os
+import shlex
+import sys
+from generate_password import PasswordPolicy, generatePasswords
+from paths import hasFile
+import profiler
+
+# 命令行入口：不导入 Qt，加密与存储模块在需要解锁时才导入
+#   python cli.py [--json] [--agent] [--key-stdin | --key-env 变量名] 命令 ...
+KEY_ENV = "PASSWORD_MANAGER_KEY"
+
+# 加上 --agent 时交给已解锁的代理(agent.py)执行的只读命令
+AGENT_COMMANDS = ("get", "list", "search")
+
+
+class CliError(Exception):
+    pass
+
+
+class LineParser(argparse.ArgumentParser):
+    # 批量执行时某一行的参数有误只报告该行，不退出进程
+    def error(self, message):
+        raise CliError(message)
+
+
+def addCommands(commands):
+    get = commands.add_parser("get", help="输出账户的密码")
+    get.add_argument("platform")
+    get.add_argument("account", nargs="?", help="平台只有一个账户时可以省略")
+
+    ls = commands.add_parser("list", help="列出全部平台，或某个平台下的账户")
+    ls.add_argument("platform", nargs="?")
+
+    search = commands.add_parser("search", help="按名称搜索平台和账户")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+
+    add = commands.add_parser("add", help="添加账户，平台不存在时一并创建")
+    add.add_argument("platform")
+    add.add_argument("account")
+    add.add_argument("password", nargs="?",
+                     help="写在命令行中的密码其他进程可见，建议只在批量文件中使用；省略时从标准输入读取")
+    add.add_argument("--generate", type=int, metavar="长度", help="生成指定长度的随机密码")
+    addPolicyOptions(add)
+    add.add_argument("--force", action="store_true", help="账户已存在时覆盖密码")
+
+    rm = commands.add_parser("rm", help="删除账户；省略账户时删除整个平台")
+    rm.add_argument("platform")
+    rm.add_argument("account", nargs="?")
+
+    generate = commands.add_parser("generate", help="生成随机密码，不需要密钥")
+    generate.add_argument("--length", type=int, default=14)
+    generate.add_argument("--count", type=int, default=1)
+    addPolicyOptions(generate)
+    generate.add_argument("--entropy", action="store_true", help="在标准错误输出密码的熵(位)")
+
+
+def addPolicyOptions(parser):
+    parser.add_argument("--no-special", action="store_true", dest="noSpecial", help="生成的密码不含特殊字符")
+    parser.add_argument("--no-ambiguous", action="store_true", dest="noAmbiguous", help="排除 Il1O0 等易混淆字符")
+    parser.add_argument("--alphabet", default="", help="只使用这些字符，不再要求包含每类字符")
+
+
+def makePolicy(args, length):
+    classes = ("lower", "upper", "digit") if args.noSpecial else ("lower", "upper", "digit", "special")
+    try:
+        # 与 generatePassword 一致：长度不足以包含每类字符时不作要求
+        return PasswordPolicy(length, classes, required=length >= len(classes), excludeAmbiguous=args.noAmbiguous,
+                              alphabet=args.alphabet)
+    except ValueError as e:
+        raise CliError(str(e))
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="密码管理器命令行")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--agent", action="store_true", help="查询命令交给已运行的代理，不必输入密钥")
+    parser.add_argument("--key-stdin", action="store_true", dest="keyStdin", help="从标准输入的第一行读取密钥")
+    parser.add_argument("--key-env", default=KEY_ENV, dest="keyEnv", metavar="变量名",
+                        help=f"从环境变量读取密钥，默认 {KEY_ENV}")
+    commands = parser.add_subparsers(dest="command", required=True)
+    addCommands(commands)
+    batch = commands.add_parser("batch", help="依次执行文件中的命令，每行一条，- 表示标准输入")
+    batch.add_argument("file")
+    return parser
+
+
+def buildLineParser():
+    parser = LineParser(prog="", add_help=False)
+    addCommands(parser.add_subparsers(dest="command", required=True))
+    return parser
+
+
+def readLine(prompt):
+    # 标准输入是终端时提示输入且不回显，否则读取一行
+    if sys.stdin.isatty():
+        return getpass.getpass(prompt)
+    line = sys.stdin.readline()
+    if line == "":
+        raise CliError("标准输入已结束")
+    return line.rstrip("\r\n")
+
+
+def readKey(options):
+    if options.keyStdin:
+        return readLine("密钥:")
+    key = os.environ.get(options.keyEnv)
+    if key:
+        return key
+    if sys.stdin.isatty():
+        return getpass.getpass("密钥:")
+    raise CliError(f"未提供密钥：请设置环境变量 {options.keyEnv} 或使用 --key-stdin")
+
+
+class Session:
+    # 第一条需要保险库的命令到来时才解锁，只生成密码时不必输入密钥
+    def __init__(self, options):
+        self.options = options
+        self.data = None
+        self.key = None
+        self.client = None
+
+    def useAgent(self, args):
+        return getattr(self.options, "agent", False) and args.command in AGENT_COMMANDS
+
+    def open(self):
+        if self.data is None:
+            if not hasFile():
+                raise CliError("还没有数据文件，请先运行图形界面设置密钥")
+            key = readKey(self.options)
+            from container import CorruptedError
+            from ui_data import loadFile
+            try:
+                self.data = loadFile(key)
+            except CorruptedError as e:
+                raise CliError(str(e))
+            except Exception:
+                raise CliError("密钥错误")
+            self.key = key
+        return self.data
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        if self.data is not None and not self.data.close():
+            raise CliError("有修改未能保存")
+
+
+def findAccount(data, platform, account):
+    if not data.hasPlatform(platform):
+        raise CliError(f"平台不存在:{platform}")
+    accounts = data.getAccount(platform)
+    if account is None:
+        if len(accounts) != 1:
+            raise CliError(f"平台 {platform} 有{len(accounts)}个账户，请指定账户")
+        return accounts[0]
+    if account not in accounts:
+        raise CliError(f"账户不存在:{platform} {account}")
+    return account
+
+
+def run(args, session):
+    # 执行一条命令，返回 (JSON 结果, 文本输出的各行)
+    if args.command == "generate":
+        if args.count < 1:
+            raise CliError("数量必须大于0")
+        policy = makePolicy(args, args.length)
+        if args.entropy:
+            print(f"熵:{policy.entropyBits():.1f} 位", file=sys.stderr)
+        passwords = generatePasswords(args.count, policy)
+        return passwords, passwords
+    if session.useAgent(args):
+        return runAgent(args, session)
+    data = session.open()
+    if args.command == "get":
+        account = findAccount(data, args.platform, args.account)
+        password = data.getPassword(args.platform, account, session.key)
+        return {"platform": args.platform, "account": account, "password": password}, [password]
+    if args.command == "list":
+        if args.platform is None:
+            names = data.getPlatforms()
+        elif data.hasPlatform(args.platform):
+            names = list(data.getAccount(args.platform))
+        else:
+            raise CliError(f"平台不存在:{args.platform}")
+        return names, names
+    if args.command == "search":
+        entries = [list(entry) for entry in data.search(args.query, args.limit)]
+        return entries, searchLines(entries)
+    if args.command == "add":
+        exists = args.account in data.getAccount(args.platform)
+        if exists and not args.force:
+            raise CliError(f"账户已存在:{args.platform} {args.account}，覆盖请加 --force")
+        generated = args.generate is not None
+        if generated:
+            password = generatePasswords(1, makePolicy(args, args.generate))[0]
+        elif args.password is not None:
+            password = args.password
+        else:
+            password = readLine("密码:")
+        if password == "":
+            raise CliError("密码不可为空")
+        data.addPlatform(args.platform, session.key)
+        data.addAccount(args.platform, args.account, password, session.key)
+        result = {"platform": args.platform, "account": args.account, "replaced": exists}
+        if generated:
+            result["password"] = password
+        return result, [password] if generated else []
+    if args.command == "rm":
+        if args.account is None:
+            if not data.hasPlatform(args.platform):
+                raise CliError(f"平台不存在:{args.platform}")
+            data.deletePlatform(args.platform, session.key)
+        else:
+            data.deleteAccount(args.platform, findAccount(data, args.platform, args.account), session.key)
+        return {"platform": args.platform, "account": args.account}, []
+    raise CliError(f"未知命令:{args.command}")
+
+
+def searchLines(entries):
+    return [platform if account is None else f"{platform}\t{account}" for platform, account in entries]
+
+
+def runAgent(args, session):
+    from agent import AgentClient, AgentError
+    if session.client is None:
+        session.client = AgentClient()
+    try:
+        if args.command == "get":
+            result = session.client.request("get", platform=args.platform, account=args.account)
+            return result, [result["password"]]
+        if args.command == "list":
+            names = session.client.request("list", platform=args.platform)
+            return names, names
+        entries = session.client.request("search", query=args.query, limit=args.limit)
+        return entries, searchLines(entries)
+    except AgentError as e:
+        raise CliError(str(e))
+    except OSError as e:
+        raise CliError(f"无法连接代理:{e}")
+
+
+def readBatch(filePath):
+    # 返回 [(行号, 命令行)]，空行和 # 开头的行跳过
+    if filePath == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(filePath, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    commands = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            commands.append((number, line))
+    return commands
+
+
+def runBatch(options, session):
+    # 所有修改放在一个事务里，结束时只写入一次；出错的行单独报告，不影响其他行
+    parser = buildLineParser()
+    commands = []
+    for number, line in readBatch(options.file):
+        try:
+            commands.append((number, parser.parse_args(shlex.split(line))))
+        except (CliError, ValueError) as e:
+            commands.append((number, CliError(str(e))))
+    if any(not isinstance(args, CliError) and args.command != "generate" and not session.useAgent(args)
+           for _, args in commands):
+        data = session.open()
+        with data.transaction(session.key):
+            return runCommands(options, session, commands)
+    return runCommands(options, session, commands)
+
+
+def runCommands(options, session, commands):
+    failed = 0
+    for number, args in commands:
+        try:
+            if isinstance(args, CliError):
+                raise args
+            result, lines = run(args, session)
+        except CliError as e:
+            failed += 1
+            report(options, number, error=str(e))
+            continue
+        report(options, number, result, lines)
+    return failed
+
+
+def report(options, number, result=None, lines=(), error=None):
+    if options.json:
+        entry = {"line": number, "error": error} if error is not None else {"line": number, "result": result}
+        print(json.dumps(entry, ensure_ascii=False))
+    elif error is not None:
+        print(f"第{number}行: {error}", file=sys.stderr)
+    else:
+        for line in lines:
+            print(line)
+
+
+def main(argv=None):
+    options = buildParser().parse_args(argv)
+    profiler.startFromEnv()
+    session = Session(options)
+    try:
+        if options.command == "batch":
+            if options.keyStdin and options.file == "-":
+                raise CliError("批量命令来自标准输入时，密钥请通过环境变量提供")
+            failed = runBatch(options, session)
+            session.close()
+            return 1 if failed else 0
+        result, lines = run(options, session)
+        session.close()
+    except (CliError, OSError) as e:
+        if options.json:
+            print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        else:
+            print(f"错误: {e}", file=sys.stderr)
+        return 1
+    if options.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        for line in lines:
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import struct
+import encrypt
+import metrics
+
+# 二进制容器：固定头部 + [密钥校验值] + 参数 + 密文
+#   magic(4) 版本(2) 加密方式(1) 标志(1) 参数长度(2) 密文长度(8)
+MAGIC = b"PMVT"
+VERSION = 2
+CIPHER_AES_CBC = 1  # 只出现在最初的 base64 文本格式中，没有完整性校验，容器不再接受
+CIPHER_AES_GCM = 2
+headerStruct = struct.Struct("<4sHBBHQ")
+
+# 头部带有密钥校验值，密钥错误时不用解密密文即可拒绝
+FLAG_KEY_CHECK = 1
+KEY_CHECK_SIZE = 16
+
+
+class WrongKeyError(ValueError):
+    pass
+
+
+class CorruptedError(ValueError):
+    pass
+
+
+def keyCheck(key) -> bytes:
+    return hmac.new(encrypt.keyBytes(key), b"password-manager key check", hashlib.sha256).digest()[:KEY_CHECK_SIZE]
+
+# 超过该大小的文件用 mmap 读取，避免整体复制到内存
+MMAP_THRESHOLD = 1 << 20
+
+
+def packHeader(payloadLen, params=None, cipher=CIPHER_AES_GCM, check=b"") -> bytes:
+    paramBytes = json.dumps(params, separators=(",", ":")).encode() if params else b""
+    flags = FLAG_KEY_CHECK if check else 0
+    return headerStruct.pack(MAGIC, VERSION, cipher, flags, len(paramBytes), payloadLen) + check + paramBytes
+
+
+def isContainer(buf) -> bool:
+    return bytes(buf[:len(MAGIC)]) == MAGIC
+
+
+def readHeader(view):
+    # 解析头部，不要求后面的密文完整；返回 (头部, 密文起始位置)
+    if len(view) < headerStruct.size or not isContainer(view):
+        raise CorruptedError("不是有效的数据文件")
+    magic, version, cipher, flags, paramLen, payloadLen = headerStruct.unpack_from(view)
+    if version > VERSION:
+        raise ValueError(f"数据文件版本过高:{version}")
+    checkLen = KEY_CHECK_SIZE if flags & FLAG_KEY_CHECK else 0
+    start = headerStruct.size + checkLen + paramLen
+    if len(view) < start:
+        raise CorruptedError("数据文件不完整")
+    try:
+        params = json.loads(bytes(view[headerStruct.size + checkLen:start])) if paramLen else {}
+        if not isinstance(params, dict):
+            raise ValueError(params)
+        # 参数在密钥校验之前就用于派生密钥，超出范围的代价可能是被篡改的
+        if "kdf" in params:
+            encrypt.checkKdfParams(params)
+    except ValueError:
+        raise CorruptedError("数据文件头部无效")
+    header = {"version": version, "cipher": cipher, "flags": flags, "params": params,
+              "check": bytes(view[headerStruct.size:headerStruct.size + checkLen]), "payloadLen": payloadLen}
+    return header, start
+
+
+def unpack(buf):
+    # 返回 (头部, 密文)，密文是 buf 的切片视图，不复制数据
+    view = memoryview(buf)
+    header, start = readHeader(view)
+    if len(view) < start + header["payloadLen"]:
+        raise CorruptedError("数据文件不完整")
+    return header, view[start:start + header["payloadLen"]]
+
+
+# key 为已派生的密钥；params 中含有 KDF 参数时，打开时可直接传入口令
+def seal(plaintext: bytes, key, params=None) -> bytes:
+    # 密文长度固定比明文多 nonce 与标签，可以先生成头部并作为附加数据一起认证
+    payloadLen = encrypt.GCM_NONCE_SIZE + len(plaintext) + encrypt.GCM_TAG_SIZE
+    header = packHeader(payloadLen, params, CIPHER_AES_GCM, keyCheck(key))
+    return header + encrypt.gcmEncryptBytes(plaintext, key, header)
+
+
+def decrypt(view, key):
+    header, start = readHeader(view)
+    if isinstance(key, str) and "kdf" in header["params"]:
+        key = encrypt.deriveKey(key, header["params"])
+    # 先比对头部的校验值(常数时间)，密钥错误时不读取密文
+    if header["check"] and not hmac.compare_digest(header["check"], keyCheck(key)):
+        raise WrongKeyError("密钥错误")
+    if len(view) < start + header["payloadLen"]:
+        raise CorruptedError("数据文件不完整")
+    # 只接受认证加密：没有完整性校验的密文可以被改动或替换而不被发现
+    if header["cipher"] != CIPHER_AES_GCM:
+        raise CorruptedError(f"不支持的加密方式:{header['cipher']}")
+    payload = view[start:start + header["payloadLen"]]
+    try:
+        return header, encrypt.gcmDecryptBytes(payload, key, bytes(view[:start]))
+    except ValueError:
+        raise CorruptedError("数据文件已损坏或被篡改")
+    finally:
+        payload.release()
+
+
+def openBytes(buf, key, legacy=False):
+    # 解密一个容器，返回 (头部, 明文, 是否为旧格式)；legacy 为真时还接受最初的 base64 文本格式，只用于迁移
+    view = memoryview(buf)
+    if isContainer(view):
+        try:
+            header, plaintext = decrypt(view, key)
+        finally:
+            view.release()
+        return header, plaintext, False
+    view.release()
+    if not legacy:
+        raise CorruptedError("不是有效的数据文件")
+    raw = base64.b64decode(bytes(buf))
+    return {"version": 0, "cipher": CIPHER_AES_CBC, "flags": 0, "params": {}, "check": b""}, \
+        encrypt.aesDecryptBytes(raw, key), True
+
+
+def readFile(filePath, key, legacy=False):
+    with open(filePath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        metrics.count("io.bytesRead", size)
+        if size < MMAP_THRESHOLD:
+            return openBytes(f.read(), key, legacy)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return openBytes(view, key, legacy)
+            finally:
+                view.release()
+
+
+def readAddressed(filePath, digest):
+    # 按内容寻址的文件：文件名为内容的 sha256，读出后核对，被换成其他文件时能发现
+    with open(filePath, 'rb') as f:
+        blob = f.read()
+    metrics.count("io.bytesRead", len(blob))
+    if hashlib.sha256(blob).hexdigest() != digest:
+        raise CorruptedError("数据文件已损坏或被篡改")
+    return blob
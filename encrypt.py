@@ -1,7 +1,30 @@
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+from collections import OrderedDict
 import base64
 import hashlib
+import hmac
+import json
+import math
+import time
+import metrics
+
+# 已派生的密钥，按 (口令, 参数) 的进程内指纹缓存，解锁后的操作不再重复计算 KDF
+keyCache = OrderedDict()
+keyCacheSize = 8
+processSecret = get_random_bytes(32)
+
+# scrypt 的代价范围，内存占用约为 128 * r * n 字节
+SCRYPT_MIN_N = 1 << 14
+SCRYPT_MAX_N = 1 << 17
+SCRYPT_MAX_R = 16
+SCRYPT_MAX_P = 4
+PBKDF2_MIN_ITERATIONS = 200000
+PBKDF2_MAX_ITERATIONS = 10000000
+SALT_SIZES = range(16, 65)
+
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
 
 
 # 补齐函数：PKCS7 padding
@@ -15,22 +38,152 @@ def unpad(data: bytes) -> bytes:
     return data[:-padLen]
 
 
-# 加密函数
-def aesEncrypt(plaintext: str, key: str) -> str:
-    key_bytes = hashlib.sha256(key.encode()).digest()  # 生成32字节密钥
+def isCount(value, low, high):
+    return type(value) is int and low <= value <= high
+
+
+# 参数来自文件头部，在密钥校验之前就会用到，可能被改成极大的代价来耗尽内存和时间，超出范围时拒绝
+def checkKdfParams(params):
+    kdf = params.get("kdf", "sha256")
+    if kdf == "sha256":
+        return
+    salt = params.get("salt")
+    try:
+        saltOk = isinstance(salt, str) and len(bytes.fromhex(salt)) in SALT_SIZES
+    except ValueError:
+        saltOk = False
+    if kdf == "scrypt":
+        n = params.get("n")
+        ok = (isCount(n, SCRYPT_MIN_N, SCRYPT_MAX_N) and n & (n - 1) == 0
+              and isCount(params.get("r"), 1, SCRYPT_MAX_R) and isCount(params.get("p"), 1, SCRYPT_MAX_P))
+    elif kdf == "pbkdf2":
+        ok = isCount(params.get("iterations"), PBKDF2_MIN_ITERATIONS, PBKDF2_MAX_ITERATIONS)
+    else:
+        raise ValueError(f"未知的密钥派生算法:{kdf}")
+    if not (ok and saltOk):
+        raise ValueError("密钥派生参数超出范围")
+
+
+@metrics.timed("encrypt.kdf")
+def runKdf(password: bytes, params) -> bytes:
+    checkKdfParams(params)
+    kdf = params.get("kdf", "sha256")
+    if kdf == "sha256":
+        # 旧版本：直接对口令做一次 SHA-256
+        return hashlib.sha256(password).digest()
+    salt = bytes.fromhex(params["salt"])
+    if kdf == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=128 * r * (n + p + 2) + (1 << 20), dklen=32)
+    if kdf == "pbkdf2":
+        return hashlib.pbkdf2_hmac("sha256", password, salt, params["iterations"], 32)
+    raise ValueError(f"未知的密钥派生算法:{kdf}")
+
+
+# 由口令和参数派生32字节密钥，结果在本进程内缓存
+def deriveKey(password: str, params=None) -> bytes:
+    params = params or {}
+    material = json.dumps(params, sort_keys=True).encode() + b"\0" + password.encode()
+    fingerprint = hmac.new(processSecret, material, hashlib.sha256).digest()
+    if fingerprint in keyCache:
+        keyCache.move_to_end(fingerprint)
+        return keyCache[fingerprint]
+    key = runKdf(password.encode(), params)
+    keyCache[fingerprint] = key
+    while len(keyCache) > keyCacheSize:
+        keyCache.popitem(last=False)
+    return key
+
+
+def clearKeyCache():
+    keyCache.clear()
+
+
+# 测量本机速度，选出解锁耗时约为 target 秒的 KDF 代价(不含盐)
+def calibrate(target=0.5):
+    sample = {"salt": "00" * 16}
+    if hasattr(hashlib, "scrypt"):
+        cost = {"kdf": "scrypt", "n": SCRYPT_MIN_N, "r": 8, "p": 1}
+        start = time.perf_counter()
+        runKdf(b"calibrate", dict(cost, **sample))
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        exponent = round(math.log2(SCRYPT_MIN_N * target / elapsed))
+        cost["n"] = min(max(1 << max(exponent, 0), SCRYPT_MIN_N), SCRYPT_MAX_N)
+        return cost
+    cost = {"kdf": "pbkdf2", "iterations": 50000}
+    start = time.perf_counter()
+    runKdf(b"calibrate", dict(cost, **sample))
+    elapsed = max(time.perf_counter() - start, 1e-6)
+    cost["iterations"] = min(max(int(cost["iterations"] * target / elapsed), PBKDF2_MIN_ITERATIONS),
+                             PBKDF2_MAX_ITERATIONS)
+    return cost
+
+
+# 按给定代价生成一组新的参数(随机盐)
+def newKdfParams(cost):
+    params = {k: v for k, v in cost.items() if k != "salt"}
+    params["salt"] = get_random_bytes(16).hex()
+    return params
+
+
+# key 可以是口令(旧版本，做一次 SHA-256)或已派生的32字节密钥
+def keyBytes(key) -> bytes:
+    if isinstance(key, str):
+        return hashlib.sha256(key.encode()).digest()
+    return bytes(key)
+
+
+# 加密函数：返回 IV + 密文
+@metrics.timed("encrypt.aesEncrypt")
+def aesEncryptBytes(data: bytes, key) -> bytes:
+    key_bytes = keyBytes(key)
     iv = get_random_bytes(AES.block_size)  # 随机IV
     cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
-    ciphertext = cipher.encrypt(pad(plaintext.encode()))
-    encrypted = base64.b64encode(iv + ciphertext).decode()
+    metrics.count("encrypt.bytesEncrypted", len(data))
+    return iv + cipher.encrypt(pad(data))
+
+
+# 解密函数：raw 为 IV + 密文，可以是 bytes 或 memoryview
+@metrics.timed("encrypt.aesDecrypt")
+def aesDecryptBytes(raw, key) -> bytes:
+    key_bytes = keyBytes(key)
+    iv = bytes(raw[:AES.block_size])
+    cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
+    metrics.count("encrypt.bytesDecrypted", len(raw) - AES.block_size)
+    return unpad(cipher.decrypt(raw[AES.block_size:]))
+
+
+# 认证加密：返回 nonce + 密文 + 标签，aad 为需要一并认证但不加密的数据(如文件头)
+@metrics.timed("encrypt.gcmEncrypt")
+def gcmEncryptBytes(data: bytes, key, aad=b"") -> bytes:
+    nonce = get_random_bytes(GCM_NONCE_SIZE)
+    cipher = AES.new(keyBytes(key), AES.MODE_GCM, nonce=nonce, mac_len=GCM_TAG_SIZE)
+    cipher.update(aad)
+    metrics.count("encrypt.bytesEncrypted", len(data))
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return nonce + ciphertext + tag
+
+
+# 密钥错误或数据被改动时标签校验失败，抛出 ValueError
+@metrics.timed("encrypt.gcmDecrypt")
+def gcmDecryptBytes(raw, key, aad=b"") -> bytes:
+    if len(raw) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+        raise ValueError("密文不完整")
+    nonce = bytes(raw[:GCM_NONCE_SIZE])
+    cipher = AES.new(keyBytes(key), AES.MODE_GCM, nonce=nonce, mac_len=GCM_TAG_SIZE)
+    cipher.update(aad)
+    metrics.count("encrypt.bytesDecrypted", len(raw) - GCM_NONCE_SIZE - GCM_TAG_SIZE)
+    return cipher.decrypt_and_verify(raw[GCM_NONCE_SIZE:-GCM_TAG_SIZE], bytes(raw[-GCM_TAG_SIZE:]))
+
+
+# 加密函数
+def aesEncrypt(plaintext: str, key) -> str:
+    encrypted = base64.b64encode(aesEncryptBytes(plaintext.encode(), key)).decode()
     return encrypted
 
 
 # 解密函数
-def aesDecrypt(encrypted: str, key: str) -> str:
-    key_bytes = hashlib.sha256(key.encode()).digest()
+def aesDecrypt(encrypted: str, key) -> str:
     raw = base64.b64decode(encrypted)
-    iv = raw[:AES.block_size]
-    ciphertext = raw[AES.block_size:]
-    cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
-    plaintext = unpad(cipher.decrypt(ciphertext)).decode()
+    plaintext = aesDecryptBytes(raw, key).decode()
     return plaintext
@@ -0,0 +1,153 @@
+import base64
+import csv
+import json
+import os
+import time
+import container
+import encrypt
+from ui_data import iterEntries
+
+ARCHIVE_MAGIC = "password-manager-archive"
+ARCHIVE_VERSION = 4
+
+
+class ExportResult:
+    def __init__(self):
+        self.entries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def throughput(self):
+        return self.entries / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return (f"ExportResult(entries={self.entries}, bytes={self.bytes}, seconds={self.seconds:.3f}, "
+                f"throughput={self.throughput():.0f}/s)")
+
+
+def csvLines(entries):
+    # 与 Chrome 导出格式一致，可直接被 importer 读回
+    class Line:
+        def write(self, text):
+            self.text = text
+
+    line = Line()
+    writer = csv.writer(line, lineterminator="\n")
+    writer.writerow(["name", "url", "username", "password"])
+    yield line.text
+    for platform, account, password in entries:
+        writer.writerow([platform, "", account, password])
+        yield line.text
+
+
+def jsonLines(entries):
+    yield "[\n"
+    first = True
+    for platform, account, password in entries:
+        item = json.dumps({"platform": platform, "account": account, "password": password}, ensure_ascii=False)
+        yield ("  " if first else ",\n  ") + item
+        first = False
+    yield "\n]\n"
+
+
+def archiveLines(entries, archiveKey, chunkSize=256, kdfTarget=0.5):
+    # 便携加密包：首行为明文头部(含 KDF 参数)，之后每行为一组记录(JSON Lines)，用 AES-GCM 容器加密后 base64 编码
+    # 每组的序号与是否为最后一组写在容器头部，随头部一起认证，截断、删除或调换顺序都能发现
+    params = encrypt.newKdfParams(encrypt.calibrate(kdfTarget))
+    derived = encrypt.deriveKey(archiveKey, params)
+    yield json.dumps({"format": ARCHIVE_MAGIC, "version": ARCHIVE_VERSION, "kdf": params}) + "\n"
+    chunk = []
+    seq = 0
+    for platform, account, password in entries:
+        # 攒满一组后先不写出，等到确认后面还有记录，才能知道它不是最后一组
+        if len(chunk) >= chunkSize:
+            yield sealChunk(chunk, derived, seq, False)
+            chunk = []
+            seq += 1
+        chunk.append(json.dumps({"platform": platform, "account": account, "password": password},
+                                ensure_ascii=False))
+    # 没有记录时也写出一个空的最后一组
+    yield sealChunk(chunk, derived, seq, True)
+
+
+def sealChunk(chunk, key, seq, final):
+    sealed = container.seal("\n".join(chunk).encode("utf-8"), key, {"seq": seq, "final": final})
+    return base64.b64encode(sealed).decode() + "\n"
+
+
+def openChunk(line, key, seq):
+    # 返回 (本组的记录, 是否为最后一组)
+    try:
+        header, plaintext, _ = container.openBytes(base64.b64decode(line, validate=True), key)
+        text = plaintext.decode("utf-8")
+    except container.WrongKeyError:
+        raise container.WrongKeyError("导出文件的密码错误")
+    except (container.CorruptedError, ValueError):
+        raise container.CorruptedError("导出文件已损坏或被篡改")
+    if header["params"].get("seq") != seq:
+        raise container.CorruptedError("导出文件的记录顺序错误或有缺失")
+    return (text.split("\n") if text else []), header["params"].get("final") is True
+
+
+def readArchive(f, archiveKey):
+    header = json.loads(f.readline())
+    if header.get("format") != ARCHIVE_MAGIC:
+        raise ValueError("不是加密导出文件")
+    if header.get("version") != ARCHIVE_VERSION or "kdf" not in header:
+        raise ValueError(f"不支持的加密导出文件版本:{header.get('version')}")
+    try:
+        encrypt.checkKdfParams(header["kdf"])
+    except ValueError:
+        raise container.CorruptedError("导出文件的密钥派生参数无效")
+    key = encrypt.deriveKey(archiveKey, header["kdf"])
+    seq = 0
+    final = False
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if final:
+            raise container.CorruptedError("导出文件在最后一组之后还有内容")
+        items, final = openChunk(line, key, seq)
+        seq += 1
+        for item in items:
+            yield json.loads(item)
+    if not final:
+        raise container.CorruptedError("导出文件不完整")
+
+
+def exportFile(key, filePath, fileFormat="csv", platforms=None, archiveKey=None, progress=None):
+    # fileFormat: csv / json / archive，platforms 为 None 时导出全部平台
+    result = ExportResult()
+    start = time.perf_counter()
+
+    def counted():
+        for entry in iterEntries(key, platforms):
+            result.entries += 1
+            yield entry
+            if progress is not None and result.entries % 1000 == 0:
+                result.seconds = time.perf_counter() - start
+                progress(result)
+
+    if fileFormat == "csv":
+        lines = csvLines(counted())
+    elif fileFormat == "json":
+        lines = jsonLines(counted())
+    elif fileFormat == "archive":
+        if not archiveKey:
+            raise ValueError("加密导出需要设置密码")
+        lines = archiveLines(counted(), archiveKey)
+    else:
+        raise ValueError(f"未知格式:{fileFormat}")
+
+    # 导出文件含有明文密码，只允许本人读写；已存在的文件沿用原来的权限，先收紧
+    fd = os.open(filePath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with open(fd, 'w', encoding="utf-8", newline="") as f:
+        for line in lines:
+            f.write(line)
+        result.bytes = f.tell()
+    result.seconds = time.perf_counter() - start
+    if progress is not None:
+        progress(result)
+    return result
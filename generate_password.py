@@ -1,16 +1,135 @@
-import secrets
+import functools
+import math
+import os
 import string
 
+# 字符类别，顺序即界面上复选框的顺序
+LOWER = string.ascii_lowercase
+UPPER = string.ascii_uppercase
+DIGITS = string.digits
+SPECIAL = "!@#$%^&*()_+-=[]{}|;:,.<>?/"
+CLASSES = {"lower": LOWER, "upper": UPPER, "digit": DIGITS, "special": SPECIAL}
+AMBIGUOUS = "Il1|O0o`'\";:,."  # 容易看错或抄错的字符
+MAX_LENGTH = 1024
+
+
+class PasswordPolicy:
+    # classes 为使用的字符类别；required 时每个类别至少出现一次
+    # alphabet 不为空时改用自定义字符集，不再区分类别
+    def __init__(self, length=14, classes=tuple(CLASSES), required=True, excludeAmbiguous=False, alphabet="",
+                 maxLength=MAX_LENGTH):
+        self.length = length
+        self.classes = tuple(classes)
+        self.required = required
+        self.excludeAmbiguous = excludeAmbiguous
+        self.alphabet = alphabet
+        self.maxLength = maxLength
+        self.groups = self.buildGroups()
+        self.chars = "".join(self.groups)
+        self.check()
+
+    def buildGroups(self):
+        # 返回互不相交的字符组
+        if self.alphabet:
+            chars = dict.fromkeys(self.alphabet)  # 去重且保持顺序
+            groups = ["".join(chars)]
+        else:
+            unknown = [name for name in self.classes if name not in CLASSES]
+            if unknown:
+                raise ValueError(f"未知的字符类别:{','.join(unknown)}")
+            groups = [CLASSES[name] for name in CLASSES if name in self.classes]
+        if self.excludeAmbiguous:
+            groups = ["".join(c for c in group if c not in AMBIGUOUS) for group in groups]
+        return [group for group in groups if group]
+
+    def requiredGroups(self):
+        return self.groups if self.required and not self.alphabet else []
+
+    def check(self):
+        if self.length < 1:
+            raise ValueError("密码长度必须大于0")
+        if self.length > self.maxLength:
+            raise ValueError(f"密码长度不能超过{self.maxLength}")
+        if not self.chars:
+            raise ValueError("可用字符为空")
+        if len(self.chars) > 256:
+            raise ValueError("字符集最多256个字符")
+        if len(self.requiredGroups()) > self.length:
+            raise ValueError(f"密码长度至少为{len(self.requiredGroups())}才能包含每类字符")
+
+    def combinations(self):
+        # 满足策略的密码总数：容斥计算至少缺一个必选类别的情况
+        total = 0
+        groups = self.requiredGroups()
+        for mask in range(1 << len(groups)):
+            missing = sum(len(group) for i, group in enumerate(groups) if mask >> i & 1)
+            sign = -1 if bin(mask).count("1") % 2 else 1
+            total += sign * (len(self.chars) - missing) ** self.length
+        return total
+
+    def entropyBits(self):
+        # 每个满足策略的密码出现的概率相同，熵即总数的对数
+        return math.log2(self.combinations())
+
+
+@functools.lru_cache(maxsize=32)
+def translateTable(chars):
+    # 拒绝采样：只接受小于 n 的最大倍数的字节，返回 (映射表, 要丢弃的字节, 是否纯 ASCII)
+    n = len(chars)
+    limit = 256 - 256 % n
+    isAscii = all(ord(c) < 128 for c in chars)
+    if isAscii:
+        # 纯 ASCII：一次 translate 同时完成拒绝与映射
+        table = bytes(ord(chars[b % n]) if b < limit else 0 for b in range(256))
+    else:
+        table = bytes(b % n if b < limit else 0 for b in range(256))
+    return table, bytes(range(limit, 256)), isAscii
+
+
+class RandomChars:
+    # 批量取随机字节，无偏地映射到字符集
+    def __init__(self, chars):
+        self.chars = chars
+        self.table, self.delete, self.ascii = translateTable(chars)
+        self.acceptRate = (256 - len(self.delete)) / 256
+        self.buffer = ""
+
+    def take(self, count):
+        while len(self.buffer) < count:
+            # 按接受率多取一些，通常一次就够
+            need = count - len(self.buffer)
+            raw = os.urandom(int(need / self.acceptRate * 1.1) + 16)
+            self.buffer += self.decode(raw.translate(self.table, self.delete))
+        chars, self.buffer = self.buffer[:count], self.buffer[count:]
+        return chars
+
+    def decode(self, accepted):
+        if self.ascii:
+            return accepted.decode("ascii")
+        return "".join(self.chars[i] for i in accepted)
+
+
+def generatePasswords(count, policy=None):
+    # 一次生成 count 个密码，缺少必选类别的整个密码丢弃重来，结果在满足策略的密码中均匀分布
+    policy = policy or PasswordPolicy()
+    if count < 0:
+        raise ValueError("数量不能小于0")
+    source = RandomChars(policy.chars)
+    groups = [frozenset(group) for group in policy.requiredGroups()]
+    length = policy.length
+    passwords = []
+    while len(passwords) < count:
+        block = source.take(length * (count - len(passwords)))
+        for i in range(0, len(block), length):
+            password = block[i:i + length]
+            chars = set(password)
+            if all(not group.isdisjoint(chars) for group in groups):
+                passwords.append(password)
+    return passwords
+
 
 def generatePassword(length=14, useSpecialChars=True):
-    if length < 1:
-        raise ValueError("密码长度必须大于0")
-    letters = string.ascii_letters  # 大小写字母
-    digits = string.digits  # 数字
-    special_chars = "!@#$%^&*()_+-=[]{}|;:,.<>?/"  # 特殊字符
-
-    char_set = letters + digits
-    if useSpecialChars:
-        char_set += special_chars
-    password = ''.join(secrets.choice(char_set) for _ in range(length))
-    return password
+    classes = tuple(CLASSES) if useSpecialChars else ("lower", "upper", "digit")
+    # 太短时无法包含每类字符，不作要求
+    policy = PasswordPolicy(length, classes, required=length >= len(classes))
+    return generatePasswords(1, policy)[0]
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import bench
+
+# 图形界面基准测试：在 offscreen 平台下运行主窗口，按保险库规模测量
+# 主窗口的构建与首次显示、两个列表 refresh() 的耗时、点击平台到账户列表显示的耗时以及内存峰值
+#   python gui_bench.py [--sizes 100,1000,10000] [--full] [--output bench_gui_output.txt] ...
+# 每个规模在单独的子进程中运行，内存峰值互不影响；其余参数与 bench.py 相同
+SIZES = [100, 1000, 10000]
+OUTPUT = "bench_gui_output.txt"
+BASELINE = "bench_gui_baseline.json"
+CLICKS = 50  # 每个规模随机点击的平台数
+
+
+def peakRss():
+    # 本进程的内存峰值(MB)，Linux 上 ru_maxrss 的单位为 KB，macOS 上为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def benchWindow(count, repeat, results):
+    # 在子进程中运行：HOME 与 QT_QPA_PLATFORM 已由父进程设置
+    import ui_data
+    bench.makeVault(count)
+    memory = {"vault": peakRss()}
+    from PySide6.QtCore import Qt
+    from PySide6.QtTest import QTest
+    from PySide6.QtWidgets import QApplication
+    app = QApplication([])
+    import ui
+    # 不弹出密钥窗口，直接返回密钥
+    ui.MainWindow.ensureKey = lambda self: [True, bench.KEY]
+    suffix = f" n={count}"
+    memory["qt"] = peakRss()
+
+    def newWindow(i):
+        # 每次都重新加载，旧窗口的监听不会留在同一个 UIData 上
+        return ui_data.loadFile(bench.KEY),
+
+    def showWindow(win):
+        win.show()
+        app.processEvents()
+
+    windows = []
+    bench.record(results, "MainWindow()" + suffix,
+                 bench.measure(lambda data: windows.append(ui.MainWindow(data=data)), repeat, newWindow))
+    bench.record(results, "MainWindow.show" + suffix, bench.measure(showWindow, repeat, lambda i: (windows[i],)))
+    for win in windows[:-1]:
+        win.close()
+    win = windows[-1]
+    app.processEvents()
+
+    def refresh(menu):
+        menu.refresh()
+        app.processEvents()
+
+    bench.record(results, "PlatformMenu.refresh" + suffix,
+                 bench.measure(refresh, repeat * 4, lambda i: (win.platformMenu,)))
+    rng = random.Random(count)
+    platforms = win.data.getPlatforms()
+    win.accountMenu.platform = rng.choice(platforms)
+    bench.record(results, "AccountMenu.refresh" + suffix,
+                 bench.measure(refresh, repeat * 4, lambda i: (win.accountMenu,)))
+
+    # 点击平台列表中的一行，直到账户列表更新并重绘
+    view = win.platformMenu.listView
+    model = win.platformMenu.model
+
+    def scrollTo(i):
+        # 列表分批布局，滚动后可能要处理几轮事件，目标行才真正出现在视口中
+        index = model.index(model.names.index(rng.choice(platforms)))
+        for _ in range(1000):
+            view.scrollTo(index)
+            app.processEvents()
+            if view.indexAt(view.visualRect(index).center()) == index:
+                break
+        return index,
+
+    def click(index):
+        QTest.mouseClick(view.viewport(), Qt.LeftButton, pos=view.visualRect(index).center())
+        app.processEvents()
+        if win.accountMenu.platform != index.data():
+            raise RuntimeError(f"点击后账户列表没有切换到 {index.data()}")
+
+    bench.record(results, "点击平台到账户列表" + suffix, bench.measure(click, CLICKS, scrollTo))
+    memory["peak"] = peakRss()
+    # 先销毁窗口再关闭 QApplication，避免解释器退出时按任意顺序回收 Qt 对象
+    for win in windows:
+        win.close()
+        win.deleteLater()
+    windows.clear()
+    app.processEvents()
+    app.shutdown()
+    return memory
+
+
+def runSize(count, options, root):
+    home = os.path.join(root, f"vault{count}")
+    os.makedirs(home)
+    resultPath = os.path.join(root, f"result{count}.json")
+    env = dict(os.environ, HOME=home, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    print(f"{count} 个账户:", flush=True)
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(count), "--repeat", str(options.repeat),
+                    "--result", resultPath], env=env, check=True)
+    with open(resultPath, 'r') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gui_bench.py", description="图形界面基准测试")
+    bench.addOptions(parser, SIZES, OUTPUT, BASELINE)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.worker is not None:
+        results = dict()
+        memory = benchWindow(options.worker, options.repeat, results)
+        print(f"  内存峰值 {memory['peak']:.1f} MB(载入保险库后 {memory['vault']:.1f} MB，"
+              f"初始化 Qt 后 {memory['qt']:.1f} MB)", flush=True)
+        with open(options.result, 'w') as f:
+            json.dump({"results": results, "memory": memory}, f)
+        return 0
+
+    sizes = bench.selectSizes(options, SIZES)
+    results = dict()
+    memory = dict()
+    root = tempfile.mkdtemp(prefix="password-manager-gui-bench-")
+    try:
+        for count in sizes:
+            output = runSize(count, options, root)
+            results.update(output["results"])
+            memory[str(count)] = output["memory"]
+    except subprocess.CalledProcessError as e:
+        print(f"错误: 子进程退出码 {e.returncode}", file=sys.stderr)
+        return 2
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return bench.finish(options, results, {"sizes": sizes, "peakRssMB": memory})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
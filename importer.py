@@ -0,0 +1,249 @@
+import csv
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from urllib.parse import urlsplit
+from exporter import readArchive
+
+# 常见密码管理器/浏览器导出文件的列名(均为小写)
+platformColumns = ["name", "title", "platform"]
+urlColumns = ["url", "login_uri", "website", "uri", "origin_url"]
+accountColumns = ["username", "login_username", "login", "user", "user name", "email", "account"]
+passwordColumns = ["password", "login_password", "pass"]
+
+EMPTY_ACCOUNT = "(无用户名)"
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.added = 0
+        self.skipped = 0  # 缺少必要字段
+        self.duplicates = []  # 与已有数据完全相同
+        self.conflicts = []  # 同名账户但密码不同
+
+    def __repr__(self):
+        return (f"ImportResult(rows={self.rows}, added={self.added}, skipped={self.skipped}, "
+                f"duplicates={len(self.duplicates)}, conflicts={len(self.conflicts)})")
+
+
+def detectFormat(filePath):
+    ext = os.path.splitext(filePath)[1].lower()
+    if ext == ".pmarchive":
+        return "archive"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    return "csv"
+
+
+def readCsv(f):
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [h.strip().lower() for h in header]
+    for row in reader:
+        if row:
+            yield dict(zip(header, row))
+
+
+def readJsonLines(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def readJson(f, chunkSize=1 << 16):
+    # 流式解析：顶层为数组时逐个读出元素；顶层为对象时逐个读出 items 数组中的元素
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunkSize)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def peek():
+        skip(" \t\r\n")
+        return buffer[pos] if pos < len(buffer) else ""
+
+    def value():
+        nonlocal pos
+        while True:
+            skip(" \t\r\n")
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+                # 数字可能被截断，确认其后还有内容
+                if end < len(buffer) or eof:
+                    pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    def items():
+        nonlocal pos
+        pos += 1  # [
+        while peek() not in ("]", ""):
+            yield value()
+            skip(" \t\r\n,")
+        pos += 1
+
+    fill()
+    first = peek()
+    if first == "[":
+        yield from items()
+        return
+    if first != "{":
+        raise ValueError("无法识别的 JSON 格式")
+    pos += 1
+    while peek() not in ("}", ""):
+        name = value()
+        skip(" \t\r\n:")
+        if name == "items" and peek() == "[":
+            yield from items()
+        else:
+            value()
+        skip(" \t\r\n,")
+
+
+def readRows(filePath, fileFormat=None, archiveKey=None):
+    fileFormat = fileFormat or detectFormat(filePath)
+    with open(filePath, 'r', encoding="utf-8-sig", newline="") as f:
+        if fileFormat == "csv":
+            yield from readCsv(f)
+        elif fileFormat == "archive":
+            # 截断只有读到末尾才能发现，先完整解密校验，避免分批导入时已写入前面的记录
+            yield from list(readArchive(f, archiveKey))
+        elif fileFormat == "jsonl":
+            yield from readJsonLines(f)
+        else:
+            yield from readJson(f)
+
+
+def flatten(row):
+    # Bitwarden 等 JSON 导出把账户放在 login 字段中
+    flat = {}
+    for k, v in row.items():
+        if isinstance(v, dict):
+            flat.update(flatten(v))
+        elif isinstance(v, list):
+            if k == "uris" and v and isinstance(v[0], dict):
+                flat.setdefault("uri", v[0].get("uri") or "")
+        elif v is not None:
+            flat[str(k).strip().lower()] = str(v)
+    return flat
+
+
+def pick(row, columns, strip=True):
+    for column in columns:
+        value = row.get(column, "")
+        if value.strip():
+            return value.strip() if strip else value
+    return ""
+
+
+def hostName(url):
+    try:
+        host = urlsplit(url if "://" in url else "//" + url).hostname or ""
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def normalize(rows, mapping=None):
+    # 把任意格式的行映射为 (平台, 用户名, 密码)，缺少平台或密码时返回 None
+    for row in rows:
+        row = flatten(row)
+        if mapping:
+            platform = row.get(mapping.get("platform", ""), "").strip()
+            account = row.get(mapping.get("account", ""), "").strip()
+            password = row.get(mapping.get("password", ""), "")
+        else:
+            platform = pick(row, platformColumns) or hostName(pick(row, urlColumns))
+            account = pick(row, accountColumns)
+            password = pick(row, passwordColumns, strip=False)
+        if not platform or not password:
+            yield None
+            continue
+        yield platform, account or EMPTY_ACCOUNT, password
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def importFile(data, filePath, key, fileFormat=None, mapping=None, onConflict="skip", batchSize=500,
+               progress=None, archiveKey=None):
+    # onConflict: skip 保留原密码 / overwrite 覆盖 / rename 以新用户名另存
+    result = ImportResult()
+    # 只保存密码的带密钥哈希，用于发现文件内部的重复项
+    salt = secrets.token_bytes(16)
+    seen = dict()
+
+    def digest(password):
+        return hmac.new(salt, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def existing(platform, account):
+        if (platform, account) in seen:
+            return seen[(platform, account)]
+        if account in data.records.get(platform, {}):
+            return digest(data.getPassword(platform, account, key))
+        return None
+
+    for batch in batched(normalize(readRows(filePath, fileFormat, archiveKey), mapping), batchSize):
+        with data.transaction(key):
+            for entry in batch:
+                result.rows += 1
+                if entry is None:
+                    result.skipped += 1
+                    continue
+                platform, account, password = entry
+                old = existing(platform, account)
+                if old is not None:
+                    if hmac.compare_digest(old, digest(password)):
+                        result.duplicates.append((platform, account))
+                        continue
+                    result.conflicts.append((platform, account))
+                    if onConflict == "skip":
+                        continue
+                    if onConflict == "rename":
+                        n = 2
+                        while existing(platform, f"{account} ({n})") is not None:
+                            n += 1
+                        account = f"{account} ({n})"
+                if not data.hasPlatform(platform):
+                    data.addPlatform(platform, key)
+                data.addAccount(platform, account, password, key)
+                seen[(platform, account)] = digest(password)
+                result.added += 1
+        if progress is not None:
+            progress(result)
+    return result
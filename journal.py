@@ -0,0 +1,237 @@
+import json
+import os
+import struct
+import threading
+import zlib
+import container
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只在进程内互斥
+    fcntl = None
+
+
+# 已写入、但内容或目录项尚未落盘的新文件与目录；图形界面线程与保存线程都会用到
+pendingFiles = set()
+pendingDirs = set()
+pendingLock = threading.Lock()
+
+
+def syncDir(dirPath):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(dirPath, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# 原子写入：先写临时文件并落盘，再整体替换，写到一半崩溃也不会损坏原文件
+def writeAtomic(filePath, data):
+    tmpPath = filePath + ".tmp"
+    with open(tmpPath, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    metrics.count("io.bytesWritten", len(data))
+    os.replace(tmpPath, filePath)
+    syncDir(os.path.dirname(filePath))
+
+
+# 写入一个新的不可变文件(密码记录、分段)；文件与所在目录都延后到 syncPending 时一起落盘，
+# 图形界面线程上写入记录时不用等待磁盘，落盘在保存线程发布引用它的快照或日志之前进行
+def writeDurable(filePath, data):
+    with open(filePath, 'wb') as f:
+        f.write(data)
+    metrics.count("io.bytesWritten", len(data))
+    with pendingLock:
+        pendingFiles.add(filePath)
+        pendingDirs.add(os.path.dirname(filePath))
+
+
+def syncFile(filePath):
+    try:
+        fd = os.open(filePath, os.O_RDONLY)
+    except FileNotFoundError:  # 事务撤销时已删除
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# 发布引用新文件的快照或日志之前调用，崩溃后引用的文件一定完整存在
+def syncPending():
+    with pendingLock:
+        files = list(pendingFiles)
+        dirs = list(pendingDirs)
+        pendingFiles.clear()
+        pendingDirs.clear()
+    try:
+        for filePath in files:
+            syncFile(filePath)
+        for dirPath in dirs:
+            syncDir(dirPath)
+    except BaseException:
+        # 没有落盘的放回去，下次发布之前再试
+        with pendingLock:
+            pendingFiles.update(files)
+            pendingDirs.update(dirs)
+        raise
+    metrics.count("io.filesSynced", len(files))
+
+
+class VaultLock:
+    # 保险库的读-改-写锁：进程内为可重入锁，最外层再对数据目录加 flock，
+    # 图形界面、命令行与代理同时修改时不会互相覆盖；与 compactLock 同时使用时总是先取这个锁
+    def __init__(self, dirPath):
+        self.dirPath = dirPath
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            # 数据目录还不存在时没有可覆盖的数据，只在进程内互斥
+            if self.depth == 0 and fcntl is not None and os.path.isdir(self.dirPath):
+                fd = os.open(self.dirPath, os.O_RDONLY)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self.fd = fd
+        except BaseException:
+            self.lock.release()
+            raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and self.fd is not None:
+            fd, self.fd = self.fd, None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self.lock.release()
+
+
+# 把一组修改应用到索引上，所有操作都可以重复执行；setAccount 的条目为 [密码记录编号, 修改时间]
+# renameAccount 移动的是写入时索引中的条目，其他进程刚改过的密码不会被内存中的旧条目覆盖
+def applyOps(index, ops):
+    platforms = index["platforms"]
+    for op in ops:
+        if op[0] == "addPlatform":
+            platforms.setdefault(op[1], {})
+        elif op[0] == "deletePlatform":
+            platforms.pop(op[1], None)
+        elif op[0] == "setAccount":
+            platforms.setdefault(op[1], {})[op[2]] = op[3]
+        elif op[0] == "deleteAccount":
+            platforms.get(op[1], {}).pop(op[2], None)
+        elif op[0] == "renameAccount":
+            entry = platforms.get(op[1], {}).pop(op[2], None)
+            if entry is not None:
+                platforms[op[1]][op[3]] = entry
+        else:
+            raise ValueError(f"未知操作:{op[0]}")
+
+
+class Journal:
+    # 预写日志：文件头之后每条记录为 "校验和 序号 长度 密文容器"，序号递增，快照中记录已合并到的序号
+    MAGIC = b"PMJ\x01"
+    frameStruct = struct.Struct("<IQI")
+
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self.lock = threading.Lock()
+        self.compactLock = threading.Lock()
+        self.seq = 0
+        self.count = 0
+        self.ready = False  # 是否已从文件恢复过序号
+
+    @classmethod
+    def frame(cls, seq, payload):
+        body = struct.pack("<QI", seq, len(payload)) + payload
+        return struct.pack("<I", zlib.crc32(body)) + body
+
+    def append(self, key, ops):
+        with self.lock:
+            seq = self.seq + 1
+            payload = container.seal(json.dumps(ops).encode(), key)
+            syncPending()
+            with open(self.filePath, 'ab') as f:
+                if f.tell() == 0:
+                    f.write(self.MAGIC)
+                frame = self.frame(seq, payload)
+                f.write(frame)
+                f.flush()
+                os.fsync(f.fileno())
+            metrics.count("io.bytesWritten", len(frame))
+            metrics.count("journal.appends")
+            self.seq = seq
+            self.count += 1
+            return seq
+
+    def readFrames(self):
+        # 返回 [(序号, 密文容器)] 以及最后一条完整记录的结束位置
+        if not os.path.exists(self.filePath):
+            return [], 0
+        with open(self.filePath, 'rb') as f:
+            buf = f.read()
+        if buf and not buf.startswith(self.MAGIC[:len(buf)]):
+            raise container.CorruptedError("日志文件已损坏")
+        entries = []
+        # 文件头本身没写完时视为空日志
+        pos = end = len(self.MAGIC) if len(buf) >= len(self.MAGIC) else 0
+        size = self.frameStruct.size
+        while pos + size <= len(buf):
+            crc, seq, length = self.frameStruct.unpack_from(buf, pos)
+            body = buf[pos + 4:pos + size + length]
+            if len(body) != size - 4 + length or zlib.crc32(body) != crc:
+                break
+            entries.append((seq, body[size - 4:]))
+            pos += size + length
+            end = pos
+        return entries, end
+
+    def rewrite(self, entries):
+        if entries:
+            writeAtomic(self.filePath, self.MAGIC + b"".join(self.frame(s, p) for s, p in entries))
+        elif os.path.exists(self.filePath):
+            os.remove(self.filePath)
+        self.count = len(entries)
+
+    def replay(self, key, index):
+        # 启动恢复：把快照之后的记录重放到索引上，并截掉末尾写了一半的记录
+        with self.lock:
+            entries, end = self.readFrames()
+            if os.path.exists(self.filePath) and os.path.getsize(self.filePath) > end:
+                with open(self.filePath, 'r+b') as f:
+                    f.truncate(end)
+            lastSeq = index.get("journalSeq", 0)
+            for seq, payload in entries:
+                if seq > lastSeq:
+                    applyOps(index, json.loads(container.openBytes(payload, key)[1]))
+                    lastSeq = seq
+            index["journalSeq"] = lastSeq
+            self.seq = max(self.seq, lastSeq)
+            self.count = len(entries)
+            self.ready = True
+        return index
+
+    def pendingOps(self, key, seq):
+        # 返回序号大于 seq 的所有修改
+        with self.lock:
+            entries, end = self.readFrames()
+        return [json.loads(container.openBytes(p, key)[1]) for s, p in entries if s > seq]
+
+    def dropUpTo(self, seq):
+        # 快照已包含 seq 及之前的记录，只保留之后追加的部分
+        with self.lock:
+            entries, end = self.readFrames()
+            self.rewrite([(s, p) for s, p in entries if s > seq])
@@ -0,0 +1,114 @@
+from PySide6.QtWidgets import QDialog, QHBoxLayout, QLabel, QLineEdit, QMessageBox, QPushButton, QVBoxLayout, QWidget
+from paths import hasFile
+
+# 登录窗口只依赖 Qt 本身，加密与存储相关的模块在点击确认之后才导入
+
+
+class InitKey(QDialog):
+    def __init__(self, parent=None):
+        super(InitKey, self).__init__(parent)
+        self.setWindowTitle("设置密钥")
+        self.resize(400, 0)
+        self.keyEditLine = QLineEdit()
+        self.keyEnsureEditLine = QLineEdit()
+        self.button = QPushButton("确认")
+        self.key = ""
+        self.draw()
+        self.register()
+
+    def draw(self):
+        self.keyEditLine.setEchoMode(QLineEdit.Password)
+        self.keyEnsureEditLine.setEchoMode(QLineEdit.Password)
+        keyWidget = QWidget()
+        keyLayout = QHBoxLayout(keyWidget)
+        keyLayout.addWidget(QLabel("密钥:"))
+        keyLayout.addWidget(self.keyEditLine)
+
+        keyEnsureWidget = QWidget()
+        keyEnsureLayout = QHBoxLayout(keyEnsureWidget)
+        keyEnsureLayout.addWidget(QLabel("确认密钥:"))
+        keyEnsureLayout.addWidget(self.keyEnsureEditLine)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(keyWidget)
+        layout.addWidget(keyEnsureWidget)
+        layout.addWidget(self.button)
+
+    def register(self):
+        self.button.clicked.connect(self.ensure)
+
+    def ensure(self):
+        if self.keyEditLine.text() == "" or self.keyEnsureEditLine.text() == "":
+            QMessageBox.warning(self, "提示", "密钥不可为空")
+            return
+        if self.keyEditLine.text() != self.keyEnsureEditLine.text():
+            QMessageBox.warning(self, "提示", "两次密钥输入不同")
+            return
+        self.key = self.keyEditLine.text()
+        self.accept()
+
+
+class GetKeyWindow(QDialog):
+    def __init__(self, parent=None):
+        super(GetKeyWindow, self).__init__(parent)
+        self.setWindowTitle("登录")
+        self.resize(400, 0)
+        self.keyEditLine = QLineEdit()
+        self.button = QPushButton("确认")
+        self.key = ""
+        self.draw()
+        self.register()
+
+    def draw(self):
+        self.keyEditLine.setEchoMode(QLineEdit.Password)
+        keyWidget = QWidget()
+        keyLayout = QHBoxLayout(keyWidget)
+        keyLayout.addWidget(QLabel("密钥:"))
+        keyLayout.addWidget(self.keyEditLine)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(keyWidget)
+        layout.addWidget(self.button)
+
+    def register(self):
+        self.button.clicked.connect(self.ensure)
+
+    def ensure(self):
+        if self.keyEditLine.text() == "":
+            QMessageBox.warning(self, "提示", "密钥不可为空")
+            return
+        self.key = self.keyEditLine.text()
+        self.accept()
+
+
+def unlock(parent=None, profile=None):
+    # 显示登录(或首次设置密钥)窗口直到解锁成功，返回 UIData；取消时返回 None
+    if not hasFile():
+        win = InitKey(parent)
+        if profile is not None:
+            profile.watch(win, "登录窗口首次绘制")
+        win.show()
+        if win.exec_() != QDialog.Accepted:
+            return None
+        if profile is not None:
+            profile.mark("输入密钥", waiting=True)
+        from ui_data import initKey, loadFile
+        initKey(win.key)
+        return loadFile(win.key)
+    while True:
+        win = GetKeyWindow(parent)
+        if profile is not None:
+            profile.watch(win, "登录窗口首次绘制")
+        win.show()
+        if win.exec_() != QDialog.Accepted:
+            return None
+        if profile is not None:
+            profile.mark("输入密钥", waiting=True)
+        from container import CorruptedError
+        from ui_data import loadFile
+        try:
+            return loadFile(win.key)
+        except CorruptedError as e:
+            QMessageBox.warning(parent, "提示", str(e))
+        except Exception:
+            QMessageBox.warning(parent, "提示", "密钥错误")
@@ -1,9 +1,41 @@
 import sys
-import ui
-from PySide6.QtWidgets import QApplication
+import time
 
-if __name__ == '__main__':
+# 启动计时从这里开始；主界面、加密等模块在登录之后才导入，登录窗口可以尽快出现
+startTime = time.perf_counter()
+
+
+def main():
+    profile = None
+    profiling = "--startup-profile" in sys.argv
+    if profiling:
+        sys.argv.remove("--startup-profile")
+    from PySide6.QtWidgets import QApplication
+    if profiling:
+        from startup import StartupProfile
+        profile = StartupProfile(startTime)
+        profile.mark("导入 Qt")
     app = QApplication(sys.argv)
-    win = ui.MainWindow()
+    import profiler
+    profiler.startFromEnv()
+    import login
+    if profile is not None:
+        profile.mark("创建应用")
+    data = login.unlock(profile=profile)
+    if data is None:
+        sys.exit()
+    if profile is not None:
+        profile.mark("解锁")
+    import ui
+    if profile is not None:
+        profile.mark("导入主界面")
+    win = ui.MainWindow(data=data)
+    if profile is not None:
+        profile.mark("创建主窗口")
+        profile.watch(win, "主窗口首次绘制")
     win.show()
     app.exec()
+
+
+if __name__ == '__main__':
+    main()
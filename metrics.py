@@ -0,0 +1,145 @@
+import bisect
+import functools
+import json
+import threading
+import time
+
+# 进程内的性能统计：各项操作的耗时直方图与计数器(读写字节数、条目数等)
+# 默认关闭，关闭时每次调用只多一次布尔判断；只记录耗时和数量，不记录任何名称或内容
+enabled = False
+lock = threading.Lock()
+histograms = dict()  # 名称 -> Histogram
+counters = dict()  # 名称 -> 累计值
+
+# 直方图桶的上界(秒)：1 微秒起按 2 倍递增，约 67 秒以上都落在最后一个桶
+BUCKETS = [1e-6 * (1 << i) for i in range(27)]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def add(self, seconds):
+        # 落在第一个上界不小于耗时的桶
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        # 用所在桶的上界估计，误差不超过 2 倍
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": {f"{BUCKETS[i]:.6g}" if i < len(BUCKETS) else "inf": n
+                        for i, n in enumerate(self.counts) if n},
+        }
+
+
+def setEnabled(value):
+    global enabled
+    enabled = bool(value)
+
+
+def record(name, seconds):
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds)
+
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+def timed(name):
+    # 装饰器：记录函数的耗时，抛出异常的调用也计入
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Timer:
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+nullTimer = NullTimer()
+
+
+def timer(name):
+    # with metrics.timer("名称"): ...，关闭时返回共用的空计时器
+    return Timer(name) if enabled else nullTimer
+
+
+def snapshot():
+    with lock:
+        return {
+            "time": time.time(),
+            "enabled": enabled,
+            "histograms": {name: h.summary() for name, h in sorted(histograms.items())},
+            "counters": dict(sorted(counters.items())),
+        }
+
+
+def reset():
+    with lock:
+        histograms.clear()
+        counters.clear()
+
+
+def exportJson(filePath):
+    with open(filePath, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
@@ -0,0 +1,21 @@
+import os
+
+
+def getPath(*names):
+    return os.path.join(os.path.expanduser('~/password_manager'), *names)
+
+
+def hasFile():
+    return os.path.exists(getPath('password.txt'))
+
+
+def vaultStamp():
+    # 快照或日志变化(图形界面、命令行做了修改)时需要重新加载索引
+    stamp = []
+    for name in ('password.txt', 'journal'):
+        try:
+            st = os.stat(getPath(name))
+            stamp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
@@ -0,0 +1,157 @@
+import functools
+import io
+import itertools
+import os
+import threading
+import time
+from paths import getPath
+
+# 按需的 CPU 与内存分析：开启后，接下来的 N 次操作(解锁、修改、列表刷新等)各自用 cProfile 与 tracemalloc 记录，
+# 每次操作在 ~/password_manager/profiles 下写出 名称.txt(排序后的报告)、名称.prof 与 名称.tracemalloc
+#   PASSWORD_MANAGER_PROFILE=20 python main.py    或按住 Shift 打开 设置 菜单，选择 性能分析
+# 两种分析都只记录代码位置、调用次数、耗时与内存大小，不记录参数或字符串内容；
+# 写出的文件中家目录一律替换为 ~，不会带出用户名
+# cProfile、pstats、tracemalloc 导入约需 50 ms，真正开始分析时才导入
+ENV = "PASSWORD_MANAGER_PROFILE"
+DEFAULT_COUNT = 10
+TOP = 40  # 报告中列出的函数数
+TOP_MEMORY = 25  # 报告中列出的分配位置数
+FRAMES = 16  # tracemalloc 保存的调用栈深度
+
+remaining = 0
+lock = threading.Lock()  # 同一时间只分析一个操作；嵌套的操作已包含在外层的记录中
+sequence = itertools.count(1)
+
+
+def profileDir():
+    return getPath('profiles')
+
+
+def start(count=DEFAULT_COUNT):
+    global remaining
+    remaining = max(int(count), 0)
+
+
+def stop():
+    global remaining
+    remaining = 0
+
+
+def active():
+    return remaining > 0
+
+
+def startFromEnv():
+    # 环境变量为分析的操作数，不是数字时分析 DEFAULT_COUNT 次
+    value = os.environ.get(ENV, "")
+    if not value:
+        return
+    try:
+        start(int(value))
+    except ValueError:
+        start(DEFAULT_COUNT)
+
+
+def redact(text):
+    home = os.path.expanduser("~")
+    if home and home != "~" and home != os.sep:
+        text = text.replace(home, "~")
+    return text
+
+
+def redactStats(stats):
+    # 统计表的键为 (文件, 行号, 函数名)，调用者表中的键也要一起替换
+    def key(k):
+        return (redact(k[0]),) + k[1:]
+    stats.stats = {key(k): (cc, nc, tt, ct, {key(c): v for c, v in callers.items()})
+                   for k, (cc, nc, tt, ct, callers) in stats.stats.items()}
+    return stats
+
+
+def redactSnapshot(snapshot):
+    import tracemalloc
+    # 原始记录为 (内存域, 大小, ((文件, 行号), ...), 总帧数)；取不到时不写出原始快照
+    traces = getattr(snapshot.traces, "_traces", None)
+    if traces is None:
+        return None
+    traces = [(domain, size, tuple((redact(f), line) for f, line in frames)) + tuple(rest)
+              for domain, size, frames, *rest in traces]
+    return tracemalloc.Snapshot(traces, snapshot.traceback_limit)
+
+
+def writeReport(name, profile, before, after, elapsed, peak):
+    import pstats
+    import tracemalloc
+    directory = profileDir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{next(sequence):03d}-{name}")
+
+    stats = redactStats(pstats.Stats(profile))
+    stats.dump_stats(base + ".prof")
+    snapshot = redactSnapshot(after)
+    if snapshot is not None:
+        snapshot.dump(base + ".tracemalloc")
+
+    out = io.StringIO()
+    out.write(f"{name}  耗时 {elapsed * 1000:.1f} ms  内存峰值 {peak / 1024:.1f} KiB\n\n")
+    out.write("按累计耗时排序:\n")
+    stats.stream = out
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP)
+    out.write("按自身耗时排序:\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP // 2)
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    out.write("操作期间新增的内存(按位置):\n")
+    for stat in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")[:TOP_MEMORY]:
+        out.write(redact(str(stat)) + "\n")
+    with open(base + ".txt", 'w', encoding='utf-8') as f:
+        f.write(out.getvalue())
+    return base
+
+
+def capture(name, fn, *args, **kwargs):
+    global remaining
+    # 已有操作在分析中(嵌套调用或其他线程)时直接执行
+    if not lock.acquire(blocking=False):
+        return fn(*args, **kwargs)
+    try:
+        if remaining <= 0:
+            return fn(*args, **kwargs)
+        remaining -= 1
+        import cProfile
+        import tracemalloc
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        began = time.perf_counter()
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - began
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            try:
+                writeReport(name, profile, before, after, elapsed, peak)
+            except OSError:
+                # 写不出报告不影响操作本身
+                pass
+    finally:
+        lock.release()
+
+
+def profiled(name):
+    # 装饰器：未开启分析时只多一次判断
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if remaining <= 0:
+                return fn(*args, **kwargs)
+            return capture(name, fn, *args, **kwargs)
+        return wrapper
+    return decorator
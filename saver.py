@@ -0,0 +1,107 @@
+import threading
+import time
+
+# 保存状态
+SAVED = "saved"
+PENDING = "pending"
+SAVING = "saving"
+ERROR = "error"
+
+
+class SaveWorker:
+    # 后台保存线程：修改先排队立即返回，线程把排队的修改合并成一次写入
+    # write(key, ops) 在后台线程中调用；onStatus(状态, 异常) 也在后台线程中调用
+    def __init__(self, write, onStatus=None, delay=0.05):
+        self.write = write
+        self.onStatus = onStatus
+        self.delay = delay  # 收到修改后再等一小会儿，连续的修改合并成一次写入
+        self.cond = threading.Condition()
+        self.queue = []  # [(key, ops)]
+        self.busy = False
+        self.failed = False  # 上次写入失败，等待重试
+        self.closed = False
+        self.status = SAVED
+        self.error = None
+        self.writes = 0  # 实际写入的次数
+        self.thread = threading.Thread(target=self.run, name="SaveWorker", daemon=True)
+        self.thread.start()
+
+    def setStatus(self, status, error=None):
+        self.status = status
+        self.error = error
+        if self.onStatus is not None:
+            self.onStatus(status, error)
+
+    def put(self, key, ops):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("保存线程已停止")
+            if self.queue and self.queue[-1][0] == key:
+                self.queue[-1][1].extend(ops)
+            else:
+                self.queue.append((key, list(ops)))
+            # 有新的修改时顺便重试上次失败的写入
+            self.failed = False
+            self.cond.notify_all()
+        self.setStatus(PENDING)
+
+    def pending(self):
+        with self.cond:
+            return bool(self.queue) or self.busy
+
+    def run(self):
+        while True:
+            with self.cond:
+                while (not self.queue or self.failed) and not self.closed:
+                    self.cond.wait()
+                if not self.queue or self.failed:
+                    return
+            if self.delay:
+                time.sleep(self.delay)
+            with self.cond:
+                batch = self.queue
+                self.queue = []
+                self.busy = True
+            self.setStatus(SAVING)
+            error = None
+            for i, (key, ops) in enumerate(batch):
+                try:
+                    self.write(key, ops)
+                    self.writes += 1
+                except Exception as e:
+                    # 所有操作都可以重复执行，失败的部分放回队首，下次整体重试
+                    error = e
+                    with self.cond:
+                        self.queue[:0] = batch[i:]
+                    break
+            with self.cond:
+                self.busy = False
+                self.failed = error is not None
+                more = bool(self.queue)
+                self.cond.notify_all()
+            if error is not None:
+                self.setStatus(ERROR, error)
+            else:
+                self.setStatus(PENDING if more else SAVED)
+
+    def flush(self, timeout=None):
+        # 等待排队的修改全部写入，返回是否成功；上次失败的写入会再试一次
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if self.failed and self.queue:
+                self.failed = False
+                self.cond.notify_all()
+            while (self.queue or self.busy) and not self.failed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return not self.queue and not self.busy
+
+    def close(self, timeout=None):
+        ok = self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        return ok
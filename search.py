@@ -0,0 +1,231 @@
+import gc
+import heapq
+import re
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+
+# 模糊匹配的最低相似度(二元组的 Dice 系数)
+FUZZY_THRESHOLD = 0.4
+# 单个字符的查询匹配的条目太多，只在前缀树中最多走这么多个节点
+SHORT_QUERY_NODES = 2000
+
+
+def normalize(text):
+    return text.casefold().strip()
+
+
+def words(name):
+    # 整个名称以及按标点/空白切开的各个单词，都可以做前缀匹配
+    result = {w for w in re.split(r"[\W_]+", name) if w}
+    result.add(name)
+    return result
+
+
+def bigrams(name):
+    # 首尾加上标记，开头相同的名称得分更高
+    padded = f"\x02{name}\x03"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class SearchIndex:
+    # 平台与用户名的内存索引：前缀树做前缀匹配，二元组倒排表做子串和模糊匹配
+    # 条目为 (平台, 用户名)，平台本身的用户名为 None；只索引名称，不涉及任何密码
+    # 内部用整数编号代替条目，计数时不必反复计算元组的哈希
+    def __init__(self):
+        self.ids = dict()  # 条目 -> 编号
+        self.entries = dict()  # 编号 -> 条目
+        self.names = dict()  # 编号 -> 规范化后的名称
+        self.gramCounts = dict()  # 编号 -> 二元组个数
+        self.trie = dict()  # 字符 -> 子节点，节点的 "" 键为以此结尾的编号集合
+        self.postings = dict()  # 二元组 -> 编号集合
+        self.nextId = 0
+        # 尚未建立索引的平台字典，第一次查询时才建立
+        self.source = None
+
+    def __len__(self):
+        self.ensure()
+        return len(self.ids)
+
+    def clear(self):
+        self.ids.clear()
+        self.entries.clear()
+        self.names.clear()
+        self.gramCounts.clear()
+        self.trie.clear()
+        self.postings.clear()
+
+    def rebuild(self, platforms):
+        # 只记下平台字典，解锁与回滚时不必等待建立索引；之前的增删都已反映在字典中
+        self.clear()
+        self.source = platforms
+
+    def ensure(self):
+        if self.source is None:
+            return
+        platforms, self.source = self.source, None
+        # 一次创建大量节点时暂停垃圾回收，避免反复扫描刚建好的前缀树
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for platform, accounts in platforms.items():
+                self.add(platform)
+                for account in accounts:
+                    self.add(platform, account)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def add(self, platform, account=None):
+        entry = (platform, account)
+        if self.source is not None or entry in self.ids:
+            return
+        entryId = self.nextId
+        self.nextId += 1
+        name = normalize(platform if account is None else account)
+        self.ids[entry] = entryId
+        self.entries[entryId] = entry
+        self.names[entryId] = name
+        for word in words(name):
+            node = self.trie
+            for ch in word:
+                child = node.get(ch)
+                if child is None:
+                    child = node[ch] = {}
+                node = child
+            node.setdefault("", set()).add(entryId)
+        grams = bigrams(name)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(entryId)
+        self.gramCounts[entryId] = len(grams)
+
+    def remove(self, platform, account=None):
+        if self.source is not None:
+            return
+        entryId = self.ids.pop((platform, account), None)
+        if entryId is None:
+            return
+        name = self.names.pop(entryId)
+        del self.entries[entryId]
+        del self.gramCounts[entryId]
+        for word in words(name):
+            self.removeWord(self.trie, word, 0, entryId)
+        for gram in bigrams(name):
+            postings = self.postings.get(gram)
+            if postings is not None:
+                postings.discard(entryId)
+                if not postings:
+                    del self.postings[gram]
+
+    def removeWord(self, node, word, pos, entryId):
+        # 删除后顺便剪掉空的分支，返回该节点是否已为空
+        if pos == len(word):
+            entryIds = node.get("")
+            if entryIds is not None:
+                entryIds.discard(entryId)
+                if not entryIds:
+                    del node[""]
+        else:
+            child = node.get(word[pos])
+            if child is not None and self.removeWord(child, word, pos + 1, entryId):
+                del node[word[pos]]
+        return not node
+
+    def removePlatform(self, platform, accounts):
+        for account in accounts:
+            self.remove(platform, account)
+        self.remove(platform)
+
+    def rename(self, platform, account, newAccount):
+        self.remove(platform, account)
+        self.add(platform, newAccount)
+
+    def prefix(self, query, limit, maxNodes=None):
+        # 按广度优先收集以 query 开头的条目，较短的名称先返回，最多返回约 limit 个
+        # maxNodes 限制广度优先访问的节点数，超出后改为深度优先，尽快凑满 limit 个
+        node = self.trie
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                return []
+        result = []
+        level = [node]
+        while level and len(result) < limit:
+            nextLevel = []
+            for node in level:
+                for ch, child in node.items():
+                    if ch == "":
+                        result.extend(islice(child, limit - len(result)))
+                    else:
+                        nextLevel.append(child)
+            level = nextLevel
+            if maxNodes is not None:
+                maxNodes -= len(level)
+                if maxNodes <= 0:
+                    break
+        stack = level
+        while stack and len(result) < limit:
+            for ch, child in stack.pop().items():
+                if ch == "":
+                    result.extend(islice(child, limit - len(result)))
+                else:
+                    stack.append(child)
+        return result
+
+    def search(self, query, limit=50):
+        # 排序：完全相同 > 名称前缀 > 单词前缀 > 子串 > 模糊匹配(按相似度)，同级时名称短的在前
+        # 高一级的结果已经足够时不再计算低一级的，常见的短查询只走前缀树
+        # 单个字符只做前缀匹配，几乎每个名称都含有它，子串与模糊匹配没有意义
+        query = normalize(query)
+        if not query:
+            return []
+        self.ensure()
+        short = len(query) == 1
+        ranks = dict()
+        for entryId in self.prefix(query, limit * 4, SHORT_QUERY_NODES if short else None):
+            name = self.names[entryId]
+            tier = 0 if name == query else 1 if name.startswith(query) else 2
+            ranks[entryId] = (tier, 0.0, len(name))
+        if short:
+            return [self.entries[i] for i in heapq.nsmallest(limit, ranks, key=ranks.get)]
+        if len(ranks) < limit:
+            self.substring(query, limit, ranks)
+        if len(ranks) < limit:
+            self.fuzzy(query, limit, ranks)
+        return [self.entries[i] for i in heapq.nsmallest(limit, ranks, key=ranks.get)]
+
+    def substring(self, query, limit, ranks):
+        # 含有查询的全部二元组的条目才可能包含该子串，逐个检查其中最少的那个倒排表，凑够即停
+        postings = [self.postings.get(query[i:i + 2]) for i in range(len(query) - 1)]
+        if not all(postings):
+            return
+        candidates = min(postings, key=len)
+        found = 0
+        for entryId in candidates:
+            if entryId not in ranks and query in self.names[entryId]:
+                ranks[entryId] = (3, 0.0, len(self.names[entryId]))
+                found += 1
+                if found >= limit:
+                    return
+
+    def fuzzy(self, query, limit, ranks):
+        grams = bigrams(query)
+        postings = [p for p in (self.postings.get(g) for g in grams) if p]
+        # 超过半数条目都含有的二元组区分度很低，不参与计数，只在最后给候选条目补上
+        common = [p for p in postings if len(p) * 2 > len(self.ids)]
+        counts = Counter()
+        for p in postings:
+            if len(p) * 2 <= len(self.ids):
+                counts.update(p)
+        # 共有二元组数低于该值时相似度不可能达到阈值；候选很多时只看共有最多的一部分
+        minShared = FUZZY_THRESHOLD * len(grams) / 2 - len(common)
+        candidates = [item for item in counts.items() if item[1] >= minShared]
+        if len(candidates) > limit * 20:
+            candidates = heapq.nlargest(limit * 20, candidates, key=itemgetter(1))
+        for entryId, shared in candidates:
+            if entryId in ranks:
+                continue
+            shared += sum(1 for p in common if entryId in p)
+            score = 2 * shared / (len(grams) + self.gramCounts[entryId])
+            if score >= FUZZY_THRESHOLD:
+                ranks[entryId] = (4, -score, len(self.names[entryId]))
@@ -0,0 +1,78 @@
+import sys
+import time
+from PySide6.QtCore import QEvent, QObject
+
+# 启动耗时预算(秒)：(从哪个阶段结束后开始计时, 预算)，None 表示从 main.py 开始执行算起
+# 解锁本身的耗时由 KDF 校准决定，不计入主窗口的预算
+STARTUP_BUDGET = {
+    "登录窗口首次绘制": (None, 0.5),
+    "主窗口首次绘制": ("解锁", 0.5),
+}
+
+# 登录窗口出现之前不应加载的模块
+DEFERRED_MODULES = ["Crypto", "pyperclip", "ui", "ui_data", "container", "importer", "exporter"]
+
+
+class StartupProfile(QObject):
+    # 记录启动各阶段的耗时，窗口第一次绘制时打点；等待用户输入的时间单独记录，不计入总耗时
+    def __init__(self, start):
+        super(StartupProfile, self).__init__()
+        self.start = start
+        self.last = start
+        self.phases = []  # [(名称, 耗时, 是否在等待输入)]
+        self.watched = dict()  # 窗口 -> 阶段名称
+        self.loaded = dict()  # 阶段名称 -> (已加载模块数, 提前加载的模块)
+
+    def mark(self, name, waiting=False):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last, waiting))
+        self.last = now
+
+    def watch(self, widget, name):
+        if name in self.loaded or name in self.watched.values():
+            return
+        self.watched[widget] = name
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj in self.watched:
+            name = self.watched.pop(obj)
+            obj.removeEventFilter(self)
+            self.mark(name)
+            self.loaded[name] = (len(sys.modules), [m for m in DEFERRED_MODULES if m in sys.modules])
+            if not self.watched and name == "主窗口首次绘制":
+                self.report()
+        return False
+
+    def elapsed(self, name, since=None):
+        # 从 since 阶段结束(或开始执行)到 name 阶段结束，不含等待输入的时间
+        total = 0.0
+        counting = since is None
+        for phase, seconds, waiting in self.phases:
+            if counting and not waiting:
+                total += seconds
+            if phase == since:
+                counting = True
+            if phase == name:
+                break
+        return total
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        print("启动耗时(从 main.py 开始执行计时):", file=stream)
+        for name, seconds, waiting in self.phases:
+            note = " (等待输入，不计入)" if waiting else ""
+            print(f"  {seconds * 1000:8.1f} ms  {name}{note}", file=stream)
+        for name, (since, budget) in STARTUP_BUDGET.items():
+            if name not in self.loaded:
+                continue
+            seconds = self.elapsed(name, since)
+            state = "OK" if seconds <= budget else "超出预算"
+            start = "开始执行" if since is None else since
+            print(f"{name}: 从{start}起 {seconds * 1000:.1f} ms / 预算 {budget * 1000:.0f} ms {state}", file=stream)
+            count, early = self.loaded[name]
+            if since is None:
+                print(f"  已加载模块 {count} 个，提前加载: {', '.join(early) or '无'}", file=stream)
+            else:
+                print(f"  已加载模块 {count} 个", file=stream)
+        stream.flush()
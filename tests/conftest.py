@@ -0,0 +1,41 @@
+import os
+import sys
+import pytest
+
+# 各模块都直接放在仓库根目录下
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encrypt  # noqa: E402
+import ui_data  # noqa: E402
+
+KEY = "测试口令"
+# 测试不需要校准 KDF，统一使用最低代价
+LOW_COST = {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N, "r": 8, "p": 1}
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    # 每个测试使用独立的数据目录；按路径缓存的日志、备份库、锁以及各项缓存都要清空
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(encrypt, "calibrate", lambda target=0.5: dict(LOW_COST))
+    monkeypatch.setattr(ui_data, "segmentCache", (None, {}))
+    for cache in (ui_data.journals, ui_data.backupStores, ui_data.vaultLocks, ui_data.headerCache):
+        cache.clear()
+    encrypt.clearKeyCache()
+    os.makedirs(tmp_path / "password_manager")
+    yield tmp_path
+    encrypt.clearKeyCache()
+
+
+@pytest.fixture
+def vault(home):
+    ui_data.initKey(KEY)
+    data = ui_data.loadFile(KEY)
+    yield data
+    data.close()
+
+
+def reopen():
+    # 模拟重新启动：丢弃进程内的日志状态后重新加载
+    ui_data.journals.clear()
+    return ui_data.loadFile(KEY)
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import agent
+import cli
+import ui_data
+from conftest import KEY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def running(vault, home, monkeypatch):
+    # 在独立的进程中启动代理，套接字在临时数据目录下
+    monkeypatch.setenv(cli.KEY_ENV, KEY)
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "agent.py"), "start", "--timeout", "60"],
+                            cwd=ROOT, env=dict(os.environ), stderr=subprocess.PIPE, text=True)
+    try:
+        assert "代理已启动" in proc.stderr.readline()
+        yield proc
+    finally:
+        try:
+            agent.AgentClient().request("stop")
+        except (OSError, agent.AgentError):
+            proc.kill()
+        proc.wait(10)
+        proc.stderr.close()
+
+
+def command(capsys, *argv):
+    code = cli.main(["--json", *argv])
+    output = capsys.readouterr().out
+    assert code == 0, output
+    return json.loads(output)
+
+
+def testGetAndSetThroughAgent(running, capsys):
+    assert command(capsys, "add", "gh", "alice", "pa")["replaced"] is False
+    assert command(capsys, "--agent", "get", "gh", "alice")["password"] == "pa"
+    # 命令行修改后，代理重新加载
+    assert command(capsys, "add", "--force", "gh", "alice", "pb")["replaced"] is True
+    assert command(capsys, "--agent", "get", "gh")["password"] == "pb"
+    assert command(capsys, "--agent", "list", "gh") == ["alice"]
+    assert command(capsys, "--agent", "search", "ali") == [["gh", "alice"]]
+    assert cli.main(["--agent", "get", "gh", "bob"]) == 1
+    assert "账户不存在" in capsys.readouterr().err
+    status = agent.AgentClient().request("ping")
+    assert status["pid"] == running.pid and status["requests"] >= 5
+    assert os.stat(agent.socketPath()).st_mode & 0o777 == 0o600
+
+
+def testAgentWaitsForWriter(running, vault):
+    with vault.transaction(KEY):
+        vault.addPlatform("gh", KEY)
+        vault.addAccount("gh", "alice", "pa", KEY)
+    client = agent.AgentClient(timeout=10)
+    assert client.request("get", platform="gh", account="alice")["password"] == "pa"
+    results = []
+    # 本进程持有保险库锁写到一半时，代理的查询要等锁释放后读到写完的数据
+    with ui_data.getVaultLock():
+        vault.changeAccount("gh", "alice", "alice", "pb", KEY)
+        reader = threading.Thread(
+            target=lambda: results.append(client.request("get", platform="gh", account="alice")))
+        reader.start()
+        time.sleep(0.5)
+        assert reader.is_alive() and not results
+        vault.addAccount("gh", "bob", "pc", KEY)
+    reader.join(10)
+    assert results[0]["password"] == "pb"
+    assert client.request("list", platform="gh") == ["alice", "bob"]
+    client.close()
+    # 已有代理在运行时不能再启动一个
+    with pytest.raises(agent.AgentError):
+        agent.removeStale(agent.socketPath())
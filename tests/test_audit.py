@@ -0,0 +1,97 @@
+import time
+import audit
+from conftest import KEY, reopen
+
+STRONG = "Tq8#vLz!4mWr@9Kd"
+
+
+def fill(data, entries):
+    with data.transaction(KEY):
+        for platform, account, password in entries:
+            if not data.hasPlatform(platform):
+                data.addPlatform(platform, KEY)
+            data.addAccount(platform, account, password, KEY)
+
+
+def byName(result):
+    return {(e.platform, e.account): e for e in result.entries}
+
+
+def testReuseGroups(vault):
+    fill(vault, [
+        ("github", "alice", "shared-一"), ("gitlab", "alice", "shared-一"), ("mail", "alice", "shared-一"),
+        ("github", "bob", "shared-二"), ("bank", "bob", "shared-二"),
+        ("forum", "carol", STRONG),
+    ])
+    result = audit.auditVault(vault, KEY)
+    entries = byName(result)
+    assert result.groups == 2
+    first = {entries[k].group for k in [("github", "alice"), ("gitlab", "alice"), ("mail", "alice")]}
+    second = {entries[k].group for k in [("github", "bob"), ("bank", "bob")]}
+    assert len(first) == len(second) == 1 and first != second and 0 not in first | second
+    assert [entries[("github", "alice")].shared, entries[("bank", "bob")].shared] == [3, 2]
+    assert "重复使用" in entries[("bank", "bob")].issues
+    forum = entries[("forum", "carol")]
+    assert (forum.group, forum.shared) == (0, 1) and "重复使用" not in forum.issues
+
+
+def testStaleFromIndexTime(vault, monkeypatch):
+    # alice 的密码在 400 天前写入；按索引中记下的修改时间计算，与记录文件的时间无关
+    now = time.time()
+    with monkeypatch.context() as m:
+        m.setattr(time, "time", lambda: now - 400 * 86400)
+        fill(vault, [("github", "alice", STRONG), ("gitlab", "bob", STRONG + "x")])
+    vault.changeAccount("gitlab", "bob", "bob", "新的" + STRONG, KEY)
+    result = audit.auditVault(reopen(), KEY)
+    entries = byName(result)
+    assert entries[("github", "alice")].ageDays == 400
+    assert "长期未更换" in entries[("github", "alice")].issues
+    assert entries[("gitlab", "bob")].ageDays == 0
+    assert result.stale == 1
+    assert audit.auditVault(vault, KEY, staleDays=401).stale == 0
+    # 把时间往后拨，两个都超过期限
+    monkeypatch.setattr(time, "time", lambda: now + 366 * 86400)
+    assert audit.auditVault(vault, KEY).stale == 2
+
+
+def testCommonPassword():
+    level, entropy, issues = audit.scorePassword("Password123!")
+    assert "常见密码" in issues
+    assert entropy <= 10.0 and level == 0
+    assert "常见密码" not in audit.scorePassword(STRONG)[2]
+    assert audit.scorePassword(STRONG)[0] >= 3
+
+
+def testContainsName():
+    plain = audit.scorePassword("xK9#mQ2!alicewonder")
+    named = audit.scorePassword("xK9#mQ2!alicewonder", ("github", "alice@example.com"))
+    assert "包含平台名或用户名" in named[2] and "包含平台名或用户名" not in plain[2]
+    assert named[1] < plain[1]
+    # 平台名取第一段，太短的名称不参与比较
+    assert "包含平台名或用户名" in audit.scorePassword("mygithub2024pw", ("github.com", "x"))[2]
+    assert "包含平台名或用户名" not in audit.scorePassword("qq-zz-Tq8#vLz", ("qq", "zz"))[2]
+
+
+def testPoolPath(vault, monkeypatch):
+    entries = [(f"site{i}", "user", "same-密码" if i % 2 else f"{STRONG}{i}") for i in range(8)]
+    fill(vault, entries)
+    monkeypatch.setattr(audit, "POOL_THRESHOLD", 4)
+    monkeypatch.setattr(audit, "CHUNK", 3)
+    pools = []
+
+    class Pool(audit.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(audit, "ProcessPoolExecutor", Pool)
+    calls = []
+    result = audit.auditVault(vault, KEY, workers=2, progress=lambda done, total: calls.append((done, total)))
+    assert len(pools) == 1
+    assert calls == [(3, 8), (6, 8), (8, 8)]
+    # 与单进程的结果相同
+    monkeypatch.setattr(audit, "POOL_THRESHOLD", 10 ** 9)
+    expected = audit.auditVault(vault, KEY)
+    assert [(e.platform, e.account, e.level, e.shared, e.issues) for e in result.entries] == \
+        [(e.platform, e.account, e.level, e.shared, e.issues) for e in expected.entries]
+    assert result.groups == 1 and byName(result)[("site1", "user")].shared == 4
@@ -0,0 +1,79 @@
+import backup
+import time
+import pytest
+import ui_data
+from conftest import KEY
+
+
+@pytest.fixture
+def everySave(vault):
+    # 每次保存都收入备份库
+    ui_data.saveConfig({"backupInterval": 0})
+    return vault
+
+
+def testRestoreBackup(everySave, monkeypatch):
+    data = everySave
+    data.addPlatform("gh", KEY)
+    data.addAccount("gh", "alice", "old", KEY)
+    oldEntry = ui_data.listBackups()[-1]["id"]
+    data.changeAccount("gh", "alice", "", "new", KEY)
+    data.addAccount("gh", "bob", "pb", KEY)
+    newEntry = ui_data.listBackups()[-1]["id"]
+    # 只被备份引用的旧记录不会被清理(把时间拨到一小时后，刚写入的记录也在清理范围内)
+    later = time.time() + 3600
+    with monkeypatch.context() as m:
+        m.setattr(time, "time", lambda: later)
+        ui_data.collectRecords(KEY, ui_data.loadIndex(KEY))
+
+    data.restoreBackup(oldEntry, KEY)
+    assert data.getAccount("gh") == ["alice"]
+    assert data.getPassword("gh", "alice", KEY) == "old"
+
+    data.restoreBackup(newEntry, KEY)
+    assert data.getAccount("gh") == ["alice", "bob"]
+    assert data.getPassword("gh", "alice", KEY) == "new"
+
+
+def testRestoreRejectsOtherKey(everySave):
+    data = everySave
+    data.addPlatform("gh", KEY)
+    data.addAccount("gh", "alice", "old", KEY)
+    oldEntry = ui_data.listBackups()[-1]["id"]
+    data.changeKey(KEY, "新口令")
+    with pytest.raises(ValueError):
+        data.restoreBackup(oldEntry, "新口令")
+    assert data.getPassword("gh", "alice", "新口令") == "old"
+
+
+def testClearBackup(everySave):
+    data = everySave
+    data.addPlatform("gh", KEY)
+    data.addAccount("gh", "alice", "pa", KEY)
+    assert ui_data.listBackups()
+    ui_data.clearBackup(KEY)
+    assert ui_data.listBackups() == []
+    assert data.getPassword("gh", "alice", KEY) == "pa"
+
+
+def testStoresShareCatalog(tmp_path):
+    # 两个进程各自的备份库对象：一方新增的备份不会被另一方覆盖或当作无用对象清理
+    first = backup.BackupStore(str(tmp_path / "backup"))
+    second = backup.BackupStore(str(tmp_path / "backup"))
+
+    def add(store, content):
+        # 快照总是整体替换，每次都是新文件
+        source = tmp_path / content.decode()
+        source.write_bytes(content)
+        return store.add(str(source), content, {})
+
+    add(first, b"one")
+    add(second, b"two")
+    latest = add(first, b"three")
+    assert [e["id"] for e in second.list()] == [1, 2, 3]
+    add(second, b"four")
+    assert [e["id"] for e in first.list()] == [1, 2, 3, 4]
+    second.remove({1})
+    first.collect()
+    assert first.readObject(latest["object"]) == b"three"
+    assert [e["id"] for e in first.list()] == [2, 3, 4]
@@ -0,0 +1,88 @@
+import hashlib
+import pytest
+import audit
+import breach
+from conftest import KEY
+
+LEAKED = ["123456", "password", "qwerty", "密码", "correct horse", "letmein"]
+
+
+def sha1(password):
+    return hashlib.sha1(password.encode("utf-8")).hexdigest().upper()
+
+
+def writeText(path, passwords, ordered=False, duplicate=False):
+    lines = [f"{sha1(p)}:{i + 1}" for i, p in enumerate(passwords)]
+    if ordered:
+        lines.sort()
+    if duplicate:
+        lines += lines[:3]
+    path.write_text("\n".join(lines) + "\n\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def testConvertAndContains(tmp_path, monkeypatch, ordered):
+    # 乱序输入分批排序后归并；已排序的输入直接流式读取
+    monkeypatch.setattr(breach, "RUN_SIZE", 2)
+    textPath = writeText(tmp_path / "pwned.txt", LEAKED, ordered=ordered, duplicate=True)
+    outPath = str(tmp_path / "breach.bin")
+    assert breach.convert(textPath, outPath) == len(LEAKED)
+    with breach.BreachCorpus(outPath) as corpus:
+        assert len(corpus) == len(LEAKED)
+        assert all(corpus.contains(p) for p in LEAKED)
+        assert not any(corpus.contains(p) for p in ["1234567", "Password", "密碼", "", "Tq8#vLz!4mWr@9Kd"])
+    assert not (tmp_path / "breach.bin.tmp").exists()
+
+
+def testConvertManyPrefixes(tmp_path, monkeypatch):
+    # 条目分布在许多前两字节区间中，每个区间的二分查找都要命中
+    monkeypatch.setattr(breach, "RUN_SIZE", 300)
+    passwords = [f"pw{i}" for i in range(2000)]
+    outPath = str(tmp_path / "breach.bin")
+    assert breach.convert(writeText(tmp_path / "pwned.txt", passwords), outPath) == 2000
+    with breach.BreachCorpus(outPath) as corpus:
+        assert all(corpus.contains(p) for p in passwords)
+        assert sum(corpus.contains(f"other{i}") for i in range(2000)) == 0
+
+
+def testRejectsBadInput(tmp_path):
+    textPath = tmp_path / "pwned.txt"
+    textPath.write_text(f"{sha1('a')}:1\nnot a hash\n")
+    with pytest.raises(breach.BreachError):
+        breach.convert(str(textPath), str(tmp_path / "breach.bin"))
+    assert not (tmp_path / "breach.bin").exists()
+
+
+def testRejectsTruncatedOrForeign(tmp_path):
+    outPath = tmp_path / "breach.bin"
+    breach.convert(writeText(tmp_path / "pwned.txt", LEAKED), str(outPath))
+    data = outPath.read_bytes()
+    for damaged in [data[:-1], data[:100], data + b"\0" * breach.HASH_SIZE, b"XXXX" + data[4:], b""]:
+        outPath.write_bytes(damaged)
+        with pytest.raises(breach.BreachError):
+            breach.BreachCorpus(str(outPath))
+
+
+def testOpenCorpusReloadsReplacedFile(tmp_path):
+    outPath = str(tmp_path / "breach.bin")
+    assert breach.openCorpus(outPath) is None
+    breach.convert(writeText(tmp_path / "a.txt", LEAKED[:2]), outPath)
+    first = breach.openCorpus(outPath)
+    assert breach.openCorpus(outPath) is first and len(first) == 2
+    breach.convert(writeText(tmp_path / "b.txt", LEAKED), outPath)
+    assert len(breach.openCorpus(outPath)) == len(LEAKED)
+
+
+def testAuditFlagsBreached(vault, tmp_path):
+    with vault.transaction(KEY):
+        vault.addPlatform("github", KEY)
+        vault.addAccount("github", "alice", "correct horse", KEY)
+        vault.addAccount("github", "bob", "Tq8#vLz!4mWr@9Kd", KEY)
+    assert audit.auditVault(vault, KEY).breached is None
+    breach.convert(writeText(tmp_path / "pwned.txt", LEAKED))
+    result = audit.auditVault(vault, KEY)
+    assert result.breached == 1
+    entries = {e.account: e for e in result.entries}
+    assert "已泄露" in entries["alice"].issues and entries["alice"].level == 0
+    assert "已泄露" not in entries["bob"].issues
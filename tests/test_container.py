@@ -0,0 +1,86 @@
+import hashlib
+import pytest
+import container
+import encrypt
+from conftest import LOW_COST
+
+KEY = bytes(range(32))
+OTHER_KEY = bytes(range(1, 33))
+
+
+def testRoundTrip():
+    header, plaintext, legacy = container.openBytes(container.seal("密码".encode(), KEY), KEY)
+    assert plaintext == "密码".encode()
+    assert header["cipher"] == container.CIPHER_AES_GCM
+    assert not legacy
+
+
+def testPassphraseWithKdfParams():
+    params = encrypt.newKdfParams(LOW_COST)
+    blob = container.seal(b"secret", encrypt.deriveKey("口令", params), params)
+    assert container.openBytes(blob, "口令")[1] == b"secret"
+    with pytest.raises(container.WrongKeyError):
+        container.openBytes(blob, "其他口令")
+
+
+def testWrongKey():
+    with pytest.raises(container.WrongKeyError):
+        container.openBytes(container.seal(b"secret", KEY), OTHER_KEY)
+
+
+@pytest.mark.parametrize("offset", [-1, -20, -40, -60])
+def testTamperedPayload(offset):
+    # 依次改动标签、密文与 nonce
+    blob = bytearray(container.seal(b"secret" * 8, KEY))
+    blob[offset] ^= 1
+    with pytest.raises(container.CorruptedError):
+        container.openBytes(bytes(blob), KEY)
+
+
+def testTruncated():
+    with pytest.raises(container.CorruptedError):
+        container.openBytes(container.seal(b"secret", KEY)[:-5], KEY)
+
+
+def testCbcRejected():
+    # 没有完整性校验的密文，即使密钥正确也不解密
+    payload = encrypt.aesEncryptBytes(b"secret", KEY)
+    blob = container.packHeader(len(payload), cipher=container.CIPHER_AES_CBC, check=container.keyCheck(KEY)) + payload
+    with pytest.raises(container.CorruptedError):
+        container.openBytes(blob, KEY)
+
+
+def testLegacyTextOnlyForMigration():
+    text = encrypt.aesEncrypt("secret", "口令").encode()
+    with pytest.raises(container.CorruptedError):
+        container.openBytes(text, "口令")
+    assert container.openBytes(text, "口令", legacy=True)[1:] == (b"secret", True)
+
+
+def testReadAddressed(tmp_path):
+    blob = container.seal(b"secret", KEY)
+    digest = hashlib.sha256(blob).hexdigest()
+    filePath = tmp_path / digest
+    filePath.write_bytes(blob)
+    assert container.readAddressed(str(filePath), digest) == blob
+    # 换成同一密钥加密的另一个文件
+    filePath.write_bytes(container.seal(b"other", KEY))
+    with pytest.raises(container.CorruptedError):
+        container.readAddressed(str(filePath), digest)
+
+
+@pytest.mark.parametrize("params", [
+    {"kdf": "pbkdf2", "iterations": 1 << 40},
+    {"kdf": "pbkdf2", "iterations": 1},
+    {"kdf": "scrypt", "n": 1 << 30, "r": 8, "p": 1},
+    {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N + 1, "r": 8, "p": 1},
+    {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N, "r": 1 << 20, "p": 1},
+    {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N, "r": 8, "p": "1"},
+    {"kdf": "scrypt", "n": encrypt.SCRYPT_MIN_N, "r": 8, "p": 1, "salt": ""},
+])
+def testKdfParamsOutOfRange(params):
+    # 头部未经认证，被改成极大的代价时不能先去计算 KDF
+    params = dict({"salt": "00" * 16}, **params)
+    blob = container.seal(b"secret", KEY, params)
+    with pytest.raises(container.CorruptedError):
+        container.openBytes(blob, "口令")
@@ -0,0 +1,119 @@
+import pytest
+import container
+import exporter
+import importer
+from conftest import KEY
+
+ARCHIVE_KEY = "导出密码"
+ENTRIES = {
+    "github": {"alice": "p,a\"ss", "bob": "密码 2"},
+    "mail.example.com": {"carol@example.com": " 前后有空格 "},
+}
+
+
+def fill(data):
+    with data.transaction(KEY):
+        for platform, accounts in ENTRIES.items():
+            data.addPlatform(platform, KEY)
+            for account, password in accounts.items():
+                data.addAccount(platform, account, password, KEY)
+
+
+def contents(data):
+    return {p: {a: data.getPassword(p, a, KEY) for a in data.getAccount(p)} for p in data.getPlatforms()}
+
+
+def exportArchive(data, home):
+    fill(data)
+    filePath = str(home / "export.pmarchive")
+    exporter.exportFile(KEY, filePath, "archive", archiveKey=ARCHIVE_KEY)
+    return filePath
+
+
+@pytest.mark.parametrize("fileFormat, suffix", [("csv", ".csv"), ("json", ".json"), ("archive", ".pmarchive")])
+def testRoundTrip(vault, home, fileFormat, suffix):
+    fill(vault)
+    filePath = str(home / ("export" + suffix))
+    assert exporter.exportFile(KEY, filePath, fileFormat, archiveKey=ARCHIVE_KEY).entries == 3
+    for platform in vault.getPlatforms():
+        vault.deletePlatform(platform, KEY)
+    result = importer.importFile(vault, filePath, KEY, archiveKey=ARCHIVE_KEY)
+    assert (result.added, result.skipped) == (3, 0)
+    assert contents(vault) == ENTRIES
+
+
+def testImportReportsDuplicatesAndConflicts(vault, home):
+    fill(vault)
+    filePath = str(home / "export.csv")
+    exporter.exportFile(KEY, filePath, "csv")
+    vault.changeAccount("github", "alice", "", "changed", KEY)
+    result = importer.importFile(vault, filePath, KEY)
+    assert result.added == 0
+    assert result.conflicts == [("github", "alice")]
+    assert len(result.duplicates) == 2
+    assert vault.getPassword("github", "alice", KEY) == "changed"
+
+
+def testArchiveWrongPassword(vault, home):
+    filePath = exportArchive(vault, home)
+    with pytest.raises(container.WrongKeyError):
+        list(importer.readRows(filePath, archiveKey="其他密码"))
+
+
+def testArchiveTampered(vault, home):
+    filePath = exportArchive(vault, home)
+    with open(filePath, 'r', encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    line = lines[1]
+    lines[1] = line[:100] + ("A" if line[100] != "A" else "B") + line[101:]
+    with open(filePath, 'w', encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    with pytest.raises(container.CorruptedError):
+        list(importer.readRows(filePath, archiveKey=ARCHIVE_KEY))
+
+
+def archiveLinesOf(data, home, chunkSize):
+    fill(data)
+    lines = list(exporter.archiveLines(exporter.iterEntries(KEY), ARCHIVE_KEY, chunkSize=chunkSize))
+    return lines, str(home / "export.pmarchive")
+
+
+def writeLines(filePath, lines):
+    with open(filePath, 'w', encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+@pytest.mark.parametrize("edit", [
+    lambda lines: lines[:-1],                              # 截掉最后一组
+    lambda lines: lines[:2] + lines[3:],                   # 删掉中间一组
+    lambda lines: [lines[0], lines[2], lines[1], lines[3]],  # 调换顺序
+    lambda lines: lines + lines[1:2],                      # 最后一组之后又追加
+])
+def testArchiveTruncatedOrReordered(vault, home, edit):
+    lines, filePath = archiveLinesOf(vault, home, chunkSize=1)
+    assert len(lines) == 4
+    writeLines(filePath, edit(lines))
+    with pytest.raises(container.CorruptedError):
+        list(importer.readRows(filePath, archiveKey=ARCHIVE_KEY))
+    # 整个文件校验通过之前不导入任何记录
+    for platform in vault.getPlatforms():
+        vault.deletePlatform(platform, KEY)
+    with pytest.raises(container.CorruptedError):
+        importer.importFile(vault, filePath, KEY, archiveKey=ARCHIVE_KEY, batchSize=1)
+    assert vault.getPlatforms() == []
+
+
+def testArchiveEmpty(vault, home):
+    filePath = str(home / "export.pmarchive")
+    assert exporter.exportFile(KEY, filePath, "archive", archiveKey=ARCHIVE_KEY).entries == 0
+    assert list(importer.readRows(filePath, archiveKey=ARCHIVE_KEY)) == []
+
+
+@pytest.mark.parametrize("fileFormat", ["csv", "json", "archive"])
+def testExportOwnerOnly(vault, home, fileFormat):
+    filePath = home / "export.out"
+    filePath.write_text("旧内容")
+    filePath.chmod(0o644)
+    fill(vault)
+    exporter.exportFile(KEY, str(filePath), fileFormat, archiveKey=ARCHIVE_KEY)
+    assert filePath.stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,58 @@
+import pytest
+import generate_password
+from generate_password import AMBIGUOUS, CLASSES, PasswordPolicy, generatePassword, generatePasswords
+
+
+def classesOf(password):
+    return {name for name, chars in CLASSES.items() if any(c in chars for c in password)}
+
+
+@pytest.mark.parametrize("classes", [("lower",), ("digit",), ("upper", "digit"), ("lower", "special"), tuple(CLASSES)])
+@pytest.mark.parametrize("length", [4, 14, 64])
+def testPolicy(classes, length):
+    for password in generatePasswords(200, PasswordPolicy(length, classes)):
+        assert len(password) == length
+        # 只含选中的类别，且每类至少出现一次
+        assert classesOf(password) == set(classes)
+
+
+def testNotRequired():
+    # 不要求每类都出现时，可以只用到一部分类别；长度也可以小于类别数
+    policy = PasswordPolicy(8, tuple(CLASSES), required=False)
+    passwords = generatePasswords(500, policy)
+    assert all(len(p) == 8 and set(p) <= set(policy.chars) for p in passwords)
+    assert any(classesOf(p) != set(CLASSES) for p in passwords)
+    assert len(generatePasswords(1, PasswordPolicy(2, tuple(CLASSES), required=False))[0]) == 2
+
+
+def testExcludeAmbiguousAndAlphabet():
+    for password in generatePasswords(200, PasswordPolicy(20, excludeAmbiguous=True)):
+        assert not set(password) & set(AMBIGUOUS)
+    # 自定义字符集(含非 ASCII 字符)去重后使用
+    for password in generatePasswords(200, PasswordPolicy(8, alphabet="甲乙丙甲")):
+        assert len(password) == 8 and set(password) <= set("甲乙丙")
+
+
+def testGeneratePassword():
+    assert classesOf(generatePassword(14)) == set(CLASSES)
+    assert classesOf(generatePassword(14, useSpecialChars=False)) == {"lower", "upper", "digit"}
+    # 比类别数还短时不要求每类都出现
+    assert len(generatePassword(2)) == 2
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"length": 0},
+    {"length": generate_password.MAX_LENGTH + 1},
+    {"length": 3, "classes": tuple(CLASSES)},
+    {"classes": ("emoji",)},
+    {"classes": ()},
+])
+def testInvalidPolicy(kwargs):
+    with pytest.raises(ValueError):
+        PasswordPolicy(**kwargs)
+
+
+def testEntropy():
+    assert PasswordPolicy(10, ("digit",)).combinations() == 10 ** 10
+    # 长度为 2 且两类都要出现：一个小写字母加一个数字，有两种排列
+    assert PasswordPolicy(2, ("lower", "digit")).combinations() == 2 * 26 * 10
@@ -0,0 +1,83 @@
+import os
+import pytest
+import container
+import journal
+import ui_data
+from conftest import KEY, reopen
+from paths import getPath
+
+LOG_KEY = bytes(range(32))
+
+
+def appendPlatforms(log, names):
+    for name in names:
+        log.append(LOG_KEY, [["addPlatform", name]])
+
+
+def replayed(filePath, journalSeq=0):
+    index = journal.Journal(filePath).replay(LOG_KEY, {"platforms": {}, "journalSeq": journalSeq})
+    return list(index["platforms"]), index["journalSeq"]
+
+
+def testReplay(tmp_path):
+    filePath = str(tmp_path / "journal")
+    appendPlatforms(journal.Journal(filePath), ["a", "b", "c"])
+    assert replayed(filePath) == (["a", "b", "c"], 3)
+    # 快照已合并的记录不再重放
+    assert replayed(filePath, 2) == (["c"], 3)
+
+
+def testTornTail(tmp_path):
+    filePath = str(tmp_path / "journal")
+    appendPlatforms(journal.Journal(filePath), ["a", "b", "c"])
+    size = os.path.getsize(filePath)
+    with open(filePath, 'r+b') as f:
+        f.truncate(size - 10)
+    assert replayed(filePath) == (["a", "b"], 2)
+    # 写了一半的记录已被截掉，之后追加的记录可以正常重放
+    log = journal.Journal(filePath)
+    log.replay(LOG_KEY, {"platforms": {}})
+    appendPlatforms(log, ["d"])
+    assert replayed(filePath) == (["a", "b", "d"], 3)
+
+
+def testCrcMismatchStopsReplay(tmp_path):
+    filePath = str(tmp_path / "journal")
+    log = journal.Journal(filePath)
+    appendPlatforms(log, ["a", "b", "c"])
+    entries, end = log.readFrames()
+    firstEnd = len(journal.Journal.MAGIC) + journal.Journal.frameStruct.size + len(entries[0][1])
+    with open(filePath, 'r+b') as f:
+        f.seek(firstEnd + journal.Journal.frameStruct.size + 5)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    assert replayed(filePath) == (["a"], 1)
+    assert os.path.getsize(filePath) == firstEnd
+
+
+def testBadMagic(tmp_path):
+    filePath = tmp_path / "journal"
+    filePath.write_bytes(b"XXXX" + b"\0" * 32)
+    with pytest.raises(container.CorruptedError):
+        replayed(str(filePath))
+
+
+def testJournaledVaultRecoversFromTornTail(home):
+    ui_data.saveConfig({"journal": True})
+    ui_data.initKey(KEY)
+    data = ui_data.loadFile(KEY)
+    data.addPlatform("gh", KEY)
+    for name in ("a", "b", "c"):
+        data.addAccount("gh", name, "p" + name, KEY)
+    data.close()
+    filePath = getPath('journal')
+    with open(filePath, 'r+b') as f:
+        f.truncate(os.path.getsize(filePath) - 1)
+    data = reopen()
+    assert data.getAccount("gh") == ["a", "b"]
+    data.addAccount("gh", "d", "pd", KEY)
+    data.close()
+    data = reopen()
+    assert data.getAccount("gh") == ["a", "b", "d"]
+    assert data.getPassword("gh", "d", KEY) == "pd"
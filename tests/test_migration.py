@@ -0,0 +1,65 @@
+import json
+import os
+import pytest
+import container
+import encrypt
+import ui_data
+from conftest import KEY
+from paths import getPath
+
+PLATFORMS = {"github": {"alice": "pa", "bob": "密码b"}, "mail": {}}
+
+
+def writeBaseline(platforms):
+    # 最初的格式：整个索引(含密码)用口令的 SHA-256 做 AES-CBC 加密后 base64 编码
+    with open(getPath('password.txt'), 'w') as f:
+        f.write(encrypt.aesEncrypt(json.dumps({"key": "", "platforms": platforms}), KEY))
+
+
+def testBaselineVaultMigrates(home):
+    writeBaseline(PLATFORMS)
+    with open(getPath('20240101_120000'), 'w') as f:
+        f.write("旧版本的备份")
+    with open(getPath('notes.txt'), 'w') as f:
+        f.write("用户自己的文件")
+    data = ui_data.loadFile(KEY)
+    assert data.getPlatforms() == ["github", "mail"]
+    assert {a: data.getPassword("github", a, KEY) for a in data.getAccount("github")} == PLATFORMS["github"]
+    assert data.checkKey(KEY) and not data.checkKey("其他口令")
+    header = ui_data.getHeader()
+    assert header["cipher"] == container.CIPHER_AES_GCM
+    assert header["params"]["kdf"] == "scrypt"
+    assert os.path.exists(getPath(ui_data.FORMAT_FILE))
+    # 旧版本的时间戳备份已删除，其他文件不动
+    assert not os.path.exists(getPath('20240101_120000'))
+    assert os.path.exists(getPath('notes.txt'))
+    # 不再留下任何用旧密钥加密的文件
+    weak = encrypt.deriveKey(KEY, {})
+    store = ui_data.getBackupStore()
+    blobs = [store.readObject(entry["object"]) for entry in store.list()]
+    for targetDir in (getPath('records'), getPath('segments')):
+        for item in os.listdir(targetDir):
+            with open(os.path.join(targetDir, item), 'rb') as f:
+                blobs.append(f.read())
+    for blob in blobs:
+        with pytest.raises(container.WrongKeyError):
+            container.openBytes(blob, weak)
+
+
+def testWrongKeyLeavesBaselineUntouched(home):
+    writeBaseline(PLATFORMS)
+    with open(getPath('password.txt'), 'rb') as f:
+        before = f.read()
+    with pytest.raises(ValueError):
+        ui_data.loadFile("其他口令")
+    with open(getPath('password.txt'), 'rb') as f:
+        assert f.read() == before
+
+
+def testDowngradeRejected(home):
+    writeBaseline(PLATFORMS)
+    ui_data.loadFile(KEY).close()
+    # 迁移之后再换回旧格式的文件，不能绕过完整性校验
+    writeBaseline({"github": {"alice": "attacker"}})
+    with pytest.raises(container.CorruptedError):
+        ui_data.loadFile(KEY)
@@ -0,0 +1,89 @@
+import threading
+import journal
+import saver
+from conftest import KEY, reopen
+from paths import getPath
+from saver import SaveWorker
+
+
+class Recorder:
+    # 记录每次写入的内容；gate 未打开时写入会停在那里，用来模拟慢速磁盘
+    def __init__(self, failures=0):
+        self.writes = []
+        self.failures = failures
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self, key, ops):
+        self.started.set()
+        self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise OSError("磁盘已满")
+        self.writes.append((key, list(ops)))
+
+
+def testCoalescesQueuedWrites():
+    write = Recorder()
+    worker = SaveWorker(write, delay=0)
+    write.gate.clear()
+    worker.put(KEY, [["addPlatform", "a"]])
+    write.started.wait(5)
+    # 第一次写入还没结束，之后的修改排队，合并成一次写入
+    for name in ("b", "c", "d"):
+        worker.put(KEY, [["addPlatform", name]])
+    assert worker.pending()
+    write.gate.set()
+    assert worker.flush(5)
+    assert write.writes == [(KEY, [["addPlatform", "a"]]),
+                            (KEY, [["addPlatform", "b"], ["addPlatform", "c"], ["addPlatform", "d"]])]
+    assert worker.writes == 2
+    assert worker.status == saver.SAVED and not worker.pending()
+    worker.close()
+
+
+def testFlushRetriesFailedWrite():
+    statuses = []
+    write = Recorder(failures=1)
+    worker = SaveWorker(write, lambda status, error: statuses.append(status), delay=0)
+    worker.put(KEY, [["addPlatform", "a"]])
+    # 失败后操作仍在队列中，flush 再试一次
+    assert not worker.flush(5)
+    assert worker.status == saver.ERROR and worker.pending()
+    assert worker.flush(5)
+    assert write.writes == [(KEY, [["addPlatform", "a"]])]
+    assert statuses[-1] == saver.SAVED
+    worker.close()
+
+
+def testCloseFlushes():
+    write = Recorder()
+    worker = SaveWorker(write, delay=0.2)
+    worker.put(KEY, [["addPlatform", "a"]])
+    worker.put(KEY, [["addPlatform", "b"]])
+    assert worker.close(5)
+    assert write.writes == [(KEY, [["addPlatform", "a"], ["addPlatform", "b"]])]
+    assert not worker.thread.is_alive()
+
+
+def testRecordsSyncedByWorker(vault, monkeypatch):
+    # 图形界面线程写入记录时不落盘，保存线程发布日志之前才落盘
+    synced = []
+    syncFile = journal.syncFile
+
+    def recordingSync(filePath):
+        synced.append((filePath, threading.current_thread().name))
+        syncFile(filePath)
+
+    monkeypatch.setattr(journal, "syncFile", recordingSync)
+    vault.startSaver()
+    vault.addPlatform("gh", KEY)
+    vault.addAccount("gh", "alice", "pa", KEY)
+    assert vault.flush(5)
+    recordPath = getPath('records', vault.records["gh"]["alice"][0])
+    assert (recordPath, "SaveWorker") in synced
+    assert all(thread == "SaveWorker" for _, thread in synced)
+    assert not journal.pendingFiles
+    vault.close()
+    assert reopen().getPassword("gh", "alice", KEY) == "pa"
@@ -0,0 +1,108 @@
+import search
+from conftest import KEY
+from search import SearchIndex
+
+PLATFORMS = {
+    "github": ["alice", "bob"],
+    "gitlab": ["alice"],
+    "mail.example.com": ["carol@example.com"],
+    "Git": [],
+    "bitbucket": ["legit-user"],
+}
+
+
+def built(platforms=PLATFORMS):
+    index = SearchIndex()
+    index.rebuild({k: list(v) for k, v in platforms.items()})
+    return index
+
+
+def testRanking():
+    index = built()
+    # 完全相同 > 名称前缀(短的在前) > 单词前缀 > 子串
+    assert index.search("git") == [("Git", None), ("github", None), ("gitlab", None), ("bitbucket", "legit-user")]
+    assert index.search("example") == [("mail.example.com", None), ("mail.example.com", "carol@example.com")]
+    # 不区分大小写；同级且名称一样长时顺序不定
+    assert set(index.search("ALICE")) == {("github", "alice"), ("gitlab", "alice")}
+    assert index.search("  ") == []
+
+
+def testFuzzy():
+    index = built()
+    # 拼错的查询按相似度排在子串之后
+    assert index.search("githbu")[0] == ("github", None)
+    assert index.search("zzzz") == []
+
+
+def testLimit():
+    index = built({f"site{i:03}": [] for i in range(100)})
+    assert len(index.search("site", limit=10)) == 10
+    results = index.search("site0", limit=3)
+    assert len(results) == 3 and all(platform.startswith("site0") for platform, _ in results)
+
+
+def testShortQueryOnlyPrefix(monkeypatch):
+    index = built()
+    # 单个字符只做前缀匹配，不出现只在中间含有它的条目
+    assert set(index.search("b")) == {("bitbucket", None), ("github", "bob")}
+    # 前缀树很大时，超过节点上限后改为深度优先，仍然凑满 limit 个
+    index = built({f"a{i:05}": [] for i in range(3000)})
+    monkeypatch.setattr(search, "SHORT_QUERY_NODES", 10)
+    assert len(index.search("a", limit=20)) == 20
+    assert len(index.prefix("a", 20, maxNodes=10)) == 20
+
+
+def testLazyBuild():
+    platforms = {k: list(v) for k, v in PLATFORMS.items()}
+    index = SearchIndex()
+    index.rebuild(platforms)
+    # 解锁后不建立索引，第一次查询时才按平台字典建立；此前的增删已反映在字典中，不重复处理
+    assert index.source is not None and not index.ids
+    platforms["github"].append("carol")
+    index.add("github", "carol")
+    platforms["gitlab"].remove("alice")
+    index.remove("gitlab", "alice")
+    assert not index.ids
+    assert index.search("carol") == [("github", "carol"), ("mail.example.com", "carol@example.com")]
+    assert index.source is None
+    assert ("gitlab", "alice") not in index.ids
+    assert len(index) == 10
+
+
+def testAddRemoveRename():
+    index = built()
+    index.ensure()
+    index.add("github", "carol")
+    assert index.search("carol") == [("github", "carol"), ("mail.example.com", "carol@example.com")]
+    index.rename("github", "carol", "dave")
+    assert index.search("carol") == [("mail.example.com", "carol@example.com")]
+    assert index.search("dave") == [("github", "dave")]
+    index.removePlatform("github", ["alice", "bob", "dave"])
+    assert ("github", None) not in index.search("github")
+    assert index.search("bob") == []
+    # 删除后剪掉空的分支
+    assert "h" not in index.trie["g"]["i"]["t"]
+
+
+def testVaultKeepsIndexInSync(vault):
+    with vault.transaction(KEY):
+        vault.addPlatform("github", KEY)
+        vault.addAccount("github", "alice", "pa", KEY)
+    assert vault.search("ali") == [("github", "alice")]
+    vault.changeAccount("github", "alice", "alicia", "", KEY)
+    assert vault.search("alicia") == [("github", "alicia")]
+    assert vault.search("alice") != [("github", "alice")]
+    vault.deleteAccount("github", "alicia", KEY)
+    assert vault.search("alicia") == []
+    vault.addPlatform("gitlab", KEY)
+    vault.deletePlatform("github", KEY)
+    assert vault.search("git") == [("gitlab", None)]
+    # 事务撤销后重新建立索引
+    try:
+        with vault.transaction(KEY):
+            vault.addAccount("gitlab", "bob", "pb", KEY)
+            assert vault.search("bob") == [("gitlab", "bob")]
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert vault.search("bob") == []
@@ -0,0 +1,113 @@
+import os
+import time
+import pytest
+import backup
+import ui_data
+from conftest import KEY, reopen
+from paths import getPath
+
+
+def testAccountAgeSurvivesChangeKey(vault):
+    vault.addPlatform("gh", KEY)
+    vault.addAccount("gh", "alice", "pa", KEY)
+    changed = vault.records["gh"]["alice"][1]
+    time.sleep(1.1)
+    vault.changeKey(KEY, "新口令")
+    vault.changeAccount("gh", "alice", "renamed", "", "新口令")
+    # 重新加密与改名都不算修改密码
+    assert vault.records["gh"]["renamed"][1] == changed
+    vault.changeAccount("gh", "renamed", "", "pb", "新口令")
+    assert vault.records["gh"]["renamed"][1] > changed
+
+
+
+def fail(*args, **kwargs):
+    raise OSError("磁盘已满")
+
+
+def testTransactionRollback(vault, monkeypatch):
+    vault.addPlatform("gh", KEY)
+    monkeypatch.setattr(ui_data, "writeSegments", fail)
+    with pytest.raises(OSError):
+        with vault.transaction(KEY):
+            vault.addAccount("gh", "alice", "pa", KEY)
+    assert vault.getAccount("gh") == []
+    # 没有发布的快照引用它们，新写入的记录已删除
+    assert os.listdir(getPath('records')) == []
+
+
+def testBackupFailureAfterPublishKeepsTransaction(vault, monkeypatch, caplog):
+    # 备份在快照发布之后才进行，它失败时不能撤销事务、删除已被快照引用的记录
+    ui_data.saveConfig({"backupInterval": 0})
+    vault.addPlatform("gh", KEY)
+    monkeypatch.setattr(backup.BackupStore, "add", fail)
+    with vault.transaction(KEY):
+        vault.addAccount("gh", "alice", "pa", KEY)
+    assert "保存后备份失败" in caplog.text
+    assert vault.getPassword("gh", "alice", KEY) == "pa"
+    assert reopen().getPassword("gh", "alice", KEY) == "pa"
+
+def testStaleWriterKeepsOtherEdits(home):
+    # 两个实例(例如图形界面与命令行)交替修改，后写入的一方不能覆盖另一方的修改
+    ui_data.saveConfig({"sessionCache": True})
+    ui_data.initKey(KEY)
+    first = ui_data.loadFile(KEY)
+    first.addPlatform("gh", KEY)
+    first.addAccount("gh", "a", "pa", KEY)
+    second = ui_data.loadFile(KEY)
+    second.addAccount("gh", "b", "pb", KEY)
+    # 修改之前先重新加载，内存中的数据也包含另一个实例的修改
+    first.addAccount("gh", "c", "pc", KEY)
+    assert first.getAccount("gh") == ["a", "b", "c"]
+    assert not first.refresh(KEY)
+    second.addAccount("gh", "d", "pd", KEY)
+    assert first.refresh(KEY)
+    assert first.getAccount("gh") == ["a", "b", "c", "d"]
+    second.close()
+    first.close()
+    assert reopen().getAccount("gh") == ["a", "b", "c", "d"]
+
+
+@pytest.mark.parametrize("journaled", [False, True])
+@pytest.mark.parametrize("saver", [False, True])
+def testRenameKeepsPasswordChangedElsewhere(home, journaled, saver):
+    # 另一个实例刚改了密码，本实例只改用户名时不能把旧密码写回去
+    ui_data.saveConfig({"sessionCache": True, "journal": journaled})
+    ui_data.initKey(KEY)
+    gui = ui_data.loadFile(KEY)
+    gui.addPlatform("gh", KEY)
+    gui.addAccount("gh", "alice", "old", KEY)
+    if saver:
+        gui.startSaver()
+        assert gui.flush()
+    cli = ui_data.loadFile(KEY)
+    cli.changeAccount("gh", "alice", "", "new", KEY)
+    cli.close()
+    gui.changeAccount("gh", "alice", "alice2", "", KEY)
+    assert gui.close()
+    data = reopen()
+    assert data.getAccount("gh") == ["alice2"]
+    assert data.getPassword("gh", "alice2", KEY) == "new"
+
+
+def testRenameWhileSaveQueued(home):
+    # 排队中的修改尚未写入时不重新加载内存中的数据，写入时仍然以文件为准
+    ui_data.saveConfig({"sessionCache": True})
+    ui_data.initKey(KEY)
+    gui = ui_data.loadFile(KEY)
+    gui.addPlatform("gh", KEY)
+    gui.addAccount("gh", "alice", "old", KEY)
+    gui.startSaver()
+    with gui.saver.cond:
+        # 持有条件变量时保存线程无法取走队列，修改都停在队列中
+        gui.addAccount("gh", "carol", "pc", KEY)
+        cli = ui_data.loadFile(KEY)
+        cli.changeAccount("gh", "alice", "", "new", KEY)
+        cli.addAccount("gh", "bob", "pb", KEY)
+        cli.close()
+        gui.changeAccount("gh", "alice", "alice2", "", KEY)
+        assert gui.getAccount("gh") == ["carol", "alice2"]
+    assert gui.close()
+    data = reopen()
+    assert data.getAccount("gh") == ["bob", "carol", "alice2"]
+    assert data.getPassword("gh", "alice2", KEY) == "new"
@@ -1,11 +1,15 @@
-from PySide6.QtGui import QAction, QIcon, QDesktopServices
-from ui_data import UIData, initKey, hasFile, loadFile, getPassword, clearBackup
-from generate_password import generatePassword
+from PySide6.QtGui import QAction, QIcon, QDesktopServices, QFont, QColor
+import metrics
+import profiler
+import saver
+import ui_data
+from ui_data import UIData, clearBackup, loadConfig, saveConfig, listBackups, deleteBackups
+from generate_password import PasswordPolicy, generatePasswords
+from login import unlock
 from PySide6.QtWidgets import *
-from PySide6.QtCore import Qt, QUrl
-import pyperclip
-import hashlib
+from PySide6.QtCore import Qt, QUrl, QAbstractListModel, QModelIndex, QSize, QRect, QEvent, QTimer, QObject, Signal
 import os
+from datetime import datetime
 
 
 class VLine(QFrame):
@@ -43,34 +47,76 @@ class RandomPasswordArea(QWidget):
         super(RandomPasswordArea, self).__init__()
         self.passwordLineEdit = passwordLineEdit
         self.passwordCount = QLineEdit("14")
-        self.hasSpecialChar = QCheckBox("特殊字符")
+        # 字符类别 -> 复选框
+        self.classBoxes = {"lower": QCheckBox("小写字母"), "upper": QCheckBox("大写字母"),
+                           "digit": QCheckBox("数字"), "special": QCheckBox("特殊字符")}
+        self.hasSpecialChar = self.classBoxes["special"]
+        self.requireAll = QCheckBox("每类至少一个")
+        self.excludeAmbiguous = QCheckBox("排除易混淆字符")
+        self.alphabet = QLineEdit()
+        self.entropyLabel = QLabel()
         self.randomButton = QPushButton("随机密码")
         self.draw()
         self.register()
+        self.updateEntropy()
 
     def draw(self):
-        self.hasSpecialChar.setChecked(True)
+        for box in self.classBoxes.values():
+            box.setChecked(True)
+        self.requireAll.setChecked(True)
+        self.alphabet.setPlaceholderText("自定义字符(可选)")
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel("密码位数:"))
         layout.addWidget(self.passwordCount)
-        layout.addWidget(self.hasSpecialChar)
+        for box in self.classBoxes.values():
+            layout.addWidget(box)
+        layout.addWidget(self.requireAll)
+        layout.addWidget(self.excludeAmbiguous)
+        layout.addWidget(self.alphabet)
+        layout.addWidget(self.entropyLabel)
         layout.addWidget(self.randomButton)
 
     def register(self):
         self.randomButton.clicked.connect(self.randomPassword)
+        self.passwordCount.textChanged.connect(self.updateEntropy)
+        self.alphabet.textChanged.connect(self.updateEntropy)
+        for box in list(self.classBoxes.values()) + [self.requireAll, self.excludeAmbiguous]:
+            box.toggled.connect(self.updateEntropy)
+
+    def policy(self):
+        count = 14
+        try:
+            count = int(self.passwordCount.text())
+        except ValueError:
+            pass
+        classes = [name for name, box in self.classBoxes.items() if box.isChecked()]
+        return PasswordPolicy(count, classes, self.requireAll.isChecked(), self.excludeAmbiguous.isChecked(),
+                              self.alphabet.text())
+
+    def updateEntropy(self):
+        try:
+            self.entropyLabel.setText(f"强度:{self.policy().entropyBits():.0f} 位")
+        except ValueError as e:
+            self.entropyLabel.setText(str(e))
 
     def randomPassword(self):
-        password = ""
-        if self.passwordCount.text() == "":
-            password = generatePassword(14, self.hasSpecialChar.isChecked())
-        else:
-            count = 14
-            try:
-                count = int(self.passwordCount.text())
-            except ValueError:
-                pass
-            password = generatePassword(count, self.hasSpecialChar.isChecked())
+        try:
+            policy = self.policy()
+            password = generatePasswords(1, policy)[0]
+            # 有泄露库时跳过已泄露的密码，字符集很小时可能始终命中
+            from breach import openCorpus
+            corpus = openCorpus()
+            attempts = 1
+            while corpus is not None and corpus.contains(password):
+                if attempts >= 100:
+                    raise ValueError("生成的密码都在泄露库中，请增加长度或字符种类")
+                password = generatePasswords(1, policy)[0]
+                attempts += 1
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
         self.passwordLineEdit.setText(password)
+        import pyperclip
         pyperclip.copy(password)
         QMessageBox.information(self, "提示", "已复制到剪贴板")
 
@@ -96,7 +142,7 @@ class CheckKeyWindow(QDialog):
 
     def ensure(self):
         self.resultFlag = False
-        if hashlib.sha256(self.keyEditLine.text().encode("utf-8")).hexdigest() == self.data.key:
+        if self.data.checkKey(self.keyEditLine.text()):
             self.resultFlag = True
             self.accept()
         else:
@@ -107,38 +153,61 @@ class CheckKeyWindow(QDialog):
         self.ensureButton.clicked.connect(self.ensure)
 
 
-class PlatformItem(QPushButton):
-    def __init__(self, mainWindow, name="Platform"):
-        super(PlatformItem, self).__init__()
-        self.mainWindow = mainWindow
-        self.name = name
-        self.setText(name)
-        self.setMinimumSize(120, 64)
-        self.setStyleSheet("font-size: 24px;")
-
-    def refreshAccountMenu(self):
-        self.mainWindow.accountMenu.platform = self.name
-        self.mainWindow.accountMenu.refresh()
-        self.mainWindow.accountMenu.window().update()
-
-    def mousePressEvent(self, event):
-        # 检测右键点击
-        if event.button() == Qt.RightButton:
-            ret = QMessageBox.question(self, "提示", f"是否删除平台:{self.name}")
-            if ret != 16384:
-                return
-            ans = self.mainWindow.ensureKey()
-            if ans[0]:
-                self.mainWindow.data.deletePlatform(self.name, ans[1])
-            self.mainWindow.accountMenu.platform = ""
-            self.mainWindow.accountMenu.refresh()
-            self.mainWindow.accountMenu.window().update()
-            self.mainWindow.platformMenu.refresh()
-            self.mainWindow.platformMenu.window().update()
-
-        else:
-            # 保留原始的左键点击功能
-            super().mousePressEvent(event)
+class NameListModel(QAbstractListModel):
+    # 只保存名称列表，视图只为可见的行调用 data，条目再多也不会创建控件
+    def __init__(self):
+        super(NameListModel, self).__init__()
+        self.names = []
+
+    def setNames(self, names):
+        self.beginResetModel()
+        self.names = list(names)
+        self.endResetModel()
+
+    def appendName(self, name):
+        row = len(self.names)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.names.append(name)
+        self.endInsertRows()
+
+    def removeName(self, name):
+        if name not in self.names:
+            return
+        row = self.names.index(name)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.names[row]
+        self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.names[index.row()]
+        return None
+
+
+class PlatformDelegate(QStyledItemDelegate):
+    # 把每一行画成一个按钮，外观与原来的平台按钮一致
+    def sizeHint(self, option, index):
+        return QSize(120, 64)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.state = QStyle.State_Enabled | QStyle.State_Raised
+        if option.state & QStyle.State_Selected:
+            button.state |= QStyle.State_On
+        if option.state & QStyle.State_MouseOver:
+            button.state |= QStyle.State_MouseOver
+        painter.save()
+        font = QFont(option.font)
+        font.setPixelSize(24)
+        painter.setFont(font)
+        button.fontMetrics = painter.fontMetrics()
+        button.text = button.fontMetrics.elidedText(index.data(), Qt.ElideRight, button.rect.width() - 16)
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+        painter.restore()
 
 
 class AddPlatformWindow(QWidget):
@@ -178,8 +247,6 @@ class AddPlatformWindow(QWidget):
         ans = self.ensureKey()
         if ans[0]:
             self.data.addPlatform(self.nameEditLine.text(), ans[1])
-            self.platformMenu.refresh()
-            self.platformMenu.window().update()
             self.nameEditLine.setText("")
 
 
@@ -189,14 +256,13 @@ class PlatformMenu(QWidget):
         # 数据
         self.data = data
         self.mainWindow = mainWindow
+        self.model = NameListModel()
         # 创建布局
         self.layout = QVBoxLayout(self)
         # 初始化固定部件
-        self.scrollArea = None
-        self.contentWidget = None
-        self.scrollLayout = None
+        self.listView = None
         self.addPlatformButton = None
-        self.addPlatformWindow = AddPlatformWindow(data, self, self.mainWindow.ensureKey)
+        self.addPlatformWindow = None
         # 绘制固定部分
         self.draw()
         # 注册事件
@@ -205,43 +271,66 @@ class PlatformMenu(QWidget):
         self.refresh()
 
     def draw(self):
-        # 创建滚动区域
-        self.scrollArea = QScrollArea()
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setMinimumWidth(144)
-
-        # 创建内容容器（用于放置平台项）
-        self.contentWidget = QWidget()
-        self.scrollLayout = QVBoxLayout(self.contentWidget)
-        self.scrollLayout.setAlignment(Qt.AlignTop)
-        self.scrollArea.setWidget(self.contentWidget)
+        # 列表视图只绘制可见的行
+        self.listView = QListView()
+        self.listView.setModel(self.model)
+        self.listView.setItemDelegate(PlatformDelegate(self.listView))
+        self.listView.setUniformItemSizes(True)
+        # 分批排版，先显示可见的部分，条目很多时也不会卡住界面
+        self.listView.setLayoutMode(QListView.Batched)
+        self.listView.setBatchSize(256)
+        self.listView.setMouseTracking(True)
+        self.listView.setMinimumWidth(144)
+        self.listView.setContextMenuPolicy(Qt.CustomContextMenu)
 
         # 添加按钮
         self.addPlatformButton = QPushButton("添加平台", self)
 
         # 将固定部分添加到布局
-        self.layout.addWidget(self.scrollArea)
+        self.layout.addWidget(self.listView)
         self.layout.addWidget(self.addPlatformButton)
 
+    @profiler.profiled("PlatformMenu.refresh")
     def refresh(self):
-        # 删除平台项
-        for i in reversed(range(self.scrollLayout.count())):
-            item = self.scrollLayout.itemAt(i)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-        # 重新添加所有平台项
-        for k, v in self.data.getDict().items():
-            item = PlatformItem(self.mainWindow, k)
-            item.clicked.connect(item.refreshAccountMenu)
-            self.scrollLayout.addWidget(item)
+        with metrics.timer("PlatformMenu.refresh"):
+            self.model.setNames(self.data.getPlatforms())
 
     def register(self):
         self.addPlatformButton.clicked.connect(self.addPlatform)
+        self.listView.clicked.connect(self.refreshAccountMenu)
+        # 右键删除平台
+        self.listView.customContextMenuRequested.connect(self.deletePlatform)
+        self.data.subscribe(self.onChange)
+
+    def onChange(self, event):
+        # 只增删受影响的行
+        if event[0] == ui_data.PLATFORM_ADDED:
+            self.model.appendName(event[1])
+        elif event[0] == ui_data.PLATFORM_REMOVED:
+            self.model.removeName(event[1])
+        elif event[0] == ui_data.RESET:
+            self.refresh()
+
+    def refreshAccountMenu(self, index):
+        self.mainWindow.accountMenu.platform = index.data()
+        self.mainWindow.accountMenu.refresh()
+        self.mainWindow.accountMenu.window().update()
+
+    def deletePlatform(self, pos):
+        index = self.listView.indexAt(pos)
+        if not index.isValid():
+            return
+        name = index.data()
+        ret = QMessageBox.question(self, "提示", f"是否删除平台:{name}")
+        if ret != 16384:
+            return
+        ans = self.mainWindow.ensureKey()
+        if ans[0]:
+            self.data.deletePlatform(name, ans[1])
 
     def addPlatform(self):
         if self.addPlatformWindow is None:
-            self.addPlatformWindow = AddPlatformWindow(self.data, self)
+            self.addPlatformWindow = AddPlatformWindow(self.data, self, self.mainWindow.ensureKey)
         self.addPlatformWindow.show()
         self.addPlatformWindow.raise_()
         self.addPlatformWindow.activateWindow()
@@ -269,10 +358,13 @@ class CheckAccountWindow(QDialog):
         self.register()
 
     def copyName(self):
+        # 剪贴板模块只在复制时才用到，不在启动时加载
+        import pyperclip
         pyperclip.copy(self.nameData)
         QMessageBox.information(self, "提示", "已复制到剪贴板")
 
     def copyPassword(self):
+        import pyperclip
         pyperclip.copy(self.passwordData)
         QMessageBox.information(self, "提示", "已复制到剪贴板")
 
@@ -336,72 +428,85 @@ class ChangeAccountWindow(QDialog):
             ret = QMessageBox.question(self, "提示", "是否进行修改")
             if ret != 16384:
                 return
-            self.accountMenu.data.changeAccount(self.accountMenu.platform, self.name,
-                                                getPassword(self.accountMenu.platform, self.name, ans[1]),
-                                                self.nameEditLine.text(),
-                                                self.passwordEditLine.text(), ans[1])
-            self.accountMenu.refresh()
-            self.accountMenu.window().update()
+            data = self.accountMenu.data
+            data.changeAccount(self.accountMenu.platform, self.name, self.nameEditLine.text(),
+                               self.passwordEditLine.text(), ans[1])
             self.accept()
 
     def register(self):
         self.changeBtn.clicked.connect(self.change)
 
 
-class AccountItem(QWidget):
-    def __init__(self, name, platform, accountMenu):
-        super(AccountItem, self).__init__()
-        self.name = name
-        self.platform = platform
-        self.accountMenu = accountMenu
-        self.checkButton = QPushButton("查看")
-        self.deleteButton = QPushButton("删除")
-        self.changeButton = QPushButton("修改")
-        self.setMinimumSize(240, 64)
-        self.register()
-        self.draw()
-
-    def draw(self):
-        editAreaWidget = QWidget()
-        editAreaLayout = QVBoxLayout(editAreaWidget)
-        editAreaLayout.addWidget(self.checkButton)
-        editAreaLayout.addWidget(self.deleteButton)
-        editAreaLayout.addWidget(self.changeButton)
-
-        layout = QHBoxLayout()
-        label = QLabel(self.name)
-        label.setStyleSheet("font-size: 20px;")
-        layout.addWidget(label, 1)
-        layout.addWidget(VLine())
-        layout.addWidget(editAreaWidget)
-        self.setLayout(layout)
-
-    def register(self):
-        self.checkButton.clicked.connect(self.check)
-        self.changeButton.clicked.connect(self.change)
-        self.deleteButton.clicked.connect(self.delete)
-
-    def check(self):
-        ans = self.accountMenu.ensureKey()
-        if ans[0]:
-            win = CheckAccountWindow(self.name, getPassword(self.platform, self.name, ans[1]))
-            win.show()
-            win.exec_()
-
-    def change(self):
-        win = ChangeAccountWindow(self.name, self.accountMenu)
-        win.show()
-        win.exec_()
+class AccountDelegate(QStyledItemDelegate):
+    # 每一行左侧为用户名，右侧为 查看/删除/修改 三个按钮，按钮直接画出，点击位置由 editorEvent 判断
+    buttons = ["查看", "删除", "修改"]
+    buttonWidth = 80
+    buttonHeight = 26
 
-    def delete(self):
-        ans = self.accountMenu.ensureKey()
-        if ans[0]:
-            ret = QMessageBox.question(self, "提示", f"是否删除{self.name}")
-            if ret != 16384:
-                return
-            self.accountMenu.data.deleteAccount(self.platform, self.name, ans[1])
-            self.accountMenu.refresh()
-            self.accountMenu.window().update()
+    def __init__(self, accountMenu, parent=None):
+        super(AccountDelegate, self).__init__(parent)
+        self.accountMenu = accountMenu
+        self.pressed = None  # (行, 按钮序号)
+
+    def sizeHint(self, option, index):
+        return QSize(240, len(self.buttons) * (self.buttonHeight + 4) + 12)
+
+    def buttonRects(self, rect):
+        left = rect.right() - self.buttonWidth - 8
+        top = rect.top() + 6
+        return [QRect(left, top + i * (self.buttonHeight + 4), self.buttonWidth, self.buttonHeight)
+                for i in range(len(self.buttons))]
+
+    def paint(self, painter, option, index):
+        rect = option.rect
+        rects = self.buttonRects(rect)
+        painter.save()
+        # 用户名
+        font = QFont(option.font)
+        font.setPixelSize(20)
+        painter.setFont(font)
+        textRect = QRect(rect.left() + 8, rect.top(), rects[0].left() - rect.left() - 24, rect.height())
+        painter.drawText(textRect, Qt.AlignVCenter | Qt.AlignLeft,
+                         painter.fontMetrics().elidedText(index.data(), Qt.ElideRight, textRect.width()))
+        # 分隔线
+        painter.setPen(QColor(192, 192, 192, 128))
+        painter.drawLine(rects[0].left() - 8, rect.top() + 6, rects[0].left() - 8, rect.bottom() - 6)
+        painter.drawLine(rect.left(), rect.bottom(), rect.right(), rect.bottom())
+        painter.restore()
+        for i, text in enumerate(self.buttons):
+            button = QStyleOptionButton()
+            button.rect = rects[i]
+            button.text = text
+            button.state = QStyle.State_Enabled
+            if self.pressed == (index.row(), i):
+                button.state |= QStyle.State_Sunken
+            else:
+                button.state |= QStyle.State_Raised
+            QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+    def buttonAt(self, rect, pos):
+        for i, buttonRect in enumerate(self.buttonRects(rect)):
+            if buttonRect.contains(pos):
+                return i
+        return None
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+        if event.button() != Qt.LeftButton:
+            return False
+        button = self.buttonAt(option.rect, event.position().toPoint())
+        if event.type() == QEvent.MouseButtonPress:
+            self.pressed = None if button is None else (index.row(), button)
+            return button is not None
+        clicked = self.pressed == (index.row(), button) and button is not None
+        self.pressed = None
+        if clicked:
+            name = index.data()
+            # 等鼠标事件处理完再打开对话框
+            action = [self.accountMenu.check, self.accountMenu.delete, self.accountMenu.change][button]
+            QTimer.singleShot(0, lambda: action(name))
+        return clicked
 
 
 class AddAccountWindow(QWidget):
@@ -461,8 +566,6 @@ class AddAccountWindow(QWidget):
                                  ans[1])
             self.nameEditLine.setText("")
             self.passwordEditLine.setText("")
-            self.accountMenu.refresh()
-            self.accountMenu.window().update()
 
     def register(self):
         self.addButton.clicked.connect(self.addAccount)
@@ -475,13 +578,12 @@ class AccountMenu(QWidget):
         self.data = data
         self.platform = ""
         self.ensureKey = ensureKey
+        self.model = NameListModel()
         # 图形
-        self.addAccountWindow = AddAccountWindow(data, self, ensureKey)
+        self.addAccountWindow = None
         self.addAccountButton = None
         self.platformNameLabel = QLabel(f"当前选中平台:{self.platform}")
-        self.scrollArea = None
-        self.scrollLayout = None
-        self.contentWidget = None
+        self.listView = None
         self.layout = QVBoxLayout(self)
         self.draw()
         self.refresh()
@@ -490,36 +592,67 @@ class AccountMenu(QWidget):
 
     def draw(self):
         self.addAccountButton = QPushButton("添加账户", self)
-        self.scrollArea = QScrollArea()
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setMinimumWidth(256)
-        self.scrollLayout = QVBoxLayout()
-        self.scrollLayout.setAlignment(Qt.AlignTop)
-        self.contentWidget = QWidget()
-        self.contentWidget.setLayout(self.scrollLayout)
-        self.scrollArea.setWidget(self.contentWidget)
+        self.listView = QListView()
+        self.listView.setModel(self.model)
+        self.listView.setItemDelegate(AccountDelegate(self, self.listView))
+        self.listView.setUniformItemSizes(True)
+        self.listView.setLayoutMode(QListView.Batched)
+        self.listView.setBatchSize(256)
+        self.listView.setSelectionMode(QAbstractItemView.NoSelection)
+        self.listView.setMinimumWidth(256)
         self.layout.addWidget(self.platformNameLabel)
-        self.layout.addWidget(self.scrollArea)
+        self.layout.addWidget(self.listView)
         self.layout.addWidget(VLine())
         self.layout.addWidget(self.addAccountButton)
 
+    @profiler.profiled("AccountMenu.refresh")
     def refresh(self):
-        # 删除所有账户
-        for i in reversed(range(self.scrollLayout.count())):
-            item = self.scrollLayout.itemAt(i)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-        # 重新添加所有平台项
-        for i in self.data.getAccount(self.platform):
-            item = AccountItem(i, self.platform, self)
-            self.scrollLayout.addWidget(item)
-            self.scrollLayout.addWidget(HLine())
-        # 刷新文字
-        self.platformNameLabel.setText(f"当前选中平台:{self.platform}")
+        with metrics.timer("AccountMenu.refresh"):
+            self.model.setNames(self.data.getAccount(self.platform))
+            # 刷新文字
+            self.platformNameLabel.setText(f"当前选中平台:{self.platform}")
 
     def register(self):
         self.addAccountButton.clicked.connect(self.addAccount)
+        self.data.subscribe(self.onChange)
+
+    def onChange(self, event):
+        # 只处理当前平台的变化，并且只增删受影响的行
+        kind = event[0]
+        if kind == ui_data.RESET or (kind == ui_data.PLATFORM_REMOVED and event[1] == self.platform):
+            if not self.data.hasPlatform(self.platform):
+                self.platform = ""
+            self.refresh()
+        elif len(event) < 3 or event[1] != self.platform:
+            return
+        elif kind == ui_data.ACCOUNT_ADDED:
+            self.model.appendName(event[2])
+        elif kind == ui_data.ACCOUNT_REMOVED:
+            self.model.removeName(event[2])
+        elif kind == ui_data.ACCOUNT_RENAMED:
+            self.model.removeName(event[2])
+            if event[3] not in self.model.names:
+                self.model.appendName(event[3])
+
+    def check(self, name):
+        ans = self.ensureKey()
+        if ans[0]:
+            win = CheckAccountWindow(name, self.data.getPassword(self.platform, name, ans[1]))
+            win.show()
+            win.exec_()
+
+    def change(self, name):
+        win = ChangeAccountWindow(name, self)
+        win.show()
+        win.exec_()
+
+    def delete(self, name):
+        ans = self.ensureKey()
+        if ans[0]:
+            ret = QMessageBox.question(self, "提示", f"是否删除{name}")
+            if ret != 16384:
+                return
+            self.data.deleteAccount(self.platform, name, ans[1])
 
     def addAccount(self):
         if not self.data.hasPlatform(self.platform):
@@ -532,83 +665,66 @@ class AccountMenu(QWidget):
         self.addAccountWindow.activateWindow()
 
 
-class InitKey(QDialog):
-    def __init__(self, mainWindow):
-        super(InitKey, self).__init__()
-        self.mainWindow = mainWindow
-        self.setWindowTitle("设置密钥")
-        self.resize(400, 0)
-        self.keyEditLine = QLineEdit()
-        self.keyEnsureEditLine = QLineEdit()
-        self.button = QPushButton("确认")
-        self.draw()
-        self.register()
+class SaveStatus(QObject):
+    # 后台保存线程通过信号把状态送回界面线程
+    changed = Signal(str, str)
 
-    def draw(self):
-        self.keyEditLine.setEchoMode(QLineEdit.Password)
-        self.keyEnsureEditLine.setEchoMode(QLineEdit.Password)
-        keyWidget = QWidget()
-        keyLayout = QHBoxLayout(keyWidget)
-        keyLayout.addWidget(QLabel("密钥:"))
-        keyLayout.addWidget(self.keyEditLine)
-
-        keyEnsureWidget = QWidget()
-        keyEnsureLayout = QHBoxLayout(keyEnsureWidget)
-        keyEnsureLayout.addWidget(QLabel("确认密钥:"))
-        keyEnsureLayout.addWidget(self.keyEnsureEditLine)
+    def notify(self, status, error):
+        self.changed.emit(status, "" if error is None else str(error))
 
-        layout = QVBoxLayout(self)
-        layout.addWidget(keyWidget)
-        layout.addWidget(keyEnsureWidget)
-        layout.addWidget(self.button)
 
-    def register(self):
-        self.button.clicked.connect(self.ensure)
-
-    def ensure(self):
-        if self.keyEditLine.text() == "" or self.keyEnsureEditLine.text() == "":
-            QMessageBox.warning(self, "提示", "密钥不可为空")
-            return
-        if self.keyEditLine.text() != self.keyEnsureEditLine.text():
-            QMessageBox.warning(self, "提示", "两次密钥输入不同")
-            return
-        initKey(self.keyEditLine.text())
-        self.mainWindow.data.key = hashlib.sha256(self.keyEditLine.text().encode("utf-8")).hexdigest()
-        self.accept()
-
-
-class GetKeyWindow(QDialog):
-    def __init__(self, mainWindow):
-        super(GetKeyWindow, self).__init__()
+class SearchArea(QWidget):
+    def __init__(self, data: UIData, mainWindow):
+        super(SearchArea, self).__init__()
+        # 数据
+        self.data = data
         self.mainWindow = mainWindow
-        self.setWindowTitle("登录")
-        self.resize(400, 0)
-        self.keyEditLine = QLineEdit()
-        self.button = QPushButton("确认")
-        self.key = ""
+        # 图形
+        self.searchEditLine = QLineEdit()
+        self.resultList = QListWidget()
         self.draw()
         self.register()
 
     def draw(self):
-        self.keyEditLine.setEchoMode(QLineEdit.Password)
-        keyWidget = QWidget()
-        keyLayout = QHBoxLayout(keyWidget)
-        keyLayout.addWidget(QLabel("密钥:"))
-        keyLayout.addWidget(self.keyEditLine)
-
+        self.searchEditLine.setPlaceholderText("搜索平台或用户名")
+        self.searchEditLine.setClearButtonEnabled(True)
+        self.resultList.setMaximumHeight(200)
+        self.resultList.hide()
         layout = QVBoxLayout(self)
-        layout.addWidget(keyWidget)
-        layout.addWidget(self.button)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.searchEditLine)
+        layout.addWidget(self.resultList)
 
     def register(self):
-        self.button.clicked.connect(self.ensure)
-
-    def ensure(self):
-        if self.keyEditLine.text() == "":
-            QMessageBox.warning(self, "提示", "密钥不可为空")
-            return
-        self.key = self.keyEditLine.text()
-        self.accept()
+        self.searchEditLine.textChanged.connect(self.search)
+        self.searchEditLine.returnPressed.connect(self.selectFirst)
+        self.resultList.itemClicked.connect(self.select)
+        self.data.subscribe(self.onChange)
+
+    def onChange(self, event):
+        # 有搜索内容时重新查询，结果不会指向已删除的条目
+        if self.searchEditLine.text():
+            self.search()
+
+    def search(self, text=None):
+        # 只查内存中的索引，不解密任何数据
+        self.resultList.clear()
+        results = self.data.search(self.searchEditLine.text())
+        for platform, account in results:
+            item = QListWidgetItem(platform if account is None else f"{platform} / {account}")
+            item.setData(Qt.UserRole, platform)
+            self.resultList.addItem(item)
+        self.resultList.setVisible(bool(results))
+
+    def selectFirst(self):
+        if self.resultList.count():
+            self.select(self.resultList.item(0))
+
+    def select(self, item):
+        accountMenu = self.mainWindow.accountMenu
+        accountMenu.platform = item.data(Qt.UserRole)
+        accountMenu.refresh()
+        accountMenu.window().update()
 
 
 class ChangeKeyWindow(QDialog):
@@ -660,7 +776,11 @@ class ChangeKeyWindow(QDialog):
         ret = QMessageBox.question(self, "提示", f"确认将密钥修改为\"{self.newKeyLineEdit.text()}\"吗?")
         if ret != 16384:
             return
-        self.mainWindow.data.changeKey(ans[1], self.newKeyLineEdit.text())
+        try:
+            self.mainWindow.data.changeKey(ans[1], self.newKeyLineEdit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
         QMessageBox.information(self, "提示", "已成功修改密钥")
         self.accept()
 
@@ -668,39 +788,277 @@ class ChangeKeyWindow(QDialog):
         self.changeBtn.clicked.connect(self.change)
 
 
+class BackupWindow(QDialog):
+    def __init__(self, mainWindow):
+        super(BackupWindow, self).__init__()
+        self.mainWindow = mainWindow
+        self.setWindowTitle("备份管理")
+        self.resize(600, 400)
+        self.table = QTableWidget()
+        self.restoreBtn = QPushButton("恢复")
+        self.deleteBtn = QPushButton("删除")
+        self.closeBtn = QPushButton("关闭")
+        self.draw()
+        self.register()
+        self.refresh()
+
+    def draw(self):
+        self.table.setColumnCount(3)
+        self.table.setHorizontalHeaderLabels(["编号", "时间", "大小"])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+
+        buttonWidget = QWidget()
+        buttonLayout = QHBoxLayout(buttonWidget)
+        buttonLayout.addWidget(self.restoreBtn)
+        buttonLayout.addWidget(self.deleteBtn)
+        buttonLayout.addWidget(self.closeBtn)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addWidget(HLine())
+        layout.addWidget(buttonWidget)
+
+    def refresh(self):
+        entries = list(reversed(listBackups()))
+        self.table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            self.table.setItem(row, 0, QTableWidgetItem(str(entry["id"])))
+            self.table.setItem(row, 1, QTableWidgetItem(
+                datetime.fromtimestamp(entry["time"]).strftime("%Y-%m-%d %H:%M:%S")))
+            self.table.setItem(row, 2, QTableWidgetItem(f"{entry['size']} B"))
+
+    def selectedIds(self):
+        rows = {index.row() for index in self.table.selectionModel().selectedRows()}
+        return [int(self.table.item(row, 0).text()) for row in sorted(rows)]
+
+    def restore(self):
+        ids = self.selectedIds()
+        if len(ids) != 1:
+            QMessageBox.warning(self, "提示", "请选择一个备份")
+            return
+        ret = QMessageBox.question(self, "提示", f"是否恢复到备份{ids[0]}")
+        if ret != 16384:
+            return
+        ans = self.mainWindow.ensureKey()
+        if not ans[0]:
+            return
+        try:
+            self.mainWindow.data.restoreBackup(ids[0], ans[1])
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        self.refresh()
+        QMessageBox.information(self, "提示", "已恢复备份")
+
+    def delete(self):
+        ids = self.selectedIds()
+        if not ids:
+            return
+        ret = QMessageBox.question(self, "提示", f"是否删除选中的{len(ids)}个备份")
+        if ret != 16384:
+            return
+        deleteBackups(ids)
+        self.refresh()
+
+    def register(self):
+        self.restoreBtn.clicked.connect(self.restore)
+        self.deleteBtn.clicked.connect(self.delete)
+        self.closeBtn.clicked.connect(self.accept)
+
+
+class SortKeyItem(QTableWidgetItem):
+    # 显示文字，排序时按 key 比较
+    def __init__(self, text, key):
+        super(SortKeyItem, self).__init__(text)
+        self.key = key
+
+    def __lt__(self, other):
+        if isinstance(other, SortKeyItem):
+            return self.key < other.key
+        return super().__lt__(other)
+
+
+class AuditWindow(QDialog):
+    # 体检结果只显示评分与问题，不显示任何密码
+    columns = ["平台", "账户", "强度", "熵(位)", "重复组", "共用账户数", "未更换(天)", "问题"]
+
+    def __init__(self, result):
+        super(AuditWindow, self).__init__()
+        self.result = result
+        self.setWindowTitle("密码体检")
+        self.resize(900, 500)
+        self.summaryLabel = QLabel()
+        self.table = QTableWidget()
+        self.closeBtn = QPushButton("关闭")
+        self.draw()
+        self.register()
+        self.refresh()
+
+    def draw(self):
+        self.table.setColumnCount(len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.summaryLabel)
+        layout.addWidget(self.table)
+        layout.addWidget(HLine())
+        layout.addWidget(self.closeBtn)
+
+    def numberItem(self, value):
+        # 按数值而不是文字排序
+        item = QTableWidgetItem()
+        item.setData(Qt.DisplayRole, value)
+        return item
+
+    def refresh(self):
+        from audit import LEVELS
+        result = self.result
+        breached = "" if result.breached is None else f"{result.breached}个出现在泄露库中，"
+        self.summaryLabel.setText(f"共{len(result.entries)}个账户：{result.groups}个密码被多个账户共用，"
+                                  f"{result.weak}个强度不足，{breached}{result.stale}个长期未更换"
+                                  f"(用时{result.elapsed:.1f}秒)")
+        # 填充时关闭排序，避免每插入一格就重新排序
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(result.entries))
+        for row, entry in enumerate(result.entries):
+            level = SortKeyItem(LEVELS[entry.level], entry.level)
+            if entry.level <= 1:
+                level.setForeground(QColor("red"))
+            self.table.setItem(row, 0, QTableWidgetItem(entry.platform))
+            self.table.setItem(row, 1, QTableWidgetItem(entry.account))
+            self.table.setItem(row, 2, level)
+            self.table.setItem(row, 3, self.numberItem(round(entry.entropy)))
+            self.table.setItem(row, 4, self.numberItem(entry.group) if entry.group else QTableWidgetItem(""))
+            self.table.setItem(row, 5, self.numberItem(entry.shared))
+            self.table.setItem(row, 6, self.numberItem(entry.ageDays))
+            self.table.setItem(row, 7, QTableWidgetItem("、".join(entry.issues)))
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(3, Qt.AscendingOrder)
+
+    def register(self):
+        self.closeBtn.clicked.connect(self.accept)
+
+
+class DiagnosticsWindow(QDialog):
+    # 各项操作的耗时分布与读写计数，只含耗时和数量，不含平台、账户等内容
+    columns = ["操作", "次数", "平均(ms)", "p50(ms)", "p90(ms)", "p99(ms)", "最大(ms)"]
+
+    def __init__(self, mainWindow):
+        super(DiagnosticsWindow, self).__init__()
+        self.mainWindow = mainWindow
+        self.setWindowTitle("诊断信息")
+        self.resize(700, 500)
+        self.enabledBox = QCheckBox("记录性能数据")
+        self.enabledBox.setChecked(metrics.enabled)
+        self.table = QTableWidget()
+        self.counterTable = QTableWidget()
+        self.refreshBtn = QPushButton("刷新")
+        self.resetBtn = QPushButton("清空")
+        self.exportBtn = QPushButton("导出JSON")
+        self.closeBtn = QPushButton("关闭")
+        self.draw()
+        self.register()
+        self.refresh()
+
+    def draw(self):
+        self.table.setColumnCount(len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        self.counterTable.setColumnCount(2)
+        self.counterTable.setHorizontalHeaderLabels(["计数", "值"])
+        for table in (self.table, self.counterTable):
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            table.horizontalHeader().setStretchLastSection(True)
+            table.verticalHeader().setVisible(False)
+
+        buttonWidget = QWidget()
+        buttonLayout = QHBoxLayout(buttonWidget)
+        buttonLayout.addWidget(self.refreshBtn)
+        buttonLayout.addWidget(self.resetBtn)
+        buttonLayout.addWidget(self.exportBtn)
+        buttonLayout.addWidget(self.closeBtn)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.enabledBox)
+        layout.addWidget(self.table, 3)
+        layout.addWidget(self.counterTable, 1)
+        layout.addWidget(HLine())
+        layout.addWidget(buttonWidget)
+
+    def refresh(self):
+        snapshot = metrics.snapshot()
+        histograms = snapshot["histograms"]
+        self.table.setRowCount(len(histograms))
+        for row, (name, summary) in enumerate(histograms.items()):
+            self.table.setItem(row, 0, QTableWidgetItem(name))
+            self.table.setItem(row, 1, QTableWidgetItem(str(summary["count"])))
+            for column, field in enumerate(("mean", "p50", "p90", "p99", "max"), 2):
+                self.table.setItem(row, column, QTableWidgetItem(f"{summary[field] * 1000:.3f}"))
+        counters = snapshot["counters"]
+        self.counterTable.setRowCount(len(counters))
+        for row, (name, value) in enumerate(counters.items()):
+            self.counterTable.setItem(row, 0, QTableWidgetItem(name))
+            self.counterTable.setItem(row, 1, QTableWidgetItem(str(value)))
+
+    def setRecording(self, checked):
+        config = loadConfig()
+        config["metrics"] = checked
+        saveConfig(config)
+        metrics.setEnabled(checked)
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def export(self):
+        filePath, _ = QFileDialog.getSaveFileName(self, "导出JSON", os.path.expanduser("~/metrics.json"),
+                                                  "JSON (*.json)")
+        if filePath == "":
+            return
+        try:
+            metrics.exportJson(filePath)
+        except OSError as e:
+            QMessageBox.warning(self, "提示", f"导出失败:{e}")
+            return
+        QMessageBox.information(self, "提示", "已导出")
+
+    def register(self):
+        self.enabledBox.toggled.connect(self.setRecording)
+        self.refreshBtn.clicked.connect(self.refresh)
+        self.resetBtn.clicked.connect(self.reset)
+        self.exportBtn.clicked.connect(self.export)
+        self.closeBtn.clicked.connect(self.accept)
+
+
 class MainWindow(QMainWindow):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, data=None):
         super(MainWindow, self).__init__(parent)
-        # 数据
-        self.data = UIData()
-        if not hasFile():
-            while True:
-                win = InitKey(self)
-                win.show()
-                ret = win.exec_()
-                if ret == QDialog.Accepted:
-                    break
-                else:
-                    exit()
-        else:
-            while True:
-                win = GetKeyWindow(self)
-                win.show()
-                ret = win.exec_()
-                if ret == QDialog.Accepted:
-                    try:
-                        self.data = loadFile(win.key)
-                        break
-                    except Exception:
-                        QMessageBox.warning(self, "提示", "密钥错误")
-                else:
-                    exit()
-
-        self.keyWindow = CheckKeyWindow(self.data)
+        # 数据：main.py 在创建主窗口之前已经完成登录
+        if data is None:
+            data = unlock(self)
+            if data is None:
+                exit()
+        self.data = data
+
+        # 次要窗口在第一次使用时再创建
+        self.keyWindow = None
         self.accountMenu = AccountMenu(self.data, self.ensureKey)
         self.platformMenu = PlatformMenu(self.data, self)
+        self.searchArea = SearchArea(self.data, self)
         self.createMenu()
         self.draw()
+        # 修改交给后台线程保存，状态显示在状态栏
+        self.saveStatus = SaveStatus()
+        self.saveStatus.changed.connect(self.showSaveStatus)
+        self.saveStatusLabel = QLabel("已保存")
+        self.statusBar().addPermanentWidget(self.saveStatusLabel)
+        self.data.startSaver(self.saveStatus.notify)
 
     # 创建菜单栏
     def createMenu(self):
@@ -710,6 +1068,23 @@ class MainWindow(QMainWindow):
         openFileDirAction.triggered.connect(self.openFileDir)
         fileMenu.addAction(openFileDirAction)
 
+        importAction = QAction(QIcon(), '导入', self)
+        importAction.triggered.connect(self.importFile)
+        fileMenu.addAction(importAction)
+
+        exportAction = QAction(QIcon(), '导出', self)
+        exportAction.triggered.connect(self.exportFile)
+        fileMenu.addAction(exportAction)
+
+        searchAction = QAction(QIcon(), '搜索', self)
+        searchAction.setShortcut('Ctrl+F')
+        searchAction.triggered.connect(self.focusSearch)
+        fileMenu.addAction(searchAction)
+
+        auditAction = QAction(QIcon(), '密码体检', self)
+        auditAction.triggered.connect(self.showAudit)
+        fileMenu.addAction(auditAction)
+
         settingsMenu = menuBar.addMenu('设置')
 
         changeKeyAction = QAction(QIcon(), '修改密钥', self)
@@ -720,21 +1095,254 @@ class MainWindow(QMainWindow):
         clearBackupAction.setShortcut('Ctrl+X')
         clearBackupAction.triggered.connect(self.clearBackup)
 
+        config = loadConfig()
+        sessionCacheAction = QAction(QIcon(), '会话缓存', self)
+        sessionCacheAction.setCheckable(True)
+        sessionCacheAction.setChecked(config["sessionCache"])
+        sessionCacheAction.toggled.connect(self.setSessionCache)
+
+        cacheTimeoutAction = QAction(QIcon(), '缓存超时时间', self)
+        cacheTimeoutAction.triggered.connect(self.setCacheTimeout)
+
+        self.journalAction = QAction(QIcon(), '日志模式', self)
+        self.journalAction.setCheckable(True)
+        self.journalAction.setChecked(config["journal"])
+        self.journalAction.triggered.connect(self.setJournal)
+
+        backupAction = QAction(QIcon(), '备份管理', self)
+        backupAction.triggered.connect(self.showBackups)
+
+        diagnosticsAction = QAction(QIcon(), '诊断信息', self)
+        diagnosticsAction.triggered.connect(self.showDiagnostics)
+
+        # 隐藏项：按住 Shift 打开菜单时才显示
+        self.profileAction = QAction(QIcon(), '性能分析', self)
+        self.profileAction.setVisible(False)
+        self.profileAction.triggered.connect(self.setProfiling)
+        settingsMenu.aboutToShow.connect(
+            lambda: self.profileAction.setVisible(bool(QApplication.keyboardModifiers() & Qt.ShiftModifier)))
+
         settingsMenu.addAction(changeKeyAction)
+        settingsMenu.addAction(backupAction)
         settingsMenu.addAction(clearBackupAction)
+        settingsMenu.addSeparator()
+        settingsMenu.addAction(sessionCacheAction)
+        settingsMenu.addAction(cacheTimeoutAction)
+        settingsMenu.addAction(self.journalAction)
+        settingsMenu.addSeparator()
+        settingsMenu.addAction(diagnosticsAction)
+        settingsMenu.addAction(self.profileAction)
+
+    def setSessionCache(self, checked):
+        config = loadConfig()
+        config["sessionCache"] = checked
+        saveConfig(config)
+        if checked:
+            self.data.enableCache(config["cacheTimeout"])
+        else:
+            self.data.disableCache()
+
+    def setCacheTimeout(self):
+        config = loadConfig()
+        timeout, ok = QInputDialog.getInt(self, "缓存超时时间", "空闲多少秒后清除缓存(0为不清除):",
+                                          config["cacheTimeout"], 0, 86400)
+        if not ok:
+            return
+        config["cacheTimeout"] = timeout
+        saveConfig(config)
+        if self.data.cache is not None:
+            self.data.enableCache(timeout)
+
+    def setJournal(self, checked):
+        if not checked:
+            # 关闭日志模式前先把日志合并进快照
+            ans = self.ensureKey()
+            if not ans[0]:
+                self.journalAction.setChecked(True)
+                return
+            try:
+                self.data.compact(ans[1])
+            except ValueError as e:
+                QMessageBox.warning(self, "提示", str(e))
+                self.journalAction.setChecked(True)
+                return
+        elif not self.data.flush():
+            QMessageBox.warning(self, "提示", f"有修改尚未保存:{self.data.saver.error}")
+            self.journalAction.setChecked(False)
+            return
+        config = loadConfig()
+        config["journal"] = checked
+        saveConfig(config)
+        self.data.journaled = checked
+
+    def closeEvent(self, event):
+        # 先等排队的修改写完，失败时询问是否仍然退出
+        if not self.data.flush():
+            ret = QMessageBox.question(self, "提示", f"有修改未能保存:{self.data.saver.error}\n是否仍然退出")
+            if ret != 16384:
+                event.ignore()
+                return
+        # 等待后台压缩完成，再清除内存中的解密数据和派生的密钥
+        if self.data.compactThread is not None:
+            self.data.compactThread.join()
+        self.data.close()
+        super().closeEvent(event)
+
+    def showSaveStatus(self, status, error):
+        texts = {saver.SAVED: "已保存", saver.PENDING: "等待保存", saver.SAVING: "正在保存"}
+        self.saveStatusLabel.setText(texts.get(status, f"保存失败:{error}"))
 
     def changeKey(self):
         win = ChangeKeyWindow(self)
         win.show()
         win.exec_()
 
+    def showBackups(self):
+        win = BackupWindow(self)
+        win.show()
+        win.exec_()
+
+    def showAudit(self):
+        ans = self.ensureKey()
+        if not ans[0]:
+            return
+        from audit import auditVault
+        progressDialog = QProgressDialog("正在检查...", None, 0, 0, self)
+        progressDialog.setWindowTitle("密码体检")
+        progressDialog.setWindowModality(Qt.WindowModal)
+        progressDialog.show()
+
+        def progress(done, total):
+            progressDialog.setMaximum(total)
+            progressDialog.setValue(done)
+            QApplication.processEvents()
+
+        try:
+            result = auditVault(self.data, ans[1], progress=progress)
+        except (OSError, ValueError) as e:
+            progressDialog.close()
+            QMessageBox.warning(self, "提示", f"检查失败:{e}")
+            return
+        progressDialog.close()
+        win = AuditWindow(result)
+        win.show()
+        win.exec_()
+
+    def showDiagnostics(self):
+        win = DiagnosticsWindow(self)
+        win.show()
+        win.exec_()
+
+    def setProfiling(self):
+        if profiler.active():
+            ret = QMessageBox.question(self, "提示", f"还有{profiler.remaining}次操作等待分析，是否停止")
+            if ret == 16384:
+                profiler.stop()
+            return
+        count, ok = QInputDialog.getInt(self, "性能分析", "分析接下来多少次操作:", profiler.DEFAULT_COUNT, 1, 1000)
+        if not ok:
+            return
+        profiler.start(count)
+        QMessageBox.information(self, "提示", f"分析报告将写入:{profiler.profileDir()}")
+
     def clearBackup(self):
         ret = QMessageBox.question(self, "提示", "是否清除所有备份")
         if ret != 16384:
             return
-        clearBackup()
+        ans = self.ensureKey()
+        if not ans[0]:
+            return
+        try:
+            self.data.requireSaved()
+        except ValueError as e:
+            QMessageBox.warning(self, "提示", str(e))
+            return
+        clearBackup(ans[1])
         QMessageBox.information(self, "提示", "已成功清除备份")
 
+    def importFile(self):
+        filePath, _ = QFileDialog.getOpenFileName(self, "导入", os.path.expanduser("~"),
+                                                  "导出文件 (*.csv *.json *.jsonl *.pmarchive);;所有文件 (*)")
+        if filePath == "":
+            return
+        # 导入导出模块只在用到时才加载，不拖慢启动
+        from importer import importFile, detectFormat
+        archiveKey = None
+        if detectFormat(filePath) == "archive":
+            archiveKey, ok = QInputDialog.getText(self, "导入", "导出文件密码:", QLineEdit.Password)
+            if not ok:
+                return
+        choices = {"跳过": "skip", "覆盖": "overwrite", "另存为新账户": "rename"}
+        choice, ok = QInputDialog.getItem(self, "导入", "同名账户密码不同时:", list(choices.keys()), 0, False)
+        if not ok:
+            return
+        ans = self.ensureKey()
+        if not ans[0]:
+            return
+        progressDialog = QProgressDialog("正在导入...", None, 0, 0, self)
+        progressDialog.setWindowTitle("导入")
+        progressDialog.setWindowModality(Qt.WindowModal)
+        progressDialog.show()
+
+        def progress(result):
+            progressDialog.setLabelText(f"已处理{result.rows}条，新增{result.added}条")
+            QApplication.processEvents()
+
+        try:
+            result = importFile(self.data, filePath, ans[1], onConflict=choices[choice], progress=progress,
+                                archiveKey=archiveKey)
+        except (OSError, ValueError) as e:
+            progressDialog.close()
+            QMessageBox.warning(self, "提示", f"导入失败:{e}")
+            return
+        progressDialog.close()
+        QMessageBox.information(self, "提示", f"共{result.rows}条，新增{result.added}条，"
+                                            f"重复{len(result.duplicates)}条，冲突{len(result.conflicts)}条，"
+                                            f"跳过{result.skipped}条")
+
+    def exportFile(self):
+        scopes = ["全部平台"]
+        if self.data.hasPlatform(self.accountMenu.platform):
+            scopes.append(f"当前平台:{self.accountMenu.platform}")
+        scope, ok = QInputDialog.getItem(self, "导出", "导出范围:", scopes, 0, False)
+        if not ok:
+            return
+        platforms = None if scope == scopes[0] else {self.accountMenu.platform}
+        filters = {"CSV (*.csv)": "csv", "JSON (*.json)": "json", "加密导出 (*.pmarchive)": "archive"}
+        filePath, selected = QFileDialog.getSaveFileName(self, "导出", os.path.expanduser("~"), ";;".join(filters))
+        if filePath == "":
+            return
+        fileFormat = filters.get(selected, "csv")
+        archiveKey = None
+        if fileFormat == "archive":
+            archiveKey, ok = QInputDialog.getText(self, "导出", "设置导出文件密码:", QLineEdit.Password)
+            if not ok or archiveKey == "":
+                return
+            ensure, ok = QInputDialog.getText(self, "导出", "确认导出文件密码:", QLineEdit.Password)
+            if not ok or ensure != archiveKey:
+                QMessageBox.warning(self, "提示", "两次密码输入不同")
+                return
+        else:
+            ret = QMessageBox.question(self, "提示", "导出的文件为明文，任何人都可以读取，是否继续")
+            if ret != 16384:
+                return
+        ans = self.ensureKey()
+        if not ans[0]:
+            return
+        from exporter import exportFile
+        try:
+            self.data.requireSaved()
+            result = exportFile(ans[1], filePath, fileFormat, platforms, archiveKey)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "提示", f"导出失败:{e}")
+            return
+        QMessageBox.information(self, "提示", f"已导出{result.entries}条，{result.bytes}字节，"
+                                            f"用时{result.seconds:.2f}秒({result.throughput():.0f}条/秒)")
+
+    def focusSearch(self):
+        self.searchArea.searchEditLine.setFocus()
+        self.searchArea.searchEditLine.selectAll()
+
     def openFileDir(self):
         dirPath = os.path.expanduser('~/password_manager')
         QDesktopServices.openUrl(QUrl.fromLocalFile(dirPath))
@@ -744,17 +1352,23 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("密码管理器")
         self.resize(800, 600)
 
-        layout = QHBoxLayout()
+        menuWidget = QWidget()
+        menuLayout = QHBoxLayout(menuWidget)
+        menuLayout.addWidget(self.platformMenu, 1)
+        menuLayout.addWidget(VLine())
+        menuLayout.addWidget(self.accountMenu, 2)
 
-        layout.addWidget(self.platformMenu, 1)
-        layout.addWidget(VLine())
-        layout.addWidget(self.accountMenu, 2)
+        layout = QVBoxLayout()
+        layout.addWidget(self.searchArea)
+        layout.addWidget(menuWidget, 1)
 
         widget = QWidget()
         widget.setLayout(layout)
         self.setCentralWidget(widget)
 
     def ensureKey(self):
+        if self.keyWindow is None:
+            self.keyWindow = CheckKeyWindow(self.data)
         self.keyWindow.keyEditLine.setText("")
         if self.keyWindow.exec_() == QDialog.Accepted:  # 模态执行并等待关闭
             return [self.keyWindow.resultFlag, self.keyWindow.keyEditLine.text()]  # 返回验证结果
@@ -1,65 +1,774 @@
+import functools
 import hashlib
+import hmac
 import json
+import logging
+import backup
+import container
 import encrypt
+import journal
+import metrics
 import os
-from datetime import datetime
+import profiler
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from paths import getPath, vaultStamp
+from saver import SaveWorker
+from search import SearchIndex
 
+logger = logging.getLogger(__name__)
+
+# 存储格式版本：2 表示索引与密码记录分开加密
+VERSION = 2
+# 索引按平台名的哈希分为若干段，每段单独加密存放在 segments/ 下，文件名为密文的哈希；
+# 快照中只保存平台顺序与各段的文件名，修改一个平台只需重新加密它所在的段
+SEGMENTS = 64
+# 第一次写入新格式的快照后创建，之后拒绝最初的 base64 文本格式
+FORMAT_FILE = 'version'
+
+
+# 本地设置，不含任何敏感数据
+defaultConfig = {
+    "sessionCache": False,  # 解锁后在内存中缓存解密数据
+    "cacheTimeout": 300,  # 缓存空闲多少秒后清除
+    "journal": False,  # 修改只追加到日志，定期压缩为快照
+    "journalCompactSize": 256,  # 日志达到多少条后在后台压缩
+    "backupRetention": dict(backup.defaultRetention),  # 备份保留策略
+    "backupInterval": 300,  # 两次自动备份的最短间隔(秒)，清理备份与无用记录也只在备份时进行
+    "kdfTarget": 0.5,  # 校准 KDF 时期望的解锁耗时(秒)
+    "metrics": False,  # 记录各项操作的耗时，在 设置-诊断信息 中查看
+}
 
-def save(key, data):
-    if data is None:
-        return
-    encrypted = encrypt.aesEncrypt(json.dumps(data), key)
-    filePath = os.path.expanduser('~/password_manager/password.txt')
 
-    # 备份
+def loadConfig():
+    config = dict(defaultConfig)
+    filePath = getPath('config.json')
     if os.path.exists(filePath):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        with open(filePath, 'r') as f:
-            text = f.read()
-        backupPath = os.path.expanduser(f'~/password_manager/{timestamp}')
-        with open(backupPath, 'w') as f:
-            f.write(text)
-
-    # 写入内容
+        try:
+            with open(filePath, 'r') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    return config
+
+
+def saveConfig(config):
+    filePath = getPath('config.json')
+    os.makedirs(os.path.dirname(filePath), exist_ok=True)
     with open(filePath, 'w') as f:
-        f.write(encrypted)
+        json.dump(config, f, indent=4)
+
+
+headerCache = dict()
+
+
+def getHeader():
+    # 当前快照的头部(加密方式、密钥派生参数)，文件未变化时直接使用缓存
+    filePath = getPath('password.txt')
+    st = os.stat(filePath)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = headerCache.get(filePath)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(filePath, 'rb') as f:
+        buf = memoryview(f.read(4096))
+    if container.isContainer(buf):
+        header = container.readHeader(buf)[0]
+    else:
+        header = {"cipher": container.CIPHER_AES_CBC, "params": {}}
+    headerCache[filePath] = (stamp, header)
+    return header
+
+
+def getKdfParams():
+    return getHeader()["params"]
+
+
+def getKey(key):
+    # 口令 -> 当前保险库的密钥(会话内缓存)；已派生的密钥原样返回
+    if isinstance(key, str):
+        return encrypt.deriveKey(key, getKdfParams())
+    return key
+
+
+def keyVerifier(derived):
+    return hmac.new(derived, b"password-manager key verifier", hashlib.sha256).hexdigest()
+
+
+def newKdfParams():
+    return encrypt.newKdfParams(encrypt.calibrate(loadConfig()["kdfTarget"]))
+
+
+def newEntry(recordId, changed=None):
+    # 索引中的账户条目：[密码记录编号, 密码最后一次修改的时间]；重新加密或只改用户名时沿用原来的时间
+    return [recordId, int(time.time()) if changed is None else changed]
+
+
+@metrics.timed("ui_data.save")
+def save(key, data, params=None, previous=None, snapshot=False):
+    # previous 为重新加密之前的索引，用来沿用各密码的修改时间；snapshot 见 saveIndex
+    if data is None:
+        return
+    if params is None:
+        params = getKdfParams()
+    derived = encrypt.deriveKey(key, params) if isinstance(key, str) else key
+    # 完整数据 -> 逐条写入密码记录，再写入索引
+    index = {"version": VERSION, "key": data["key"], "platforms": {}}
+    for platform, accounts in data["platforms"].items():
+        index["platforms"][platform] = {}
+        old = previous["platforms"].get(platform, {}) if previous is not None else {}
+        for account, password in accounts.items():
+            changed = old[account][1] if account in old else None
+            index["platforms"][platform][account] = newEntry(writeRecord(password, derived), changed)
+    saveIndex(derived, index, params, snapshot)
+
+
+journals = dict()
+backupStores = dict()
+vaultLocks = dict()
+
+
+def getJournal():
+    filePath = getPath('journal')
+    if filePath not in journals:
+        journals[filePath] = journal.Journal(filePath)
+    return journals[filePath]
+
+
+def getBackupStore():
+    filePath = getPath('backup')
+    if filePath not in backupStores:
+        backupStores[filePath] = backup.BackupStore(filePath)
+    return backupStores[filePath]
+
+
+def getVaultLock():
+    # 读取索引、修改、再写回的整个过程都要持有，同一进程内可重入
+    dirPath = getPath()
+    if dirPath not in vaultLocks:
+        vaultLocks[dirPath] = journal.VaultLock(dirPath)
+    return vaultLocks[dirPath]
+
+
+def indexRefs(index):
+    refs = set()
+    for accounts in index["platforms"].values():
+        refs.update(entry[0] for entry in accounts.values())
+    return refs
+
+
+def segmentRefs(manifest, index):
+    # {分段编号: 该段引用的密码记录}，备份库按分段保存引用关系
+    segments = manifest.get("segments", {})
+    refs = {segmentId: set() for segmentId in segments.values()}
+    for platform, accounts in index["platforms"].items():
+        refs[segments[str(segmentOf(platform))]].update(entry[0] for entry in accounts.values())
+    return refs
+
+
+def snapshotRefs(blob, key):
+    # 已有快照引用的分段与密码记录，不是当前格式时为空
+    try:
+        manifest = json.loads(container.openBytes(blob, key)[1])
+        if manifest.get("version") != VERSION or "segments" not in manifest:
+            return {}
+        return segmentRefs(manifest, readSegments(key, manifest))
+    except Exception:
+        return {}
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def segmentOf(platform):
+    return int.from_bytes(hashlib.sha256(platform.encode("utf-8")).digest()[:4], "big") % SEGMENTS
+
+
+# 最近一次读写的各段 (密钥校验值, {段号: (文件名, 内容)})，只对同一个密钥有效；整体替换，不原地修改
+segmentCache = (None, {})
+
+
+def cachedSegments(derived):
+    check, segments = segmentCache
+    if check is None or not hmac.compare_digest(check, container.keyCheck(derived)):
+        return {}
+    return segments
+
+
+def writeSegments(derived, index):
+    # 返回快照中保存的清单，内容没有变化的段沿用原来的文件
+    buckets = dict()
+    for platform, accounts in index["platforms"].items():
+        buckets.setdefault(segmentOf(platform), {})[platform] = accounts
+    global segmentCache
+    cached = cachedSegments(derived)
+    segments = dict()
+    written = dict()
+    for number, bucket in buckets.items():
+        # 与上次的内容直接比较，没有变化的段不必序列化
+        old = cached.get(number)
+        if old is not None and old[1] == bucket and os.path.exists(getPath('segments', old[0])):
+            segments[str(number)] = old[0]
+            written[number] = old
+            continue
+        blob = container.seal(json.dumps(bucket).encode(), derived)
+        segmentId = hashlib.sha256(blob).hexdigest()
+        segmentPath = getPath('segments', segmentId)
+        os.makedirs(os.path.dirname(segmentPath), exist_ok=True)
+        # 清单发布之前由 saveIndex 统一把目录落盘
+        journal.writeDurable(segmentPath, blob)
+        metrics.count("ui_data.segmentsWritten")
+        segments[str(number)] = segmentId
+        # 索引之后还会被修改，缓存中保存一份副本
+        written[number] = (segmentId, {platform: dict(accounts) for platform, accounts in bucket.items()})
+    segmentCache = (container.keyCheck(derived), written)
+    return {"version": VERSION, "key": index["key"], "journalSeq": index["journalSeq"],
+            "order": list(index["platforms"]), "segments": segments}
+
+
+def readSegment(derived, number, segmentId):
+    # 文件名即密文的哈希，而清单本身经过认证，某一段被换成旧版本也能发现
+    blob = container.readAddressed(getPath('segments', segmentId), segmentId)
+    plainText = container.openBytes(blob, derived)[1]
+    return number, segmentId, plainText
+
+
+def readSegments(key, manifest):
+    # 快照 -> 完整索引；旧版快照直接包含全部平台
+    if "segments" not in manifest:
+        return manifest
+    global segmentCache
+    derived = getKey(key)
+    cached = cachedSegments(derived)
+    platforms = dict.fromkeys(manifest["order"])
+    loaded = dict()
+    pending = []
+    for number, segmentId in manifest["segments"].items():
+        old = cached.get(int(number))
+        if old is not None and old[0] == segmentId:
+            loaded[int(number)] = old
+        else:
+            pending.append((int(number), segmentId))
+    if pending:
+        # 各段互不依赖，在线程池中并行读取、校验与解密，哪段先完成就先并入索引
+        with ThreadPoolExecutor(min(len(pending), os.cpu_count() or 1, 8)) as executor:
+            futures = [executor.submit(readSegment, derived, number, segmentId) for number, segmentId in pending]
+            for future in as_completed(futures):
+                number, segmentId, plainText = future.result()
+                loaded[number] = (segmentId, json.loads(plainText))
+    for segmentId, bucket in loaded.values():
+        # 缓存中的段之后可能被修改，复制一份
+        platforms.update({platform: dict(accounts) for platform, accounts in bucket.items()})
+    if any(accounts is None for accounts in platforms.values()):
+        raise container.CorruptedError("数据文件不完整")
+    segmentCache = (container.keyCheck(derived), loaded)
+    index = {k: v for k, v in manifest.items() if k not in ("order", "segments")}
+    index["platforms"] = platforms
+    return index
+
+
+def ingestSnapshot(key):
+    # 第一次使用备份库时先收录现有快照，key 需能解密现有快照
+    store = getBackupStore()
+    filePath = getPath('password.txt')
+    if not store.list() and os.path.exists(filePath):
+        with open(filePath, 'rb') as f:
+            old = f.read()
+        store.add(filePath, old, snapshotRefs(old, key))
+
+
+def markFormat():
+    filePath = getPath(FORMAT_FILE)
+    if not os.path.exists(filePath):
+        journal.writeAtomic(filePath, str(VERSION))
+
+
+def saveIndex(key, index, params=None, snapshot=False):
+    # snapshot 为真时无论距上次备份多久都收入备份库
+    log = getJournal()
+    filePath = getPath('password.txt')
+    if params is None:
+        params = getKdfParams() if os.path.exists(filePath) else {}
+    derived = encrypt.deriveKey(key, params) if isinstance(key, str) else key
+    # 索引需已包含日志中的全部修改，写入快照后这些日志记录即可丢弃
+    index["journalSeq"] = index.get("journalSeq", log.seq)
+
+    with getVaultLock(), log.compactLock:
+        store = getBackupStore()
+        with metrics.timer("ui_data.backup"):
+            ingestSnapshot(key)
+
+        # 先写入有变化的段，再写入引用它们的快照
+        with metrics.timer("ui_data.writeSegments"):
+            manifest = writeSegments(derived, index)
+        blob = container.seal(json.dumps(manifest).encode(), derived, params)
+        with metrics.timer("ui_data.writeSnapshot"):
+            journal.syncPending()
+            journal.writeAtomic(filePath, blob)
+        markFormat()
+        log.dropUpTo(index["journalSeq"])
+
+        # 备份：快照按内容去重，密码记录与分段本身不可变，无需复制；
+        # 每次修改都备份会让清理备份与无用记录(需要遍历全部记录文件)落在每次保存上，按间隔进行
+        config = loadConfig()
+        if snapshot or store.due(config["backupInterval"]):
+            try:
+                with metrics.timer("ui_data.backup"):
+                    store.add(filePath, blob, segmentRefs(manifest, index))
+                    if store.prune(config["backupRetention"]):
+                        collectRecords(derived, index)
+            except Exception:
+                # 快照已经发布，这次保存已经成功：不能让调用方当作失败而撤销(删除新写入的记录)，
+                # 只记录下来，到期的备份下次保存时再做；恢复备份等依赖这次备份的操作仍然报错
+                if snapshot:
+                    raise
+                metrics.count("ui_data.backupErrors")
+                logger.exception("保存后备份失败")
+
+
+def writeRecord(password, key):
+    # 每个密码单独加密为一条记录，文件名为密文的哈希，写入后不再修改
+    blob = container.seal(password.encode(), getKey(key))
+    recordId = hashlib.sha256(blob).hexdigest()
+    recordPath = getPath('records', recordId)
+    os.makedirs(os.path.dirname(recordPath), exist_ok=True)
+    journal.writeDurable(recordPath, blob)
+    metrics.count("ui_data.recordsWritten")
+    return recordId
+
+
+def readRecord(recordId, key):
+    # 与分段相同，记录被换成同一密钥加密的其他记录时也能发现
+    blob = container.readAddressed(getPath('records', recordId), recordId)
+    return container.openBytes(blob, getKey(key))[1].decode()
+
 
+# 旧版本每次保存时留下的备份文件，文件名为时间戳
+LEGACY_BACKUP = re.compile(r"\d{8}_\d{6}")
 
-def deleteFilesExcept(targetDir, excludeFile):
+
+def deleteLegacyBackups(targetDir):
     for item in os.listdir(targetDir):
         item_path = os.path.join(targetDir, item)
-        # 只处理文件，忽略子文件夹
-        if os.path.isfile(item_path) and item != excludeFile:
+        # 只删除按时间戳命名的文件，其他文件与子文件夹都不动
+        if LEGACY_BACKUP.fullmatch(item) and os.path.isfile(item_path):
             try:
                 os.remove(item_path)
             except Exception:
                 pass
 
 
-def clearBackup():
-    filePath = os.path.expanduser('~/password_manager/')
+def collectRecords(key, index, grace=60):
+    # 清理当前索引、当前快照、未合并的日志以及所有备份都不再引用的密码记录与分段
+    # 写入不到 grace 秒的文件可能属于尚未记入索引的修改，先保留
+    used = indexRefs(index) | getBackupStore().referencedRecords()
+    manifest = json.loads(container.readFile(getPath('password.txt'), getKey(key))[1])
+    used.update(manifest.get("segments", {}).values())
+    for ops in getJournal().pendingOps(getKey(key), index.get("journalSeq", 0)):
+        used.update(op[3][0] for op in ops if op[0] == "setAccount")
+    deadline = time.time() - grace
+    for targetDir in (getPath('records'), getPath('segments')):
+        if not os.path.exists(targetDir):
+            continue
+        for item in os.listdir(targetDir):
+            itemPath = os.path.join(targetDir, item)
+            if item not in used and os.path.getmtime(itemPath) < deadline:
+                try:
+                    os.remove(itemPath)
+                except OSError:
+                    pass
+
+
+def clearBackup(key):
+    filePath = getPath()
     if not os.path.exists(filePath):
         return
-    deleteFilesExcept(filePath, "password.txt")
+    with getVaultLock():
+        deleteLegacyBackups(filePath)
+        getBackupStore().clear()
+        collectRecords(key, loadIndex(key))
+
+
+def listBackups():
+    return getBackupStore().list()
+
+
+def deleteBackups(entryIds):
+    with getVaultLock():
+        getBackupStore().remove(set(entryIds))
+
+
+def restoreBackup(entryId, key):
+    store = getBackupStore()
+    blob = store.readObject(store.get(entryId)["object"])
+    try:
+        manifest = json.loads(container.openBytes(blob, key)[1])
+    except container.CorruptedError:
+        raise ValueError("该备份已损坏")
+    except Exception:
+        raise ValueError("该备份使用的密钥与当前密钥不同")
+    if not all(os.path.exists(getPath('segments', s)) for s in manifest.get("segments", {}).values()):
+        raise ValueError("该备份已损坏")
+    # 先把当前状态写成快照收入备份库，再整体替换
+    with getVaultLock():
+        saveIndex(key, loadIndex(key), snapshot=True)
+        log = getJournal()
+        with log.compactLock:
+            journal.writeAtomic(getPath('password.txt'), blob)
+            log.dropUpTo(log.seq)
 
 
-def load(key):
-    filePath = os.path.expanduser('~/password_manager/password.txt')
-    with open(filePath, 'r') as f:
-        encrypted = f.read()
-        plainText = encrypt.aesDecrypt(encrypted, key)
-        return json.loads(plainText)
+def loadIndex(key):
+    # 写入过新格式的快照之后，不再接受没有完整性校验的旧格式，防止被换回旧文件
+    legacy = not os.path.exists(getPath(FORMAT_FILE))
+    index = json.loads(container.readFile(getPath('password.txt'), key, legacy)[1])
+    if index.get("version") != VERSION:
+        # 最初的 base64 文本格式：密码直接存放在索引中，迁移为独立记录
+        save(key, index)
+        return loadIndex(key)
+    index = readSegments(key, index)
+    # 重放快照之后追加的日志
+    return getJournal().replay(getKey(key), index)
+
+
+def iterEntries(key, platforms=None, index=None):
+    # 逐条解密，依次返回 (平台, 用户名, 密码)，platforms 不为空时只返回这些平台
+    if index is None:
+        index = loadIndex(key)
+    for platform, accounts in index["platforms"].items():
+        if platforms is not None and platform not in platforms:
+            continue
+        for account, entry in accounts.items():
+            yield platform, account, readRecord(entry[0], key)
+
+
+@metrics.timed("ui_data.load")
+def load(key, index=None):
+    if index is None:
+        index = loadIndex(key)
+    data = {"key": index["key"], "platforms": {p: {} for p in index["platforms"]}}
+    for platform, account, password in iterEntries(key, index=index):
+        data["platforms"][platform][account] = password
+    return data
 
 
 def getPassword(platform, account, key):
-    data = load(key)
-    return data["platforms"][platform][account]
+    index = loadIndex(key)
+    return readRecord(index["platforms"][platform][account][0], key)
+
+
+class VaultCache:
+    # 会话缓存：解锁后保存解密的索引与已查看的密码，空闲超时后清零并丢弃
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.keyHash = ""
+        self.index = None
+        self.secrets = dict()
+        self.lastUsed = 0.0
+        self.timer = None
+
+    def keyMatches(self, key):
+        return hmac.compare_digest(self.keyHash, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def unlock(self, key, index):
+        with self.lock:
+            self.wipe()
+            self.keyHash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+            self.index = index
+            self.touch()
+
+    def getIndex(self, key):
+        with self.lock:
+            if self.index is None or not self.keyMatches(key):
+                return None
+            self.touch()
+            return self.index
+
+    def getSecret(self, recordId, key):
+        with self.lock:
+            if self.index is None or not self.keyMatches(key) or recordId not in self.secrets:
+                return None
+            self.touch()
+            return self.secrets[recordId].decode("utf-8")
+
+    def putSecret(self, recordId, secret, key):
+        with self.lock:
+            if self.index is None or not self.keyMatches(key):
+                return
+            self.secrets[recordId] = bytearray(secret.encode("utf-8"))
+
+    def touch(self):
+        self.lastUsed = time.monotonic()
+        if self.timer is None and self.timeout > 0:
+            self.schedule(self.timeout)
+
+    def schedule(self, delay):
+        self.timer = threading.Timer(delay, self.expire)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def expire(self):
+        with self.lock:
+            self.timer = None
+            if self.index is None:
+                return
+            remaining = self.lastUsed + self.timeout - time.monotonic()
+            if remaining > 0:
+                self.schedule(remaining)
+            else:
+                # 空闲超时视为锁定，连同派生的密钥一起清除
+                self.wipe()
+                encrypt.clearKeyCache()
+
+    def wipe(self):
+        with self.lock:
+            for secret in self.secrets.values():
+                secret[:] = bytes(len(secret))
+            self.secrets.clear()
+            self.index = None
+            self.keyHash = ""
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+
+# 数据变化事件：(类型, 平台[, 用户名[, 新用户名]])
+PLATFORM_ADDED = "platformAdded"
+PLATFORM_REMOVED = "platformRemoved"
+ACCOUNT_ADDED = "accountAdded"
+ACCOUNT_CHANGED = "accountChanged"  # 同名账户覆盖了密码，位置不变
+ACCOUNT_RENAMED = "accountRenamed"  # 修改账户：移除原账户，新用户名不存在时追加到末尾
+ACCOUNT_REMOVED = "accountRemoved"
+RESET = "reset"  # 整体重新加载，需要全部刷新
+
+# 一个事务内的事件超过该数量时合并为一次 RESET
+EVENT_MERGE_SIZE = 100
 
 
 class UIData:
     def __init__(self):
         self.platforms = dict()
+        self.records = dict()
         self.key = ""
+        self.cache = None
+        self.compactThread = None
+        # 最近一次读写后快照与日志的状态，不一致说明其他进程修改过，缓存的索引与日志序号都要重新读取；
+        # outdated 表示其他进程的修改还没有反映到内存中的平台与账户上，等 refresh 重新加载
+        self.stamp = None
+        self.outdated = False
+        # 平台与用户名的搜索索引，随增删改同步更新；解锁与回滚后在第一次搜索时才建立
+        self.searchIndex = SearchIndex()
+        # 数据变化的监听者，以及事务中暂存的事件
+        self.listeners = []
+        self.pendingEvents = None
+        # 后台保存线程，为空时修改直接在当前线程写入
+        self.saver = None
+        # 事务中暂存的修改与新写入的记录
+        self.pendingOps = None
+        self.pendingRecords = None
+        config = loadConfig()
+        self.journaled = config["journal"]
+        self.compactSize = config["journalCompactSize"]
+        if config["metrics"]:
+            metrics.setEnabled(True)
+        if config["sessionCache"]:
+            self.enableCache(config["cacheTimeout"])
+
+    def enableCache(self, timeout):
+        self.disableCache()
+        self.cache = VaultCache(timeout)
+
+    def disableCache(self):
+        if self.cache is not None:
+            self.cache.wipe()
+            self.cache = None
+
+    def startSaver(self, onStatus=None):
+        # 之后的修改交给后台线程写入，连续的修改合并为一次
+        if self.saver is None:
+            self.saver = SaveWorker(self.write, onStatus)
+
+    def stopSaver(self):
+        ok = True
+        if self.saver is not None:
+            ok = self.saver.close()
+            self.saver = None
+        return ok
+
+    def flush(self, timeout=None):
+        return self.saver is None or self.saver.flush(timeout)
+
+    def requireSaved(self):
+        # 需要直接读写文件的操作之前调用，确保排队的修改都已写入
+        if not self.flush():
+            raise ValueError(f"有修改尚未保存:{self.saver.error}")
+
+    def close(self):
+        # 先写完排队的修改与正在进行的压缩，返回是否全部保存成功
+        ok = self.stopSaver()
+        if self.compactThread is not None:
+            self.compactThread.join()
+        self.disableCache()
+        encrypt.clearKeyCache()
+        return ok
+
+    def loadIndex(self, key):
+        if self.cache is None:
+            return loadIndex(key)
+        index = self.cache.getIndex(key)
+        if index is None:
+            index = loadIndex(key)
+            self.cache.unlock(key, index)
+        return index
+
+    def saveIndex(self, key, index):
+        try:
+            saveIndex(key, index)
+        except Exception:
+            # 写入失败时缓存可能与文件不一致，直接丢弃
+            if self.cache is not None:
+                self.cache.wipe()
+            raise
+
+    def subscribe(self, listener):
+        # listener(event)，event 为 (类型, 平台, ...)，类型见上方的常量
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def notify(self, *event):
+        if self.pendingEvents is not None:
+            self.pendingEvents.append(event)
+            return
+        for listener in list(self.listeners):
+            listener(event)
+
+    @contextmanager
+    def transaction(self, key):
+        # 事务内的修改只在内存中累积，退出时一次写入；出错则全部撤销
+        if self.pendingOps is not None:
+            yield self
+            return
+        platforms = {k: list(v) for k, v in self.platforms.items()}
+        records = {k: dict(v) for k, v in self.records.items()}
+        self.pendingOps = []
+        self.pendingRecords = []
+        self.pendingEvents = []
+        try:
+            yield self
+            if self.pendingOps:
+                self.submit(key, self.pendingOps)
+        except BaseException:
+            self.platforms = platforms
+            self.records = records
+            self.searchIndex.rebuild(self.platforms)
+            for recordId in self.pendingRecords:
+                try:
+                    os.remove(getPath('records', recordId))
+                except OSError:
+                    pass
+            self.pendingEvents = [(RESET,)] if self.pendingEvents else []
+            raise
+        finally:
+            events = self.pendingEvents
+            self.pendingOps = None
+            self.pendingRecords = None
+            self.pendingEvents = None
+            # 事务结束后再通知，视图看到的总是已提交(或已撤销)的状态
+            if len(events) > EVENT_MERGE_SIZE:
+                events = [(RESET,)]
+            for event in events:
+                self.notify(*event)
+
+    def writeRecord(self, password, key):
+        recordId = writeRecord(password, key)
+        if self.pendingRecords is not None:
+            self.pendingRecords.append(recordId)
+        return recordId
+
+    def apply(self, key, ops):
+        if self.pendingOps is not None:
+            self.pendingOps.extend(ops)
+            return
+        self.submit(key, ops)
+
+    def submit(self, key, ops):
+        if self.saver is None:
+            self.write(key, ops)
+        else:
+            self.saver.put(key, ops)
+
+    def checkStamp(self):
+        # 持有保险库锁、读取索引之前调用；文件被其他进程修改过时丢弃缓存的索引，并让日志重新读取序号
+        if vaultStamp() == self.stamp:
+            return True
+        if self.cache is not None:
+            self.cache.wipe()
+        getJournal().ready = False
+        self.outdated = True
+        return False
+
+    @profiler.profiled("UIData.write")
+    @metrics.timed("UIData.write")
+    def write(self, key, ops):
+        with getVaultLock():
+            self.checkStamp()
+            if not self.journaled:
+                index = self.loadIndex(key)
+                journal.applyOps(index, ops)
+                self.saveIndex(key, index)
+                self.stamp = vaultStamp()
+                return
+            # 日志模式：只追加这次修改，不读取也不重写整个索引
+            log = getJournal()
+            if not log.ready:
+                self.loadIndex(key)
+            seq = log.append(getKey(key), ops)
+            if self.cache is not None:
+                index = self.cache.getIndex(key)
+                if index is not None:
+                    journal.applyOps(index, ops)
+                    index["journalSeq"] = seq
+            self.stamp = vaultStamp()
+            if log.count >= self.compactSize:
+                self.compactInBackground(key)
+
+    def compact(self, key):
+        self.requireSaved()
+        if self.compactThread is not None:
+            self.compactThread.join()
+        with getVaultLock():
+            self.checkStamp()
+            index = None
+            if self.cache is not None:
+                index = self.cache.getIndex(key)
+            saveIndex(key, loadIndex(key) if index is None else json.loads(json.dumps(index)))
+            self.stamp = vaultStamp()
+
+    def compactInBackground(self, key):
+        if self.compactThread is not None and self.compactThread.is_alive():
+            return
+        index = None
+        if self.cache is not None:
+            index = self.cache.getIndex(key)
+        if index is not None:
+            # 在当前线程复制一份，后台线程只负责加密和写入
+            index = json.loads(json.dumps(index))
+        self.compactThread = threading.Thread(target=self.compactLocked, args=(key, index, vaultStamp()))
+        self.compactThread.start()
+
+    def compactLocked(self, key, index, stamp):
+        # 复制索引之后文件又被修改过(本进程追加了日志，或其他进程写入)时改为从文件读取
+        with getVaultLock():
+            self.checkStamp()
+            if index is None or vaultStamp() != stamp:
+                index = loadIndex(key)
+            saveIndex(key, index)
+            self.stamp = vaultStamp()
 
     def getPlatforms(self):
         return list(self.platforms.keys())
@@ -70,43 +779,133 @@ class UIData:
         else:
             return self.platforms[platform]
 
+    def search(self, query, limit=50):
+        # 返回 [(平台, 用户名)]，匹配的是平台本身时用户名为 None
+        return self.searchIndex.search(query, limit)
+
+    def getPassword(self, platform, account, key):
+        # 只解密这一条记录
+        recordId = self.records[platform][account][0]
+        if self.cache is None:
+            return readRecord(recordId, key)
+        password = self.cache.getSecret(recordId, key)
+        if password is None:
+            password = readRecord(recordId, key)
+            self.cache.putSecret(recordId, password, key)
+        return password
+
+    @profiler.profiled("UIData.addPlatform")
     def addPlatform(self, name, key):
+        # 每次修改之前先确认内存中的数据没有过期(其他进程可能刚修改过)
+        self.refresh(key)
         if name in self.platforms:
             return
         self.platforms[name] = []
-        data = load(key)
-        data["platforms"][name] = {}
-        save(key, data)
+        self.records[name] = {}
+        self.searchIndex.add(name)
+        self.apply(key, [["addPlatform", name]])
+        self.notify(PLATFORM_ADDED, name)
 
+    @profiler.profiled("UIData.deletePlatform")
     def deletePlatform(self, platform, key):
+        self.refresh(key)
+        if platform not in self.platforms:
+            return
+        self.searchIndex.removePlatform(platform, self.platforms[platform])
         self.platforms.pop(platform)
-        data = load(key)
-        data["platforms"].pop(platform)
-        save(key, data)
+        self.records.pop(platform)
+        self.apply(key, [["deletePlatform", platform]])
+        self.notify(PLATFORM_REMOVED, platform)
 
+    @profiler.profiled("UIData.addAccount")
     def addAccount(self, platform, accountName, password, key):
+        self.refresh(key)
         if platform not in self.platforms:
             return
-        self.platforms[platform].append(accountName)
-        data = load(key)
-        data["platforms"][platform][accountName] = password
-        save(key, data)
+        entry = newEntry(self.writeRecord(password, key))
+        self.apply(key, [["setAccount", platform, accountName, entry]])
+        if accountName not in self.records[platform]:
+            self.platforms[platform].append(accountName)
+            self.searchIndex.add(platform, accountName)
+            self.notify(ACCOUNT_ADDED, platform, accountName)
+        else:
+            self.notify(ACCOUNT_CHANGED, platform, accountName)
+        self.records[platform][accountName] = entry
 
-    def changeAccount(self, platform, account, password, accountC, passwordC, key):
+    @profiler.profiled("UIData.changeAccount")
+    def changeAccount(self, platform, account, accountC, passwordC, key):
+        self.refresh(key)
+        if account not in self.records.get(platform, {}):
+            return
         account_ = account
-        password_ = password
+        entry = self.records[platform][account]
         if accountC != "":
             account_ = accountC
         if passwordC != "":
-            password_ = passwordC
-        self.deleteAccount(platform, account, key)
-        self.addAccount(platform, account_, password_, key)
+            entry = newEntry(self.writeRecord(passwordC, key))
+            ops = [["deleteAccount", platform, account], ["setAccount", platform, account_, entry]]
+        else:
+            # 只改用户名时沿用原记录与修改时间，无需重新加密密码；写入时移动文件中的条目
+            ops = [["renameAccount", platform, account, account_]]
+        self.apply(key, ops)
+        self.platforms[platform].remove(account)
+        self.records[platform].pop(account)
+        if account_ not in self.records[platform]:
+            self.platforms[platform].append(account_)
+        self.records[platform][account_] = entry
+        self.searchIndex.rename(platform, account, account_)
+        # 与索引中的顺序一致：原账户移除，新用户名不存在时追加到末尾
+        self.notify(ACCOUNT_RENAMED, platform, account, account_)
 
+    @profiler.profiled("UIData.deleteAccount")
     def deleteAccount(self, platform, account, key):
+        self.refresh(key)
+        if account not in self.records.get(platform, {}):
+            return
+        self.searchIndex.remove(platform, account)
         self.platforms[platform].remove(account)
-        data = load(key)
-        data["platforms"][platform].pop(account)
-        save(key, data)
+        self.records[platform].pop(account)
+        self.apply(key, [["deleteAccount", platform, account]])
+        self.notify(ACCOUNT_REMOVED, platform, account)
+
+    def checkKey(self, password):
+        # 只有解锁时需要计算 KDF，之后命中会话内的密钥缓存
+        return hmac.compare_digest(keyVerifier(getKey(password)), self.key)
+
+    @profiler.profiled("UIData.reload")
+    @metrics.timed("UIData.reload")
+    def reload(self, key):
+        with getVaultLock():
+            if needsUpgrade():
+                upgradeVault(key)
+            index = loadIndex(key)
+            self.stamp = vaultStamp()
+            self.outdated = False
+        self.key = index["key"]
+        self.records = {k: dict(v) for k, v in index["platforms"].items()}
+        self.platforms = {k: list(v.keys()) for k, v in index["platforms"].items()}
+        self.searchIndex.rebuild(self.platforms)
+        metrics.count("UIData.reloadEntries", sum(len(v) for v in self.records.values()))
+        if self.cache is not None:
+            self.cache.unlock(key, index)
+        self.notify(RESET)
+
+    def refresh(self, key):
+        # 其他进程修改过保险库时重新加载，返回是否重新加载；有修改还在排队时先不加载，以免它们暂时从界面上消失
+        if self.pendingOps is not None or (self.saver is not None and self.saver.pending()):
+            return False
+        if not self.outdated and vaultStamp() == self.stamp:
+            return False
+        self.reload(key)
+        return True
+
+    @profiler.profiled("UIData.restoreBackup")
+    def restoreBackup(self, entryId, key):
+        self.requireSaved()
+        if self.compactThread is not None:
+            self.compactThread.join()
+        restoreBackup(entryId, key)
+        self.reload(key)
 
     def getDict(self):
         return self.platforms
@@ -114,34 +913,67 @@ class UIData:
     def hasPlatform(self, platform):
         return platform in self.platforms
 
+    @profiler.profiled("UIData.changeKey")
     def changeKey(self, key: str, newKey: str):
-        data = load(key)
-        data["key"] = hashlib.sha256(newKey.encode("utf-8")).hexdigest()
-        save(newKey, data)
-        self.key = hashlib.sha256(newKey.encode("utf-8")).hexdigest()
+        self.requireSaved()
+        if self.compactThread is not None:
+            self.compactThread.join()
+        with getVaultLock():
+            self.checkStamp()
+            previous = loadIndex(key)
+            data = load(key, previous)
+            ingestSnapshot(key)
+            # 沿用当前的 KDF 代价，换一个新的盐
+            params = encrypt.newKdfParams(getKdfParams())
+            derived = encrypt.deriveKey(newKey, params)
+            data["key"] = keyVerifier(derived)
+            save(derived, data, params, previous, snapshot=True)
+            index = loadIndex(newKey)
+            self.stamp = vaultStamp()
+        self.key = data["key"]
+        self.records = {k: dict(v) for k, v in index["platforms"].items()}
+        if self.cache is not None:
+            self.cache.unlock(newKey, index)
 
 
 def initKey(key):
-    filePath = os.path.expanduser('~/password_manager/password.txt')
+    filePath = getPath('password.txt')
     if not os.path.exists(filePath):
         os.makedirs(os.path.dirname(filePath), exist_ok=True)
-        with open(filePath, 'w') as f:
-            text = f"{{\"key\":\"{hashlib.sha256(key.encode("utf-8")).hexdigest()}\",\"platforms\":{{}}}}"
-            encrypted = encrypt.aesEncrypt(text, key)
-            f.write(encrypted)
+        params = newKdfParams()
+        derived = encrypt.deriveKey(key, params)
+        with open(filePath, 'wb') as f:
+            text = json.dumps({"version": VERSION, "key": keyVerifier(derived), "platforms": {}})
+            f.write(container.seal(text.encode(), derived, params))
+        markFormat()
+
+
+def needsUpgrade():
+    header = getHeader()
+    return "kdf" not in header["params"] or header["cipher"] != container.CIPHER_AES_GCM
 
 
-def hasFile():
-    filePath = os.path.expanduser('~/password_manager/password.txt')
-    return os.path.exists(filePath)
+def upgradeVault(key):
+    # 旧版本直接对口令做 SHA-256，或使用没有完整性校验的 AES-CBC：
+    # 换成经过校准的 KDF 与 AES-GCM，重新加密全部数据
+    with getVaultLock():
+        previous = loadIndex(key)
+        data = load(key, previous)
+        ingestSnapshot(key)
+        params = getKdfParams() if "kdf" in getKdfParams() else newKdfParams()
+        derived = encrypt.deriveKey(key, params)
+        data["key"] = keyVerifier(derived)
+        save(derived, data, params, previous, snapshot=True)
+        # 旧密钥加密的备份、旧版本留下的时间戳备份以及旧的记录与分段仍可用来离线猜测口令，升级后立即删除
+        store = getBackupStore()
+        store.remove({entry["id"] for entry in store.list()[:-1]})
+        deleteLegacyBackups(getPath())
+        collectRecords(derived, loadIndex(derived), grace=0)
 
 
+@profiler.profiled("loadFile")
 def loadFile(key):
+    # 只解密索引，密码记录在查看时再单独解密
     data = UIData()
-    jsonData = load(key)
-    data.key = jsonData["key"]
-    for k, v in jsonData["platforms"].items():
-        data.platforms[k] = []
-        for k2, v2 in v.items():
-            data.platforms[k].append(k2)
+    data.reload(key)
     return data